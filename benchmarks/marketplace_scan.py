@@ -0,0 +1,112 @@
+"""Compare script discovery on a large synthetic Marketplace search page.
+
+Usage::
+
+    python benchmarks/marketplace_scan.py --listings 2000 --runs 5
+
+Builds a search page shaped like the ones Facebook serves (a few megabytes
+of markup and JS bundles with the listings spread over ``ScheduledServerJS``
+payloads) and prints the mean time of ``MarketplaceListingsExtractor`` with
+the BeautifulSoup based script discovery it used to rely on, with the
+streaming scanner decoding at every brace, and with the scanner decoding only
+payloads that contain the listing markers, after checking they all find the
+same listings.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+from unittest import mock
+
+from bs4 import BeautifulSoup
+
+from facebook_simple_scraper.marketplace import extractor
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleList
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor, _iter_json_objects_from_html
+
+
+def _soup_iter_json_objects(html_content: str, markers: Optional[Sequence[str]] = None) -> Iterable[Any]:
+    soup = BeautifulSoup(html_content, "html.parser")
+    for script in soup.find_all("script"):
+        text = script.string or script.get_text() or ""
+        if not text or "{" not in text:
+            continue
+        for obj in extractor._extract_json_objects(text):
+            yield obj
+
+
+def _every_brace_iter_json_objects(html_content: str, markers: Optional[Sequence[str]] = None) -> Iterable[Any]:
+    return _iter_json_objects_from_html(html_content)
+
+
+def _listing(i: int) -> dict:
+    return {
+        "node": {
+            "__typename": "MarketplaceListing",
+            "id": str(10 ** 15 + i),
+            "marketplace_listing_title": f"Toyota Corolla {2000 + i % 24}",
+            "listing_price": {"formatted_amount": f"${1000 + i:,}", "amount": str(1000 + i), "currency": "USD"},
+            "location": {"reverse_geocode": {"city": "Santiago", "state": "RM"}},
+            "primary_listing_photo": {"image": {"uri": f"https://scontent.xx.fbcdn.net/v/{i}.jpg"}},
+            "custom_sub_titles_with_rendering_flags": [{"subtitle": f"{10000 + i} km"}],
+        }
+    }
+
+
+def build_search_page(listings: int, per_payload: int = 24, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><title>Marketplace</title>"]
+    for i in range(40):
+        parts.append(f'<link rel="preload" href="/rsrc.php/v3/{i}.js" as="script">')
+        body = "".join('function f%d(a){if(a){return {"k%d":"{"+a+"}"}}else{return [a,{}]}}\n' % (j, j)
+                       for j in range(rng.randint(50, 400)))
+        parts.append('<script>__d("Bundle%d",[],function(a,b,c){%s});</script>' % (i, body))
+    parts.append("</head><body>")
+    parts.append("".join(f'<div class="x{i % 97} x1y2z3"><span dir="auto">{i}</span></div>' for i in range(20000)))
+    for first in range(0, listings, per_payload):
+        edges = [_listing(i) for i in range(first, min(first + per_payload, listings))]
+        payload = {"require": [["RelayPrefetchedStreamCache", "next", [], [{"__bbox": {"result": {"data": {
+            "marketplace_search": {"feed_units": {"edges": edges, "page_info": {"end_cursor": f"c{first}"}}}}}}}]]]}
+        parts.append('<script type="application/json" data-sjs>%s</script>' % json.dumps(payload))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _time(extract: Callable[[str], MarketplaceVehicleList], page: str, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        extract(page)
+    return (time.perf_counter() - start) / runs
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--listings', type=int, default=2000, help='Listings embedded in the page')
+    arg_parser.add_argument('--runs', type=int, default=5, help='Times the page is parsed')
+    args = arg_parser.parse_args()
+
+    page = build_search_page(args.listings)
+    print(f'page: {len(page) / 1e6:.1f} MB, {args.listings} listings')
+
+    discoveries: Dict[str, Callable[..., Iterable[Any]]] = {
+        'beautifulsoup': _soup_iter_json_objects,
+        'scanner': _every_brace_iter_json_objects,
+        'scanner+markers': _iter_json_objects_from_html,
+    }
+    reference = None
+    baseline = None
+    for name, discovery in discoveries.items():
+        with mock.patch.object(extractor, '_iter_json_objects_from_html', discovery):
+            extract = MarketplaceListingsExtractor().extract
+            result = extract(page)
+            reference = reference or result
+            if result != reference:
+                raise SystemExit(f'{name} does not match the BeautifulSoup discovery')
+            mean = _time(extract, page, args.runs)
+        baseline = baseline or mean
+        print(f'{name:<16} {mean * 1000:9.1f} ms/page  x{baseline / mean:.1f}')
+
+
+if __name__ == '__main__':
+    main()
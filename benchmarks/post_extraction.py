@@ -0,0 +1,72 @@
+"""Compare the timeline extractors on the fixture pages.
+
+Usage::
+
+    python benchmarks/post_extraction.py --runs 50
+
+Prints the mean time per page of ``PostSummaryListExtractor`` (BeautifulSoup)
+and of ``FastPostSummaryListExtractor`` with every available backend, after
+checking that they all return the same ``PostList``.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+from unittest import mock
+
+from facebook_simple_scraper.entities import PostList
+from facebook_simple_scraper.posts import fast_summary_extractor
+from facebook_simple_scraper.posts.fast_summary_extractor import FastPostSummaryListExtractor, HTML_PARSER_BACKEND, \
+    LXML_BACKEND
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'facebook_simple_scraper', 'tests', 'files')
+PAGES = ['post_first_page.html', 'post_second_page.html', 'post_last_page.html']
+
+
+def _pages() -> List[str]:
+    pages = []
+    for name in PAGES:
+        with open(os.path.join(FILES_DIR, name), 'r') as f:
+            pages.append(f.read())
+    return pages
+
+
+def _time(extract: Callable[[str], PostList], pages: List[str], runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        for page in pages:
+            extract(page)
+    return (time.perf_counter() - start) / (runs * len(pages))
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--runs', type=int, default=20, help='Times every page is parsed')
+    args = arg_parser.parse_args()
+
+    pages = _pages()
+    extractors: Dict[str, Callable[[str], PostList]] = {
+        'beautifulsoup': PostSummaryListExtractor().extract_posts,
+        f'fast ({HTML_PARSER_BACKEND})': FastPostSummaryListExtractor(HTML_PARSER_BACKEND).extract_posts,
+    }
+    if fast_summary_extractor.etree is not None:
+        extractors[f'fast ({LXML_BACKEND})'] = FastPostSummaryListExtractor(LXML_BACKEND).extract_posts
+
+    # Date parsing is shared by every extractor; pin it so outputs can be compared
+    with mock.patch.object(PostSummaryListExtractor, '_parse_date', staticmethod(lambda s: datetime(2024, 1, 1))):
+        reference = [extractors['beautifulsoup'](page) for page in pages]
+        for name, extract in extractors.items():
+            if [extract(page) for page in pages] != reference:
+                raise SystemExit(f'{name} does not match the BeautifulSoup extractor')
+
+    baseline = None
+    for name, extract in extractors.items():
+        mean = _time(extract, pages, args.runs)
+        baseline = baseline or mean
+        print(f'{name:<22} {mean * 1000:8.2f} ms/page  x{baseline / mean:.1f}')
+
+
+if __name__ == '__main__':
+    main()
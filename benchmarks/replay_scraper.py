@@ -0,0 +1,123 @@
+"""Replay a recorded scraper run offline to measure (and profile) throughput.
+
+Usage::
+
+    python benchmarks/replay_scraper.py --cassette run.jsonl --account NintendoLatAm
+    python benchmarks/replay_scraper.py --runs 20 --profile
+
+A cassette is recorded by running the scraper with
+``ScraperOptions(cassette=Cassette("run.jsonl", CassetteMode.RECORD))``.
+Without ``--cassette`` a small cassette is recorded from the fixtures in
+``facebook_simple_scraper/tests/files``.
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+
+from facebook_simple_scraper.details.repository import GraphqlCommentsRepository
+from facebook_simple_scraper.entities import LoginCredentials, ScraperOptions
+from facebook_simple_scraper.login.login import MobileBasicLoginRepository
+from facebook_simple_scraper.login.params import MbasicLoginParamsRepository
+from facebook_simple_scraper.login.session_storage import LocalFileSessionStorage
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.requester.cassette import Cassette, CassetteMode, RecordingRequester
+from facebook_simple_scraper.scraper import Scraper
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.utils import MockRequester
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'facebook_simple_scraper', 'tests', 'files')
+LOGIN_PAGES = ['login_param_page_example.html', 'login_success.html', 'login_success_complete.html']
+TIMELINE_PAGES = ['post_first_page.html', 'post_second_page.html', 'post_last_page.html']
+GRAPHQL_PAGE = 'get_comments_gql_page_1.jsonlines'
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FILES_DIR, name), 'r') as f:
+        return f.read()
+
+
+def record_fixture_cassette(path: str, username: str, password: str, account: str, work_dir: str) -> None:
+    """Record a login plus a three page timeline crawl (with comments) served from the test fixtures."""
+    mock = MockRequester()
+    mock.clear()
+    for name in LOGIN_PAGES + TIMELINE_PAGES:
+        mock.add_expected_response(r_text=_fixture(name))
+    gql_mock = MockRequester()
+    gql_mock.clear()
+    for _ in range(100):
+        gql_mock.add_expected_response(r_text=_fixture(GRAPHQL_PAGE))
+
+    cassette = Cassette(path, CassetteMode.RECORD)
+    req = RecordingRequester(mock, cassette)
+    MobileBasicLoginRepository(
+        MbasicLoginParamsRepository(req),
+        session_storage=LocalFileSessionStorage(os.path.join(work_dir, 'recording')),
+        requester=req,
+    ).login(username, password)
+    repo = PostSummaryListRepository(GetPostOptions(
+        requester=req,
+        parser=PostSummaryListExtractor(),
+        sleep_time_min=0,
+        sleep_time_max=0,
+        max_comments=1,
+        comments_repository=GraphqlCommentsRepository(
+            req, await_time=0, gql_requester=RecordingRequester(gql_mock, cassette)),
+    ))
+    for _ in repo.get_posts(account, [StopAfterNPosts(1_000_000)]):
+        pass
+
+
+def replay_once(cassette_path: str, account: str, username: str, password: str, latency: float,
+                session_dir: str) -> int:
+    opts = ScraperOptions(
+        credentials=[LoginCredentials(username=username, password=password)],
+        stop_conditions=[StopAfterNPosts(1_000_000)],
+        max_comments_per_post=1,
+        session_storage=LocalFileSessionStorage(session_dir),
+        cassette=Cassette(cassette_path, CassetteMode.REPLAY, latency=latency),
+    )
+    return sum(1 for _ in Scraper(opts).get_posts(account))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassette', help='cassette to replay (defaults to one recorded from the test fixtures)')
+    parser.add_argument('--account', default='account')
+    parser.add_argument('--username', default='user')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds injected per replayed request')
+    parser.add_argument('--profile', action='store_true', help='print the top cProfile entries')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cassette_path = args.cassette
+        if cassette_path is None:
+            cassette_path = os.path.join(work_dir, 'fixtures.jsonl')
+            record_fixture_cassette(cassette_path, args.username, args.password, args.account, work_dir)
+
+        profiler = cProfile.Profile() if args.profile else None
+        posts = 0
+        start = time.perf_counter()
+        for i in range(args.runs):
+            session_dir = os.path.join(work_dir, f'replay_{i}')
+            if profiler is not None:
+                profiler.enable()
+            posts += replay_once(cassette_path, args.account, args.username, args.password, args.latency,
+                                 session_dir)
+            if profiler is not None:
+                profiler.disable()
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.runs} runs, {posts} posts in {elapsed:.3f}s "
+          f"({posts / elapsed:.1f} posts/s, {elapsed / args.runs * 1000:.1f} ms/run)")
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == '__main__':
+    main()
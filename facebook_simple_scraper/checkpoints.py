@@ -0,0 +1,127 @@
+"""Checkpoints letting a crawl resume where a previous run left it.
+
+After every page, the timeline and marketplace repositories save what they
+need to carry on from the next page: its cursor, the profile id, the ids
+already seen and the stop conditions with their counters. A crawl started
+with the same key (the account or the search filters, and a digest of the
+stop conditions' parameters) picks the checkpoint up, across process
+restarts, and deletes it once it is finished (no page left, or a stop
+condition fired).
+
+Posts of a page the previous run did not finish are yielded again, so a
+resumed crawl delivers every item at least once.
+"""
+import abc
+import hashlib
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from facebook_simple_scraper.dedupe import SeenIds
+from facebook_simple_scraper.entities import IncrementalStopCondition
+
+
+@dataclass
+class CrawlCheckpoint:
+    """Where a crawl stands after its latest complete page."""
+
+    cursor: Optional[str]
+    """The cursor of the next page."""
+
+    profile_id: Optional[str] = None
+    """The profile id of a timeline crawl."""
+
+    seen_ids: Optional[SeenIds] = None
+    """The ids already yielded, for crawls that dedupe."""
+
+    stop_conditions: List[IncrementalStopCondition] = field(default_factory=list)
+    """The stop conditions of the crawl, with their counters."""
+
+    saved_at: float = field(default_factory=time.time)
+
+
+class CheckpointStore(abc.ABC):
+    """Persists one checkpoint per crawl key. Implementations must be thread safe."""
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Optional[CrawlCheckpoint]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def save(self, key: str, checkpoint: CrawlCheckpoint) -> None:
+        """Replace the checkpoint of ``key`` atomically."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError()
+
+
+class FileCheckpointStore(CheckpointStore):
+    """One pickle file per key in ``directory``, replaced atomically."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[CrawlCheckpoint]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, checkpoint: CrawlCheckpoint) -> None:
+        state = pickle.dumps(checkpoint)
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(state)
+            os.replace(tmp_path, self._path(key))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.ckpt')
+
+
+class SqliteCheckpointStore(CheckpointStore):
+    """Checkpoints in a single SQLite database file, handy for many crawls."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, state BLOB NOT NULL, saved_at REAL)')
+
+    def load(self, key: str) -> Optional[CrawlCheckpoint]:
+        with self._lock:
+            row = self._connection.execute('SELECT state FROM checkpoints WHERE key = ?', (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def save(self, key: str, checkpoint: CrawlCheckpoint) -> None:
+        state = pickle.dumps(checkpoint)
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO checkpoints (key, state, saved_at) VALUES (?, ?, ?)',
+                                     (key, state, checkpoint.saved_at))
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM checkpoints WHERE key = ?', (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
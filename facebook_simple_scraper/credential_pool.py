@@ -0,0 +1,282 @@
+"""Pool of login credentials shared by concurrent crawls.
+
+Workers :meth:`CredentialPool.lease` a credential, use it and give it back.
+A credential is leased to one worker at a time, together with the logged-in
+requester of its previous lease so sessions are reused. Among the free
+credentials the least recently used one is handed out, spreading the load
+evenly over the accounts.
+
+Every credential carries a health score computed over its most recent
+request outcomes: errors lower it and checkpoint pages lower it a lot. A
+credential hitting a checkpoint, or whose score drops below ``min_score``,
+cools down (is not leased) for a while; consecutive cool downs last longer.
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Deque, Dict, List, Optional
+
+import requests
+
+from facebook_simple_scraper.entities import LoginCredentials
+from facebook_simple_scraper.error_dict import NoCredentialAvailableError
+from facebook_simple_scraper.requester.rate_limiter import is_checkpoint_response
+from facebook_simple_scraper.requester.requester import Requester, RequesterDecorator
+
+LOGIN_USERNAME_VARIABLE = "login_username"
+"""Session variable holding the pool credential a requester is logged in with."""
+
+
+class CredentialOutcome(str, Enum):
+    SUCCESS = "success"
+    ERROR = "error"
+    CHECKPOINT = "checkpoint"
+
+
+@dataclass
+class CredentialHealth:
+    """Snapshot of the health of one credential."""
+
+    username: str
+    score: float
+    """1.0 for a credential without recent failures, down to 0.0."""
+    requests: int
+    errors: int
+    checkpoints: int
+    leased: bool
+    cooldown_remaining: float
+    """Seconds until the credential can be leased again, 0 when it is not cooling down."""
+
+
+class _CredentialState:
+    def __init__(self, credentials: LoginCredentials, window: int):
+        self.credentials = credentials
+        self.requester: Optional[Requester] = None
+        self.leased = False
+        self.last_used = float("-inf")
+        self.cooldown_until = float("-inf")
+        self.consecutive_cooldowns = 0
+        self.recent: Deque[CredentialOutcome] = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.checkpoints = 0
+
+    def score(self, checkpoint_weight: float) -> float:
+        if not self.recent:
+            return 1.0
+        penalty = 0.0
+        for outcome in self.recent:
+            if outcome == CredentialOutcome.ERROR:
+                penalty += 1
+            elif outcome == CredentialOutcome.CHECKPOINT:
+                penalty += checkpoint_weight
+        return max(0.0, 1 - penalty / len(self.recent))
+
+
+class CredentialLease:
+    """A credential leased from a :class:`CredentialPool`, released on context exit.
+
+    ``requester`` is the logged-in requester left by the previous lease of
+    the same credential (``None`` when it has to log in). Set it after
+    logging in so the next lease reuses the session.
+    """
+
+    def __init__(self, pool: 'CredentialPool', credentials: LoginCredentials, requester: Optional[Requester]):
+        self.pool = pool
+        self.credentials = credentials
+        self.requester = requester
+        self.released = False
+
+    @property
+    def username(self) -> str:
+        return self.credentials.username
+
+    def record(self, outcome: CredentialOutcome) -> None:
+        self.pool.record(self.username, outcome)
+
+    def release(self) -> None:
+        self.pool.release(self)
+
+    def __enter__(self) -> 'CredentialLease':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class CredentialPool:
+    """Thread-safe pool of :class:`LoginCredentials` with health scoring.
+
+    Args:
+        credentials: The credentials of the pool.
+        window: Number of most recent outcomes the health score is computed over.
+        min_samples: Outcomes needed before a low score triggers a cool down.
+        min_score: Credentials scoring below this cool down.
+        checkpoint_weight: How many errors a checkpoint counts as.
+        cooldown: Seconds of the first cool down. It doubles with every consecutive one.
+        max_cooldown: Upper bound of a cool down.
+        clock: Monotonic time source, mainly useful for tests.
+    """
+
+    def __init__(self, credentials: List[LoginCredentials], window: int = 50, min_samples: int = 5,
+                 min_score: float = 0.5, checkpoint_weight: float = 5.0, cooldown: float = 15 * 60,
+                 max_cooldown: float = 6 * 60 * 60, clock: Callable[[], float] = time.monotonic):
+        if not credentials:
+            raise ValueError("At least one credential is required")
+        self.min_samples = min_samples
+        self.min_score = min_score
+        self.checkpoint_weight = checkpoint_weight
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._clock = clock
+        self._window = window
+        self._states: Dict[str, _CredentialState] = {}
+        for cred in credentials:
+            self._states[cred.username] = _CredentialState(cred, window)
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def add(self, credentials: LoginCredentials) -> None:
+        """Add a credential to the pool, leasable right away."""
+        with self._condition:
+            if credentials.username not in self._states:
+                self._states[credentials.username] = _CredentialState(credentials, self._window)
+            self._condition.notify_all()
+
+    def lease(self, timeout: Optional[float] = None) -> CredentialLease:
+        """Lease the least recently used credential that is free and not cooling down.
+
+        Blocks until one is available.
+
+        Raises:
+            NoCredentialAvailableError: If none became available within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            while True:
+                now = self._clock()
+                state = self._pick(now)
+                if state is not None:
+                    state.leased = True
+                    state.last_used = now
+                    return CredentialLease(self, state.credentials, state.requester)
+                wait = self._next_cooldown_end(now)
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise NoCredentialAvailableError(
+                            f"Every credential stayed leased or cooling down for {timeout}s")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def release(self, lease: CredentialLease) -> None:
+        with self._condition:
+            if lease.released:
+                return
+            lease.released = True
+            state = self._states[lease.username]
+            state.leased = False
+            state.last_used = self._clock()
+            if state.cooldown_until <= state.last_used:
+                # A credential that cooled down during the lease must log in again
+                state.requester = lease.requester
+            self._condition.notify_all()
+
+    def record(self, username: str, outcome: CredentialOutcome) -> None:
+        """Record the outcome of a request (or login) made with ``username``."""
+        with self._condition:
+            state = self._states.get(username)
+            if state is None:
+                return
+            now = self._clock()
+            if state.cooldown_until > now:
+                # In-flight requests of a cooling credential do not extend its cool down
+                return
+            state.recent.append(outcome)
+            state.requests += 1
+            if outcome == CredentialOutcome.SUCCESS:
+                if len(state.recent) >= self.min_samples and state.score(self.checkpoint_weight) >= self.min_score:
+                    state.consecutive_cooldowns = 0
+                return
+            if outcome == CredentialOutcome.ERROR:
+                state.errors += 1
+            else:
+                state.checkpoints += 1
+            low_score = (len(state.recent) >= self.min_samples
+                         and state.score(self.checkpoint_weight) < self.min_score)
+            if outcome == CredentialOutcome.CHECKPOINT or low_score:
+                self._start_cooldown(state, now)
+
+    def health(self, username: str) -> CredentialHealth:
+        with self._condition:
+            state = self._states[username]
+            return CredentialHealth(
+                username=username,
+                score=state.score(self.checkpoint_weight),
+                requests=state.requests,
+                errors=state.errors,
+                checkpoints=state.checkpoints,
+                leased=state.leased,
+                cooldown_remaining=max(0.0, state.cooldown_until - self._clock()),
+            )
+
+    def _pick(self, now: float) -> Optional[_CredentialState]:
+        best: Optional[_CredentialState] = None
+        for state in self._states.values():
+            if state.leased or state.cooldown_until > now:
+                continue
+            if best is None or state.last_used < best.last_used:
+                best = state
+        return best
+
+    def _next_cooldown_end(self, now: float) -> Optional[float]:
+        ends = [s.cooldown_until - now for s in self._states.values() if not s.leased and s.cooldown_until > now]
+        return min(ends) if ends else None
+
+    def _start_cooldown(self, state: _CredentialState, now: float) -> None:
+        duration = min(self.max_cooldown, self.cooldown * 2 ** state.consecutive_cooldowns)
+        state.consecutive_cooldowns += 1
+        state.cooldown_until = now + duration
+        state.recent.clear()
+        # The session that led to the cool down is not reused
+        state.requester = None
+
+
+def leased_username(req: Requester) -> str:
+    """Return the pool credential ``req`` is logged in with (empty if unknown)."""
+    variables = req.load_session_variables() or {}
+    return str(variables.get(LOGIN_USERNAME_VARIABLE) or "")
+
+
+class CredentialHealthRequester(RequesterDecorator):
+    """Requester decorator that reports every response to the health score of a pool credential.
+
+    Args:
+        requester: The requester that performs the requests.
+        pool: Pool owning the credential.
+        username: Credential the requests are charged to.
+    """
+
+    def __init__(self, requester: Requester, pool: CredentialPool, username: str):
+        super().__init__(requester)
+        self.pool = pool
+        self.username = username
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        try:
+            response = self.requester.request(method, url, data=data, headers=headers)
+        except Exception:
+            self.pool.record(self.username, CredentialOutcome.ERROR)
+            raise
+        if is_checkpoint_response(response):
+            self.pool.record(self.username, CredentialOutcome.CHECKPOINT)
+        elif response.status_code >= 400:
+            self.pool.record(self.username, CredentialOutcome.ERROR)
+        else:
+            self.pool.record(self.username, CredentialOutcome.SUCCESS)
+        return response
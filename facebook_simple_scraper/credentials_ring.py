@@ -1,19 +1,32 @@
-from typing import List, Iterable
+import warnings
+from typing import Iterable, List
 
+from facebook_simple_scraper.credential_pool import CredentialPool
 from facebook_simple_scraper.entities import LoginCredentials
 
 
 class CredentialsRingBuffer:
+    """Deprecated round robin over credentials, kept for backward compatibility.
+
+    Credentials are now handed out by :class:`CredentialPool`, which this class
+    wraps: ``next`` yields the least recently used credential that is neither
+    leased nor cooling down.
+
+    Raises:
+        NoCredentialAvailableError: From ``next``, if every credential is leased or cooling down.
+    """
+
     def __init__(self, creds: List[LoginCredentials]):
-        self.index = 0
+        warnings.warn("CredentialsRingBuffer is deprecated, use facebook_simple_scraper.credential_pool.CredentialPool",
+                      DeprecationWarning, stacklevel=2)
         self.creds = creds
+        self.pool = CredentialPool(creds)
 
-    def append(self, datum):
+    def append(self, datum: LoginCredentials) -> None:
         self.creds.append(datum)
+        self.pool.add(datum)
 
     def next(self) -> Iterable[LoginCredentials]:
-        if self.index >= len(self.creds):
-            self.index = 0
-        cred = self.creds[self.index]
-        self.index += 1
+        with self.pool.lease(timeout=0) as lease:
+            cred = lease.credentials
         yield cred
@@ -0,0 +1,223 @@
+"""Remembering the ids a crawl has already yielded.
+
+A search can return the same listing on several pages. ``ExactSeenIds``
+remembers every id, so its memory grows with the crawl; ``RecentSeenIds``
+only remembers the most recently seen ids, which catches the duplicates of
+neighbouring pages in constant memory.
+
+``PersistentSeenIds`` remembers ids across searches and runs, on disk: a
+memory-mapped Bloom filter answers "never seen" without touching the disk,
+and an exact SQLite set settles the ids the filter may have seen.
+"""
+import abc
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Set
+
+
+class SeenIds(abc.ABC):
+    """The ids seen so far by a crawl."""
+
+    @abc.abstractmethod
+    def add(self, item_id: str) -> bool:
+        """Remember ``item_id``. Returns True if it was not seen before."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def __contains__(self, item_id: object) -> bool:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def flush(self) -> None:
+        """Write the ids added so far to wherever they are kept. Nothing to do for ids kept in memory."""
+
+
+class ExactSeenIds(SeenIds):
+    """Every id seen, in a set."""
+
+    def __init__(self):
+        self._ids: Set[str] = set()
+
+    def add(self, item_id: str) -> bool:
+        if item_id in self._ids:
+            return False
+        self._ids.add(item_id)
+        return True
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class RecentSeenIds(SeenIds):
+    """The ``max_ids`` most recently seen ids.
+
+    An id seen again is refreshed, so ids that keep coming back are kept.
+    Duplicates further apart than ``max_ids`` ids are not detected.
+    """
+
+    def __init__(self, max_ids: int):
+        if max_ids < 1:
+            raise ValueError("max_ids must be at least 1")
+        self.max_ids = max_ids
+        self._ids: 'OrderedDict[str, None]' = OrderedDict()
+
+    def add(self, item_id: str) -> bool:
+        if item_id in self._ids:
+            self._ids.move_to_end(item_id)
+            return False
+        self._ids[item_id] = None
+        if len(self._ids) > self.max_ids:
+            self._ids.popitem(last=False)
+        return True
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class BloomFilter:
+    """A Bloom filter whose bits live in a memory-mapped file.
+
+    Args:
+        path: The file holding the filter. An existing file is reused with the sizes it was created with.
+        expected_items: How many items the filter is sized for.
+        false_positive_rate: The rate of false positives once ``expected_items`` items were added.
+    """
+
+    _MAGIC = b'FSSBLOOM'
+    _HEADER = struct.Struct('<8sQI')
+
+    def __init__(self, path: str, expected_items: int = 1_000_000, false_positive_rate: float = 0.01):
+        self.path = path
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                magic, self.bits, self.hashes = self._HEADER.unpack(f.read(self._HEADER.size))
+            if magic != self._MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+        else:
+            self.bits = max(8, int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2))
+            self.hashes = max(1, round(self.bits / max(1, expected_items) * math.log(2)))
+            with open(path, 'wb') as f:
+                f.write(self._HEADER.pack(self._MAGIC, self.bits, self.hashes))
+                f.truncate(self._HEADER.size + (self.bits + 7) // 8)
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            index = self._HEADER.size + position // 8
+            self._map[index] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._map[self._HEADER.size + position // 8] & (1 << (position % 8))
+                   for position in self._positions(item))
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = struct.unpack('<QQ', digest)
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+
+class PersistentSeenIds(SeenIds):
+    """Ids remembered on disk, shared by every search and run using ``directory``.
+
+    Ids are added to the Bloom filter at once and to the exact set in
+    batches of ``batch_size`` (and on ``flush``). The filter is written
+    before the set, so it always holds every id of the set: an id the filter
+    has never seen is new without a lookup, the others are looked up.
+
+    Args:
+        directory: Where the filter (``ids.bloom``) and the exact set (``ids.db``) are kept.
+        expected_ids: How many ids the filter is sized for. Past that, more ids need a lookup.
+        false_positive_rate: The share of new ids needing a lookup, up to ``expected_ids``.
+        batch_size: How many new ids are buffered before they are written to the exact set.
+    """
+
+    def __init__(self, directory: str, expected_ids: int = 1_000_000, false_positive_rate: float = 0.01,
+                 batch_size: int = 1000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.lookups = 0
+        self._lock = threading.RLock()
+        self._bloom = BloomFilter(os.path.join(directory, 'ids.bloom'), expected_ids, false_positive_rate)
+        self._connection = sqlite3.connect(os.path.join(directory, 'ids.db'), check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY) WITHOUT ROWID')
+        self._pending: Set[str] = set()
+
+    def add(self, item_id: str) -> bool:
+        with self._lock:
+            if item_id in self:
+                return False
+            self._bloom.add(item_id)
+            self._pending.add(item_id)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            return True
+
+    def add_all(self, item_ids: Iterable[str]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                self.add(item_id)
+
+    def __contains__(self, item_id: object) -> bool:
+        if not isinstance(item_id, str):
+            return False
+        with self._lock:
+            if item_id not in self._bloom:
+                return False
+            if item_id in self._pending:
+                return True
+            self.lookups += 1
+            row = self._connection.execute('SELECT 1 FROM ids WHERE id = ?', (item_id,)).fetchone()
+            return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM ids').fetchone()[0] + len(self._pending)
+
+    def flush(self) -> None:
+        """Write the buffered ids to disk."""
+        with self._lock:
+            self._bloom.flush()
+            if self._pending:
+                with self._connection:
+                    self._connection.executemany('INSERT OR IGNORE INTO ids (id) VALUES (?)',
+                                                 ((item_id,) for item_id in self._pending))
+                self._pending.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._bloom.close()
+            self._connection.close()
+
+
+def seen_ids_for(max_ids: Optional[int]) -> SeenIds:
+    """An exact set for ``max_ids=None``, else one bounded to the ``max_ids`` most recent ids."""
+    if max_ids is None:
+        return ExactSeenIds()
+    return RecentSeenIds(max_ids)
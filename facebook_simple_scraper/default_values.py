@@ -2,5 +2,15 @@ DEFAULT_MAX_POST_PER_PAGE = 5
 DEFAULT_SLEEP_TIME_MIN = 1
 DEFAULT_SLEEP_TIME_MAX = 2
 DEFAULT_MAX_COMMENTS_PER_POST = 1000
+DEFAULT_MAX_CONCURRENT_POST_DETAILS = 4
 DEFAULT_MAX_SEQUENTIAL_POST_PER_CREDENTIAL = 10
 DEFAULT_SESSION_DIR = 'sessions'
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_CRAWL_WORKERS = 4
+DEFAULT_STREAMING_SEEN_IDS = 10000
+DEFAULT_TILE_RADIUS_KM = 40
+DEFAULT_MIN_TILE_RADIUS_KM = 2
+DEFAULT_MAX_PAGES_PER_TILE = 10
+DEFAULT_MAX_CONCURRENT_LISTING_DETAILS = 4
+DEFAULT_CREDENTIAL_LEASE_TIMEOUT = 30 * 60
@@ -1,5 +1,6 @@
 from typing import Tuple, Optional
 
+from facebook_simple_scraper.credential_pool import CredentialHealthRequester, leased_username
 from facebook_simple_scraper.default_values import DEFAULT_SESSION_DIR
 from facebook_simple_scraper.details.repository import GraphqlCommentsRepository
 from facebook_simple_scraper.entities import ScraperOptions
@@ -10,10 +11,16 @@ from facebook_simple_scraper.marketplace.repository import (
     MarketplaceVehicleRepository,
     build_default_marketplace_repository,
 )
+from facebook_simple_scraper.posts.fast_summary_extractor import FastPostSummaryListExtractor
 from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
 from facebook_simple_scraper.posts.summary_repository import PostSummaryListRepository, GetPostOptions
 from facebook_simple_scraper.requester import requester
-from facebook_simple_scraper.requester.requester import Requester
+from facebook_simple_scraper.requester.cache import CachingRequester
+from facebook_simple_scraper.requester.cassette import CassetteMode, RecordingRequester
+from facebook_simple_scraper.requester.rate_limiter import RateLimitedRequester
+from facebook_simple_scraper.requester.requester import Requester, unwrap_requester, session_credential, \
+    FacebookSessionBasedRequester
+from facebook_simple_scraper.requester.resilience import ResilientRequester, RetryPolicy, CircuitBreakers
 
 
 class AbstractScraperDependencyBuilder:
@@ -50,9 +57,30 @@ class DefaultScraperDependencyBuilder:
             Tuple[MobileBasicLoginRepository, PostSummaryListRepository]: A tuple
             containing the login repository and post summary repository.
         """
-        if req is None:
+        replaying = opts.cassette is not None and opts.cassette.mode == CassetteMode.REPLAY
+        recording = opts.cassette is not None and opts.cassette.mode == CassetteMode.RECORD
+        if replaying:
+            # Every request is served from the cassette, including login
+            replayer = opts.cassette.replayer()
+            if req is not None and not replayer.load_session_variables():
+                replayer.save_session_variables(req.load_session_variables())
+            req = replayer
+        elif req is None:
             # Create a requester for Facebook sessions
             req = requester.FacebookSessionBasedRequester()
+        else:
+            # Decorators are rebuilt below, never stacked on the ones of a previous build
+            req = unwrap_requester(req)
+        gql_req: Requester = req if replaying else requester.FacebookSessionBasedRequester(base_headers={})
+        for network_req in (req, gql_req):
+            if isinstance(network_req, FacebookSessionBasedRequester):
+                network_req.timeout = opts.request_timeout
+        if recording:
+            req = RecordingRequester(req, opts.cassette)
+            gql_req = RecordingRequester(gql_req, opts.cassette)
+        rate_limited = opts.rate_limiter is not None and not replaying
+        sleep_time_min = 0 if replaying or rate_limited else opts.sleep_time_min
+        sleep_time_max = 0 if replaying or rate_limited else opts.sleep_time_max
 
         # Create a repository for login parameters
         params_repo = MbasicLoginParamsRepository(req)
@@ -70,17 +98,49 @@ class DefaultScraperDependencyBuilder:
             requester=req,
         )
 
+        # Scraping requests are paced by the rate limiter, retried / failed
+        # fast by the resilience layer and may be served from the response
+        # cache. Login traffic always goes through the bare requester.
+        data_req = req
+        username = leased_username(req)
+        if opts.credential_pool is not None and username:
+            # Responses feed the health score of the credential the session belongs to
+            data_req = CredentialHealthRequester(data_req, opts.credential_pool, username)
+            gql_req = CredentialHealthRequester(gql_req, opts.credential_pool, username)
+        if rate_limited:
+            # The GraphQL session is anonymous, so charge it to the logged-in account
+            data_req = RateLimitedRequester(data_req, opts.rate_limiter)
+            gql_req = RateLimitedRequester(gql_req, opts.rate_limiter, credential=session_credential(req))
+        resilient = (opts.retry_policy is not None or opts.circuit_breakers is not None
+                     or opts.on_request_attempt is not None)
+        if resilient:
+            retry_policy = opts.retry_policy if opts.retry_policy is not None else RetryPolicy()
+            breakers = opts.circuit_breakers if opts.circuit_breakers is not None else CircuitBreakers()
+            data_req = ResilientRequester(data_req, retry_policy, breakers, opts.on_request_attempt)
+            gql_req = ResilientRequester(gql_req, retry_policy, breakers, opts.on_request_attempt)
+        if opts.response_cache is not None:
+            data_req = CachingRequester(data_req, opts.response_cache)
+            gql_req = CachingRequester(gql_req, opts.response_cache)
+
         # Initialize the comments repository
-        comment_repo = GraphqlCommentsRepository(req)
+        comment_repo = GraphqlCommentsRepository(data_req, await_time=0 if replaying else 1, gql_requester=gql_req)
 
         # Initialize the post summary list extractor and options
-        post_extractor = PostSummaryListExtractor()
+        extractor_class = FastPostSummaryListExtractor if opts.fast_post_extraction else PostSummaryListExtractor
+        post_extractor = extractor_class()
         post_opts = GetPostOptions(
-            requester=req,
+            requester=data_req,
             parser=post_extractor,
-            sleep_time_min=opts.sleep_time_min,
-            sleep_time_max=opts.sleep_time_max,
+            sleep_time_min=sleep_time_min,
+            sleep_time_max=sleep_time_max,
+            max_comments=opts.max_comments_per_post,
             comments_repository=comment_repo,
+            details_workers=opts.max_concurrent_post_details,
+            parse_executor=opts.parse_executor,
+            on_stop=opts.callbacks.on_stop,
+            streaming=opts.streaming,
+            checkpoint_store=opts.checkpoint_store,
+            high_water_marks=opts.high_water_marks,
         )
 
         # Initialize the post summary list repository
@@ -89,9 +149,15 @@ class DefaultScraperDependencyBuilder:
         # Initialize the marketplace repository (shares the same logged-in
         # requester so the user's session cookies are reused).
         marketplace_repo = build_default_marketplace_repository(
-            requester=req,
-            sleep_time_min=opts.sleep_time_min,
-            sleep_time_max=opts.sleep_time_max,
+            requester=data_req,
+            sleep_time_min=sleep_time_min,
+            sleep_time_max=sleep_time_max,
+            parse_executor=opts.parse_executor,
+            on_stop=opts.callbacks.on_stop,
+            streaming=opts.streaming,
+            checkpoint_store=opts.checkpoint_store,
+            listing_index=opts.listing_index,
+            new_only=opts.new_listings_only,
         )
 
         # Return the login, post and marketplace repositories
@@ -1,8 +1,8 @@
 import datetime
-import json
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
+from facebook_simple_scraper.details.gql_stream import Chunk, iter_graphql_documents, merge_graphql_documents
 from facebook_simple_scraper.entities import Comment, Reaction, ReactionType, User
 
 
@@ -15,13 +15,30 @@ class PostDetails:
     share_count: int
     next_cursor: str
 
+    @classmethod
+    def empty(cls) -> 'PostDetails':
+        """Details of a post whose response had nothing to extract."""
+        return cls(comments=[], total_comments=0, reactions=[], view_count=0, share_count=0, next_cursor='')
+
 
 class GQLPostDetailExtractor:
 
-    def extract(self, content: str) -> Optional[PostDetails]:
-        j = self._read_first_json(content)
+    def extract(self, content: Chunk) -> Optional[PostDetails]:
+        """Extract a whole GraphQL response, text or raw bytes. ``None`` when it holds no document."""
+        return self.extract_chunks([content])
+
+    def extract_chunks(self, chunks: Iterable[Chunk]) -> Optional[PostDetails]:
+        """Decode a GraphQL response chunk by chunk, merging its deferred payloads, and extract it.
+
+        ``chunks`` can be any split of the body, e.g. ``iter_content()`` of a streamed
+        ``requests`` response. Returns ``None`` when the response holds no GraphQL document.
+        """
+        j = merge_graphql_documents(iter_graphql_documents(chunks))
         if j is None:
             return None
+        return self._extract_document(j)
+
+    def _extract_document(self, j: dict) -> PostDetails:
 
         top_reactions: List[Reaction] = []
 
@@ -151,33 +168,6 @@ class GQLPostDetailExtractor:
             return ReactionType.ANGRY
         return ReactionType.UNKNOWN
 
-    @staticmethod
-    def _read_first_json(content) -> Optional[dict]:
-        key_counter = 0
-        start_json = None
-        end_json = None
-        for i, c in enumerate(content):
-            if c == '{':
-                if key_counter == 0:
-                    start_json = i
-                key_counter += 1
-            elif c == '}':
-                key_counter -= 1
-                if key_counter == 0:
-                    end_json = i + 1
-                    break
-
-        if start_json is not None and end_json is not None:
-            first_json_str = content[start_json:end_json]
-            try:
-                primer_json = json.loads(first_json_str, strict=False)
-
-                return primer_json
-            except json.JSONDecodeError:
-                return None
-        else:
-            return None
-
 
 if __name__ == '__main__':
     parser = GQLPostDetailExtractor()
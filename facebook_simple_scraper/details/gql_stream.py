@@ -0,0 +1,171 @@
+"""Incremental decoding of multi-part GraphQL responses.
+
+Facebook answers GraphQL queries using ``@defer`` / ``@stream`` with several
+JSON documents, one after the other: the initial ``{"data": ...}`` payload
+followed by incremental payloads carrying a ``path`` into it (and either
+``data`` to merge at that path or ``items`` to insert into a list).
+
+:class:`GraphQLChunkDecoder` decodes documents as soon as the bytes of each
+one have arrived, and :class:`DeferredPayloadMerger` folds the incremental
+payloads back into the initial one.
+"""
+import codecs
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+Chunk = Union[str, bytes]
+
+
+class GraphQLChunkDecoder:
+    """Split a stream of response chunks into the JSON documents it contains.
+
+    ``feed`` returns the documents completed by a chunk. A decode is only
+    attempted once a chunk brings a line break (documents are newline
+    delimited) and, after a failed attempt, once the buffer has doubled, so a
+    large document arriving in small chunks is not decoded again and again.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder(strict=False)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._parts: List[str] = []
+        self._size = 0
+        self._retry_at = 0
+
+    def feed(self, chunk: Chunk) -> List[dict]:
+        text = self._utf8.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+        if not text:
+            return []
+        self._parts.append(text)
+        self._size += len(text)
+        if "\n" not in text or self._size < self._retry_at:
+            return []
+        return self._decode_available(final=False)
+
+    def close(self) -> List[dict]:
+        """Decode what is left once the stream is over."""
+        self._parts.append(self._utf8.decode(b"", final=True))
+        return self._decode_available(final=True)
+
+    def _decode_available(self, final: bool) -> List[dict]:
+        documents: List[dict] = []
+        buffer = "".join(self._parts)
+        pos = 0
+        while True:
+            # Skip separators and anything before the next document, e.g. a ``for (;;);`` guard
+            pos = buffer.find("{", pos)
+            if pos == -1:
+                pos = len(buffer)
+                break
+            try:
+                document, pos = self._decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if not final:
+                    break
+                # A broken document: resynchronise on the next line that starts one
+                next_line = buffer.find("\n{", pos)
+                if next_line == -1:
+                    pos = len(buffer)
+                    break
+                pos = next_line + 1
+                continue
+            if isinstance(document, dict):
+                documents.append(document)
+        rest = buffer[pos:]
+        self._parts = [rest] if rest else []
+        self._size = len(rest)
+        self._retry_at = 0 if documents or not rest else 2 * len(rest)
+        return documents
+
+
+def iter_graphql_documents(chunks: Iterable[Chunk]) -> Iterator[dict]:
+    """Yield every JSON document of a chunked GraphQL response as soon as it is complete."""
+    decoder = GraphQLChunkDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+class DeferredPayloadMerger:
+    """Fold incremental GraphQL payloads into the initial response document.
+
+    Payloads whose ``path`` does not exist yet are kept until a later payload
+    creates it.
+    """
+
+    def __init__(self):
+        self.document: Optional[dict] = None
+        self._pending: List[dict] = []
+
+    def add(self, payload: dict) -> None:
+        if self.document is None:
+            if "path" not in payload:
+                self.document = payload
+                self._merge_pending()
+            else:
+                self._pending.append(payload)
+            return
+        if "path" not in payload:
+            # Another complete response, e.g. of a batched query: the first one wins
+            return
+        if self._merge(payload):
+            self._merge_pending()
+        else:
+            self._pending.append(payload)
+
+    def _merge_pending(self) -> None:
+        merged = True
+        while merged and self._pending:
+            merged = False
+            for payload in list(self._pending):
+                if self._merge(payload):
+                    self._pending.remove(payload)
+                    merged = True
+
+    def _merge(self, payload: dict) -> bool:
+        path = payload.get("path") or []
+        if "items" in payload:
+            if not path or not isinstance(path[-1], int):
+                return False
+            target = self._resolve(path[:-1])
+            if not isinstance(target, list):
+                return False
+            start = path[-1]
+            for offset, item in enumerate(payload["items"] or []):
+                if start + offset < len(target):
+                    target[start + offset] = item
+                else:
+                    target.append(item)
+            return True
+        target = self._resolve(path)
+        data = payload.get("data")
+        if not isinstance(target, dict) or not isinstance(data, dict):
+            return False
+        _deep_merge(target, data)
+        return True
+
+    def _resolve(self, path: List[Any]) -> Any:
+        target: Any = self.document.get("data") if self.document else None
+        for key in path:
+            try:
+                target = target[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return target
+
+
+def _deep_merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        current = target.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            _deep_merge(current, value)
+        else:
+            target[key] = value
+
+
+def merge_graphql_documents(documents: Iterable[dict]) -> Optional[dict]:
+    """Return the initial document of a response with its incremental payloads merged in."""
+    merger = DeferredPayloadMerger()
+    for document in documents:
+        merger.add(document)
+    return merger.document
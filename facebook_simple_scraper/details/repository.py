@@ -1,13 +1,16 @@
 import abc
+import asyncio
 import base64
 import json
 import time
-from typing import Optional
-
-import requests
+from typing import Callable, List, Optional
 
 from facebook_simple_scraper.details.extractor import GQLPostDetailExtractor, PostDetails
-from facebook_simple_scraper.requester.requester import Requester
+from facebook_simple_scraper.requester.async_requester import AsyncRequester, ThreadedAsyncRequester
+from facebook_simple_scraper.entities import Comment
+from facebook_simple_scraper.requester.requester import Requester, FacebookSessionBasedRequester
+
+GRAPHQL_URL = "https://web.facebook.com/api/graphql/"
 
 
 class PostDetailRepository(abc.ABC):
@@ -15,42 +18,117 @@ class PostDetailRepository(abc.ABC):
     def get_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
         raise NotImplementedError()
 
+    async def aget_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
+        """Async variant of ``get_details``. Runs the blocking call on a worker thread by default."""
+        return await asyncio.to_thread(self.get_details, post_id, max_comments)
+
+    def get_details_until(self, post_id: str, max_comments: int,
+                          should_stop: Optional[Callable[[List[Comment]], bool]] = None) -> Optional[PostDetails]:
+        """``get_details``, asking ``should_stop`` with the comments fetched so far before every further page.
+
+        Repositories that fetch the comments in a single request can ignore ``should_stop``.
+        """
+        return self.get_details(post_id, max_comments)
+
+    async def aget_details_until(self, post_id: str, max_comments: int,
+                                 should_stop: Optional[Callable[[List[Comment]], bool]] = None
+                                 ) -> Optional[PostDetails]:
+        """Async variant of ``get_details_until``."""
+        return await self.aget_details(post_id, max_comments)
+
 
 class GraphqlCommentsRepository(PostDetailRepository):
 
-    def __init__(self, requester: Requester, await_time: int = 1):
+    def __init__(self, requester: Requester, await_time: int = 1, gql_requester: Optional[Requester] = None):
+        """
+        Args:
+            requester: The logged-in requester. Only its session variables are used.
+            await_time: Seconds to wait between comment pages.
+            gql_requester: Requester used for the (unauthenticated) GraphQL calls.
+                Defaults to a fresh session without the mbasic default headers.
+        """
         self.requester = requester
-        self._cursor = None
         self._extractor = GQLPostDetailExtractor()
         self._await_time = await_time
-        self._no_auth_session = requests.Session()
+        if gql_requester is None:
+            gql_requester = FacebookSessionBasedRequester(base_headers={})
+        self._gql_requester = gql_requester
+        self._async_gql_requester: AsyncRequester = ThreadedAsyncRequester(gql_requester)
 
     def get_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
-        url = "https://web.facebook.com/api/graphql/"
-        variables = self.requester.load_session_variables()
+        return self.get_details_until(post_id, max_comments)
 
-        if 'fb_dtsg' not in variables:
-            raise Exception('No fb_dtsg found in session variables')
-        if 'target' not in variables:
-            raise Exception('No target found in session variables')
+    async def aget_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
+        return await self.aget_details_until(post_id, max_comments)
+
+    def get_details_until(self, post_id: str, max_comments: int,
+                          should_stop: Optional[Callable[[List[Comment]], bool]] = None) -> Optional[PostDetails]:
+        """Fetch the comment pages of a post until ``max_comments`` or ``should_stop``.
 
+        Each page is decoded from the response body once it has been downloaded
+        whole: the requesters buffer responses, nothing is decoded as it arrives.
+        """
+        variables = self._load_session_variables()
         all_comments = []
+        cursor = None
+        detail = PostDetails.empty()
         while True:
-            payload_dict = self._build_payload(post_id, variables)
+            payload_dict = self._build_payload(post_id, variables, cursor)
             headers = self._build_headers()
-            response = self._no_auth_session.request("POST", url, headers=headers, data=payload_dict)
-            detail = self._extractor.extract(response.text)
+            response = self._gql_requester.request("POST", GRAPHQL_URL, headers=headers, data=payload_dict)
+            page = self._extractor.extract(response.content)
+            if page is None:
+                # No GraphQL document in the response: keep what the previous pages returned
+                break
+            detail = page
             all_comments.extend(detail.comments)
             if detail.next_cursor is None or len(all_comments) >= max_comments:
                 break
-            self._cursor = detail.next_cursor
-            if self._cursor is None or self._cursor == "":
+            cursor = detail.next_cursor
+            if cursor is None or cursor == "":
+                break
+            if should_stop is not None and should_stop(all_comments):
                 break
             time.sleep(self._await_time)
-        self._cursor = None
         return detail
 
-    def _build_payload(self, post_id, vars_dict: dict):
+    async def aget_details_until(self, post_id: str, max_comments: int,
+                                 should_stop: Optional[Callable[[List[Comment]], bool]] = None
+                                 ) -> Optional[PostDetails]:
+        """Async variant of ``get_details_until``, decoding buffered response bodies as well."""
+        variables = self._load_session_variables()
+        all_comments = []
+        cursor = None
+        detail = PostDetails.empty()
+        while True:
+            payload_dict = self._build_payload(post_id, variables, cursor)
+            headers = self._build_headers()
+            response = await self._async_gql_requester.request("POST", GRAPHQL_URL, headers=headers,
+                                                               data=payload_dict)
+            page = self._extractor.extract(response.content)
+            if page is None:
+                break
+            detail = page
+            all_comments.extend(detail.comments)
+            if detail.next_cursor is None or len(all_comments) >= max_comments:
+                break
+            cursor = detail.next_cursor
+            if cursor is None or cursor == "":
+                break
+            if should_stop is not None and should_stop(all_comments):
+                break
+            await asyncio.sleep(self._await_time)
+        return detail
+
+    def _load_session_variables(self) -> dict:
+        variables = self.requester.load_session_variables()
+        if 'fb_dtsg' not in variables:
+            raise Exception('No fb_dtsg found in session variables')
+        if 'target' not in variables:
+            raise Exception('No target found in session variables')
+        return variables
+
+    def _build_payload(self, post_id, vars_dict: dict, cursor: Optional[str] = None):
         target = vars_dict['target']
         # variables = {
         #     "commentsAfterCount": -1,
@@ -70,8 +148,8 @@ class GraphqlCommentsRepository(PostDetailRepository):
             "__relay_internal__pv__CometUFIShareActionMigrationrelayprovider": True,
             "__relay_internal__pv__CometUFIReactionsEnableShortNamerelayprovider": True
         }
-        if self._cursor is not None:
-            variables["commentsAfterCursor"] = self._cursor
+        if cursor is not None:
+            variables["commentsAfterCursor"] = cursor
 
         payload_dict = {
             # "fb_api_req_friendly_name": "CometFocusedStoryViewUFIQuery",
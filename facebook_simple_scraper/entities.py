@@ -1,14 +1,27 @@
 import abc
+import copy
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Callable, List, Optional
 
 from pydantic import BaseModel, HttpUrl
 
 from facebook_simple_scraper.default_values import DEFAULT_MAX_COMMENTS_PER_POST, DEFAULT_SLEEP_TIME_MAX, \
-    DEFAULT_SLEEP_TIME_MIN
+    DEFAULT_SLEEP_TIME_MIN, DEFAULT_MAX_CONCURRENT_POST_DETAILS, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, \
+    DEFAULT_CREDENTIAL_LEASE_TIMEOUT
 from facebook_simple_scraper.requester import requester
+from facebook_simple_scraper.requester.cache import ResponseCache
+from facebook_simple_scraper.requester.cassette import Cassette
+from facebook_simple_scraper.requester.rate_limiter import RateLimiter
+from facebook_simple_scraper.requester.resilience import CircuitBreakers, RequestAttempt, RetryPolicy
+
+if TYPE_CHECKING:
+    from facebook_simple_scraper.checkpoints import CheckpointStore
+    from facebook_simple_scraper.credential_pool import CredentialPool
+    from facebook_simple_scraper.dedupe import SeenIds
+    from facebook_simple_scraper.posts.high_water_mark import HighWaterMarkStore
 
 
 class MediaQuality(Enum):
@@ -107,6 +120,36 @@ class PostList(BaseModel):
     profile_id: str
 
 
+@dataclass
+class AccountCrawlResult:
+    """One item of the merged stream returned by ``Scraper.crawl_accounts``.
+
+    Holds either a scraped ``post`` or, when crawling the account failed, the
+    ``error`` that stopped it.
+    """
+
+    account_id: str
+    post: Optional[Post] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class StopReport:
+    """A stop condition that cut a crawl, or the comments of a post, short."""
+
+    reason: str
+    """The stop condition that fired."""
+    saved_requests: int
+    """Requests the crawl would otherwise have made next: details of the posts left on the page, the next page
+    and the next comment page."""
+    scope: str = 'crawl'
+    """'crawl' when the crawl stopped, 'comments' when only the comment pagination of a post stopped."""
+
+
 class ScrapingCallbacks:
 
     def on_get_post_start(self, post_url: HttpUrl) -> None:
@@ -121,6 +164,9 @@ class ScrapingCallbacks:
     def on_get_comments_end(self, post: Post) -> None:
         pass
 
+    def on_stop(self, report: StopReport) -> None:
+        pass
+
 
 class UserInfo(BaseModel):
     username: str
@@ -130,7 +176,12 @@ class UserInfo(BaseModel):
 
 
 class StopCondition:
-    """Base class for defining stop conditions for the scraper."""
+    """Base class for defining stop conditions for the scraper.
+
+    Conditions deriving directly from this class are handed the whole list of
+    items scraped so far, which the repositories then have to keep. Prefer
+    :class:`IncrementalStopCondition`.
+    """
 
     def should_stop(self, post_list: List[Post]) -> bool:
         """Determine whether the scraping should stop.
@@ -144,6 +195,47 @@ class StopCondition:
         raise NotImplementedError
 
 
+class IncrementalStopCondition(StopCondition):
+    """Stop condition fed one scraped item at a time, keeping running counters.
+
+    Repositories call :meth:`observe` for every item they yield and
+    :meth:`should_stop` without arguments to decide whether to go on, so
+    checking costs O(1) whatever the length of the crawl. Every crawl works
+    on its own copy of the condition, made by :meth:`fresh`.
+    """
+
+    def observe(self, item: Any) -> None:
+        """Account for a scraped item (a post, or a marketplace listing)."""
+        raise NotImplementedError
+
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
+        """Whether to stop, given the items observed so far.
+
+        Args:
+            post_list (Optional[List[Post]]): Evaluate this list from scratch instead, as a legacy
+                :class:`StopCondition` would.
+        """
+        raise NotImplementedError
+
+    def should_stop_comments(self, comments: List['Comment']) -> bool:
+        """Whether to stop paginating the comments of the next item, given its comments fetched so far.
+
+        Only conditions that more comments cannot help (a comment budget, a
+        deadline) should return True. The item is observed once its comments
+        are fetched.
+        """
+        return False
+
+    def reset(self) -> None:
+        """Forget the items observed so far."""
+
+    def fresh(self) -> 'IncrementalStopCondition':
+        """A copy of this condition that has not observed anything, for a new crawl."""
+        condition = copy.copy(self)
+        condition.reset()
+        return condition
+
+
 @dataclass
 class ScraperOptions:
     """Class to hold configuration options for the scraper."""
@@ -157,10 +249,10 @@ class ScraperOptions:
     callbacks: ScrapingCallbacks = ScrapingCallbacks()
     """Callbacks to handle various events during scraping. Defaults to an instance of ScrapingCallbacks."""
 
-    sleep_time_min: int = DEFAULT_SLEEP_TIME_MIN
+    sleep_time_min: float = DEFAULT_SLEEP_TIME_MIN
     """Minimum sleep time (in seconds) between scraping actions. Defaults to DEFAULT_SLEEP_TIME_MIN."""
 
-    sleep_time_max: int = DEFAULT_SLEEP_TIME_MAX
+    sleep_time_max: float = DEFAULT_SLEEP_TIME_MAX
     """Maximum sleep time (in seconds) between scraping actions. Defaults to DEFAULT_SLEEP_TIME_MAX."""
 
     stop_conditions: Optional[List[StopCondition]] = None
@@ -168,3 +260,76 @@ class ScraperOptions:
 
     max_comments_per_post: int = DEFAULT_MAX_COMMENTS_PER_POST
     """Maximum number of comments to scrape per post. Defaults to DEFAULT_MAX_COMMENTS_PER_POST."""
+
+    max_concurrent_post_details: int = DEFAULT_MAX_CONCURRENT_POST_DETAILS
+    """Maximum number of posts of a timeline page whose comments/details are fetched in parallel.
+    Defaults to DEFAULT_MAX_CONCURRENT_POST_DETAILS. Use 1 to fetch them one at a time."""
+
+    response_cache: Optional[ResponseCache] = None
+    """Optional cache for timeline pages, GraphQL details and marketplace item pages. Defaults to None (no cache)."""
+
+    cassette: Optional[Cassette] = None
+    """Optional cassette to record every HTTP interaction to, or to replay them from (offline runs, without
+    sleeps). Defaults to None."""
+
+    rate_limiter: Optional[RateLimiter] = None
+    """Optional adaptive rate limiter shared by every repository. When set, requests are paced per account and
+    endpoint and the fixed sleep_time_min/sleep_time_max pauses between pages are disabled. Defaults to None."""
+
+    request_timeout: Optional[requester.Timeout] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+    """Seconds to wait for Facebook, as a single value or a (connect, read) tuple. None waits forever.
+    Defaults to (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)."""
+
+    retry_policy: Optional[RetryPolicy] = None
+    """Optional retry policy for scraping requests (idempotent GETs by default, with jittered exponential
+    backoff). Defaults to None (no retries, unless circuit_breakers or on_request_attempt are set, in which case
+    RetryPolicy() is used)."""
+
+    circuit_breakers: Optional[CircuitBreakers] = None
+    """Optional per-endpoint circuit breakers that fail fast with CircuitOpenError while an endpoint keeps
+    failing. Share one instance between scrapers to share endpoint health. Defaults to None."""
+
+    on_request_attempt: Optional[Callable[[RequestAttempt], None]] = None
+    """Optional callback receiving a RequestAttempt metric for every attempt of every scraping request, e.g. a
+    RequestMetrics instance. Defaults to None."""
+
+    credential_pool: Optional["CredentialPool"] = None
+    """Optional pool the credentials are leased from. Share one pool between scrapers to share credential
+    health and leases. Defaults to None (the scraper builds a pool from credentials)."""
+
+    credential_lease_timeout: Optional[float] = DEFAULT_CREDENTIAL_LEASE_TIMEOUT
+    """Seconds a crawl waits for a credential that is neither leased nor cooling down before failing with
+    NoCredentialAvailableError. None waits forever. Defaults to DEFAULT_CREDENTIAL_LEASE_TIMEOUT."""
+
+    parse_executor: Optional[Executor] = None
+    """Optional executor timeline and marketplace search pages are parsed on, typically a ProcessPoolExecutor
+    shared by every crawl. The next page is then downloaded while the current one is parsed. Defaults to None
+    (pages are parsed on the crawling thread)."""
+
+    fast_post_extraction: bool = False
+    """Whether timeline pages are parsed in a single pass by FastPostSummaryListExtractor instead of
+    PostSummaryListExtractor. Both return the same posts; the fast one is quicker, notably with the `fast` extra
+    installed. Defaults to False."""
+
+    streaming: bool = False
+    """Whether crawls run in constant memory, for crawls lasting days: stop conditions must be incremental,
+    marketplace duplicates are only detected among the latest DEFAULT_STREAMING_SEEN_IDS listings and only the
+    latest stop reports are kept. Defaults to False."""
+
+    checkpoint_store: Optional["CheckpointStore"] = None
+    """Optional store of crawl checkpoints (FileCheckpointStore, SqliteCheckpointStore). When set, timeline crawls
+    and marketplace searches save their position after every page and a crawl of the same account or filters, with
+    the same stop conditions, resumes from it, e.g. after a crash. Defaults to None."""
+
+    high_water_marks: Optional["HighWaterMarkStore"] = None
+    """Optional store of the posts seen of every account (FileHighWaterMarkStore, SqliteHighWaterMarkStore).
+    When set, timeline crawls are incremental: they skip the posts an earlier crawl of the account went through
+    and stop paging once they reach the ones a complete crawl saw. Defaults to None."""
+
+    listing_index: Optional["SeenIds"] = None
+    """Optional index every marketplace listing yielded is added to, typically a PersistentSeenIds shared by
+    every search and run. Defaults to None."""
+
+    new_listings_only: bool = False
+    """Whether marketplace searches skip the listings already in listing_index, before they are yielded.
+    Defaults to False."""
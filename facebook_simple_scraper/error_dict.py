@@ -28,3 +28,23 @@ class ApiError(Exception):
 
     def __init__(self, msg: str):
         super().__init__(f"API error: {msg}")
+
+
+class CassetteMissError(Exception):
+
+    def __init__(self, method: str, url: str):
+        super().__init__(f"No recorded response for {method} {url}")
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit open for endpoint '{endpoint}', retry in {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class NoCredentialAvailableError(Exception):
+
+    def __init__(self, msg: str):
+        super().__init__(f"No credential available. {msg}")
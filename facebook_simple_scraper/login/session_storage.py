@@ -27,7 +27,8 @@ class LocalFileSessionStorage(SessionStorage):
         session_filepath = self._get_session_filepath(username)
         try:
             with open(session_filepath, 'wb') as f:
-                pickle.dump(r, f)
+                # Decorators (cache, recording, ...) are rebuilt by the dependency builder.
+                pickle.dump(requester.unwrap_requester(r), f)
         except Exception as e:
             raise ValueError(f"Error saving session file for user {username}: {e}")
 
@@ -148,3 +148,20 @@ class MarketplaceListingDetail:
     vehicle_exterior_color: Optional[str] = None
     vehicle_interior_color: Optional[str] = None
     raw: Optional[dict] = None
+
+
+@dataclass
+class MarketplaceDetailResult:
+    """One item of the stream returned by ``get_marketplace_vehicle_details``.
+
+    Holds the ``detail`` of a listing (None when the page had no detail for
+    it) or, when fetching or parsing the page failed, the ``error``.
+    """
+
+    listing_id: str
+    detail: Optional[MarketplaceListingDetail] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
@@ -3,28 +3,36 @@
 Facebook embeds the data of the listings inside ``<script>`` tags as JSON
 (payloads of ``handleWithCustomApplyEach`` / ``RelayPrefetchedStreamCache``
 calls). The HTML itself is rendered later by React, so a plain BeautifulSoup
-extraction over the rendered DOM is unreliable. Instead, we walk every
-``<script>`` block, try to parse JSON fragments out of it, and recursively
-look for objects that look like a Marketplace listing
-(``__typename == "MarketplaceListing"``).
+extraction over the rendered DOM is unreliable. Instead, we locate every
+``<script>`` block with a lightweight scanner (no DOM is built), try to
+parse JSON fragments out of it, and index the objects that look like a
+Marketplace listing (``__typename == "MarketplaceListing"``) by typename.
 """
 import abc
 import json
 import os
 import re
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional
-
-from bs4 import BeautifulSoup
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
 
 from facebook_simple_scraper.marketplace.entities import (
     MarketplaceListingDetail,
     MarketplaceVehicleList,
     MarketplaceVehicleListing,
 )
+from facebook_simple_scraper.marketplace.json_index import JsonNodeIndex
+from facebook_simple_scraper.marketplace.script_scanner import iter_script_spans
+
+
+_LISTING_TYPENAMES = ("MarketplaceListing", "GroupCommerceProductItem")
 
+# Raw text that a payload must contain to be worth decoding
+_LISTINGS_MARKERS = ('"MarketplaceListing"', '"GroupCommerceProductItem"', '"page_info"')
+_DETAIL_MARKERS = ('"GroupCommerceProductItem"',)
 
-_LISTING_TYPENAMES = {"MarketplaceListing", "GroupCommerceProductItem"}
+
+def _str_or_none(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else None
 
 
 def _parse_price_string(text: Optional[str]) -> Optional[float]:
@@ -83,35 +91,27 @@ class MarketplaceListingsExtractor(MarketplaceListingsParser):
     """Extracts vehicle listings + pagination cursor from raw HTML."""
 
     def extract(self, html_content: str) -> MarketplaceVehicleList:
+        return self.extract_from_index(JsonNodeIndex.from_objects(self._iter_json_objects(html_content)))
+
+    def extract_from_index(self, index: JsonNodeIndex) -> MarketplaceVehicleList:
+        """Build the listings of a page already indexed by :func:`build_json_index`."""
         listings: List[MarketplaceVehicleListing] = []
-        cursor: Optional[str] = None
         seen_ids: set = set()
 
-        for obj in self._iter_json_objects(html_content):
-            for node in _walk(obj):
-                if not isinstance(node, dict):
-                    continue
-                typename = node.get("__typename")
-                if typename in _LISTING_TYPENAMES:
-                    listing = self._parse_listing(node)
-                    if listing is None:
-                        continue
-                    if listing.id in seen_ids:
-                        continue
-                    seen_ids.add(listing.id)
-                    listings.append(listing)
-                page_info = node.get("page_info")
-                if isinstance(page_info, dict):
-                    end_cursor = page_info.get("end_cursor")
-                    if end_cursor and not cursor:
-                        cursor = end_cursor
-
-        return MarketplaceVehicleList(listings=listings, cursor=cursor)
+        for node in index.nodes(*_LISTING_TYPENAMES):
+            listing = self._parse_listing(node)
+            if listing is None:
+                continue
+            if listing.id in seen_ids:
+                continue
+            seen_ids.add(listing.id)
+            listings.append(listing)
+
+        return MarketplaceVehicleList(listings=listings, cursor=index.end_cursor)
 
     # ----- listing parsing ----------------------------------------------
 
-    @staticmethod
-    def _parse_listing(node: Dict[str, Any]) -> Optional[MarketplaceVehicleListing]:
+    def _parse_listing(self, node: Dict[str, Any]) -> Optional[MarketplaceVehicleListing]:
         listing_id = node.get("id") or node.get("legacy_id") or node.get("story_id")
         if not listing_id:
             return None
@@ -123,7 +123,7 @@ class MarketplaceListingsExtractor(MarketplaceListingsParser):
             or node.get("name")
             or ""
         )
-        if not title:
+        if not isinstance(title, str) or not title:
             return None
 
         price_node = (
@@ -235,20 +235,21 @@ class MarketplaceListingsExtractor(MarketplaceListingsParser):
 
         url = f"https://www.facebook.com/marketplace/item/{listing_id}/"
 
+        # Keep only the strings the model declares, so one odd field does not fail the whole page
         return MarketplaceVehicleListing(
             id=listing_id,
             url=url,
             title=title,
-            price=price_str,
+            price=_str_or_none(price_str),
             price_amount=price_amount,
-            currency=currency,
+            currency=_str_or_none(currency),
             location=location,
             image_url=image_url,
-            seller_name=seller_name,
+            seller_name=_str_or_none(seller_name),
             seller_id=seller_id,
             seller_url=seller_url,
             creation_time=creation_time,
-            mileage=mileage,
+            mileage=_str_or_none(mileage),
             is_new=is_new,
             is_sold=is_sold,
             is_pending=is_pending,
@@ -258,7 +259,7 @@ class MarketplaceListingsExtractor(MarketplaceListingsParser):
     # ----- JSON discovery ----------------------------------------------
 
     def _iter_json_objects(self, html_content: str) -> Iterable[Any]:
-        return _iter_json_objects_from_html(html_content)
+        return _iter_json_objects_from_html(html_content, _LISTINGS_MARKERS)
 
 
 _RAW_DEBUG = os.environ.get("FB_MARKETPLACE_DEBUG_RAW") == "1"
@@ -277,19 +278,18 @@ class MarketplaceDetailExtractor:
         self, html_content: str, listing_id: str
     ) -> Optional[MarketplaceListingDetail]:
         """Parse *html_content* and return the detail for *listing_id*."""
+        return self.extract_from_index(build_json_index(html_content, _DETAIL_MARKERS), listing_id)
+
+    def extract_from_index(self, index: JsonNodeIndex, listing_id: str) -> Optional[MarketplaceListingDetail]:
+        """Return the detail for *listing_id* from a page already indexed by :func:`build_json_index`."""
         nodes: Dict[str, Dict[str, Any]] = {}
 
-        for obj in _iter_json_objects_from_html(html_content):
-            for node in _walk(obj):
-                if not isinstance(node, dict):
-                    continue
-                if node.get("__typename") != "GroupCommerceProductItem":
-                    continue
-                nid = str(node.get("id") or "")
-                if nid:
-                    if nid not in nodes:
-                        nodes[nid] = {}
-                    nodes[nid].update(node)
+        for node in index.nodes("GroupCommerceProductItem"):
+            nid = str(node.get("id") or "")
+            if nid:
+                if nid not in nodes:
+                    nodes[nid] = {}
+                nodes[nid].update(node)
 
         merged = nodes.get(str(listing_id))
         if merged is None:
@@ -395,9 +395,6 @@ class MarketplaceDetailExtractor:
             if val is not None:
                 mileage = f"{val} {unit}" if unit else str(val)
 
-        def _str_or_none(v: Any) -> Optional[str]:
-            return v if isinstance(v, str) else None
-
         is_sold = node.get("is_sold")
         if not isinstance(is_sold, bool):
             is_sold = None
@@ -433,34 +430,56 @@ class MarketplaceDetailExtractor:
         )
 
 
-def _iter_json_objects_from_html(html_content: str) -> Iterable[Any]:
-    """Yield JSON objects found inside all ``<script>`` blocks of *html_content*."""
-    soup = BeautifulSoup(html_content, "html.parser")
-    for script in soup.find_all("script"):
-        text = script.string or script.get_text() or ""
-        if not text or "{" not in text:
+def _iter_json_objects_from_html(
+    html_content: Union[str, bytes], markers: Optional[Sequence[str]] = None
+) -> Iterable[Any]:
+    """Yield JSON objects found inside all ``<script>`` blocks of *html_content*.
+
+    Script bodies are located by :func:`iter_script_spans` and decoded in
+    place, without building a DOM or copying them out of a ``str`` document.
+    ``bytes`` documents are decoded one script body at a time. With
+    ``markers``, only objects whose raw text contains one of them are
+    decoded (see :func:`_extract_json_objects`).
+    """
+    is_bytes = isinstance(html_content, (bytes, bytearray))
+    for start, end in iter_script_spans(html_content):
+        if is_bytes:
+            text = bytes(html_content[start:end]).decode("utf-8", errors="replace")
+            start, end = 0, len(text)
+        else:
+            text = html_content
+        if text.find("{", start, end) == -1:
             continue
-        for obj in _extract_json_objects(text):
+        for obj in _extract_json_objects(text, start, end, markers):
             yield obj
 
 
-def _walk(obj: Any) -> Iterable[Any]:
-    """Yield ``obj`` and every nested dict / list element recursively."""
-    stack = [obj]
-    while stack:
-        cur = stack.pop()
-        yield cur
-        if isinstance(cur, dict):
-            stack.extend(cur.values())
-        elif isinstance(cur, list):
-            stack.extend(cur)
+def build_json_index(
+    html_content: Union[str, bytes], markers: Optional[Sequence[str]] = _LISTINGS_MARKERS
+) -> JsonNodeIndex:
+    """Decode the marketplace payloads of *html_content* into a :class:`JsonNodeIndex`.
+
+    The default markers cover both extractors, so one index can be handed to
+    ``extract_from_index`` of each of them.
+    """
+    return JsonNodeIndex.from_objects(_iter_json_objects_from_html(html_content, markers))
 
 
 _OBJ_START_RE = re.compile(r"\{")
+# What the marker scan stops at: braces, string quotes and comment openers
+_SCAN_RE = re.compile(r"""[{"']|/[/*]""")
+_JSON_OBJECT_START_RE = re.compile(r'\{\s*"')
+# JS string literals cannot span lines; a quote without its pair on the line is not a string
+_STRING_END_RE = {
+    '"': re.compile(r'[^"\\\n]*(?:\\.[^"\\\n]*)*"', re.DOTALL),
+    "'": re.compile(r"[^'\\\n]*(?:\\.[^'\\\n]*)*'", re.DOTALL),
+}
 
 
-def _extract_json_objects(text: str) -> Iterable[Any]:
-    """Yield every top-level JSON object that can be decoded inside ``text``.
+def _extract_json_objects(
+    text: str, start: int = 0, end: Optional[int] = None, markers: Optional[Sequence[str]] = None
+) -> Iterable[Any]:
+    """Yield every top-level JSON object that can be decoded inside ``text[start:end]``.
 
     Facebook scripts often look like::
 
@@ -468,20 +487,73 @@ def _extract_json_objects(text: str) -> Iterable[Any]:
         require("RelayPrefetchedStreamCache").next({...});
 
     We scan for ``{`` characters and try to incrementally JSON-decode from
-    each, advancing past successfully-decoded objects.
+    each, advancing past successfully-decoded objects. Objects running past
+    ``end`` are ignored.
+
+    With ``markers``, only objects whose raw text contains one of them are
+    yielded, and decoding is only attempted at a ``{`` that opens a JSON
+    object (``{"``) outside of JS string literals and comments, ahead of the
+    last marker. A payload is then decoded once instead of at every brace.
     """
+    n = len(text) if end is None else end
+    if markers is None:
+        # A failed decode counts the newlines before the error for its message; decoding at
+        # every brace of a large document is only affordable on a copy of the script
+        return _extract_all_json_objects(text[start:n], 0, n - start)
+    return _extract_marked_json_objects(text, start, n, markers)
+
+
+def _extract_all_json_objects(text: str, start: int, end: int) -> Iterable[Any]:
     decoder = json.JSONDecoder()
-    i = 0
-    n = len(text)
-    while i < n:
-        match = _OBJ_START_RE.search(text, i)
+    i = start
+    while i < end:
+        match = _OBJ_START_RE.search(text, i, end)
         if not match:
             return
-        start = match.start()
+        obj_start = match.start()
         try:
-            obj, end = decoder.raw_decode(text, start)
+            obj, obj_end = decoder.raw_decode(text, obj_start)
         except ValueError:
-            i = start + 1
+            i = obj_start + 1
+            continue
+        if obj_end > end:
+            i = obj_start + 1
             continue
         yield obj
-        i = end
+        i = obj_end
+
+
+def _extract_marked_json_objects(text: str, start: int, end: int, markers: Sequence[str]) -> Iterable[Any]:
+    last_marker = max(text.rfind(marker, start, end) for marker in markers)
+    if last_marker == -1:
+        return
+    decoder = json.JSONDecoder()
+    i = start
+    while i < last_marker:
+        match = _SCAN_RE.search(text, i, last_marker)
+        if not match:
+            return
+        token = match.group(0)
+        pos = match.start()
+        if token == "{":
+            i = pos + 1
+            if not _JSON_OBJECT_START_RE.match(text, pos, end):
+                continue
+            try:
+                obj, obj_end = decoder.raw_decode(text, pos)
+            except ValueError:
+                continue
+            if obj_end > end:
+                continue
+            if any(text.find(marker, pos, obj_end) != -1 for marker in markers):
+                yield obj
+            i = obj_end
+        elif token == "//":
+            newline = text.find("\n", pos, end)
+            i = end if newline == -1 else newline + 1
+        elif token == "/*":
+            closing = text.find("*/", pos + 2, end)
+            i = end if closing == -1 else closing + 2
+        else:
+            string_end = _STRING_END_RE[token].match(text, pos + 1, end)
+            i = pos + 1 if string_end is None else string_end.end()
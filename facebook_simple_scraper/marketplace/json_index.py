@@ -0,0 +1,90 @@
+"""Index the nodes of decoded Facebook payloads by ``__typename``.
+
+The marketplace extractors only care about a few kinds of node (listings,
+product items, ``page_info`` cursors) buried in large JSON payloads.
+:class:`JsonNodeIndex` walks every decoded object once and records every
+dict carrying a ``__typename`` and every ``page_info.end_cursor``, so several
+extractors can query one page without walking it again.
+
+Subtrees under keys that only hold module definitions, resource maps or
+feature flags (``PRUNED_KEYS``) are not walked, and scalars are never pushed
+on the traversal stack.
+"""
+import heapq
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+PRUNED_KEYS: FrozenSet[str] = frozenset({
+    "allResources",
+    "bxData",
+    "clpData",
+    "compMap",
+    "gkxData",
+    "hsrp",
+    "ixData",
+    "justknobxData",
+    "qexData",
+    "qplData",
+    "rsrcMap",
+})
+
+
+class JsonNodeIndex:
+    """One-pass index from ``__typename`` to nodes and of pagination cursors.
+
+    Nodes are returned in the order the previous depth-first walk of the
+    extractors visited them, so the first cursor and the order of listings do
+    not change.
+    """
+
+    def __init__(self, pruned_keys: FrozenSet[str] = PRUNED_KEYS):
+        self.pruned_keys = pruned_keys
+        self._nodes: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        self._end_cursors: List[str] = []
+        self._seq = 0
+
+    @classmethod
+    def from_objects(cls, objects: Iterable[Any], pruned_keys: FrozenSet[str] = PRUNED_KEYS) -> "JsonNodeIndex":
+        index = cls(pruned_keys)
+        for obj in objects:
+            index.add(obj)
+        return index
+
+    def add(self, obj: Any) -> None:
+        """Index every node of the decoded JSON value ``obj``."""
+        pruned_keys = self.pruned_keys
+        stack = [obj] if isinstance(obj, (dict, list)) else []
+        while stack:
+            cur = stack.pop()
+            if isinstance(cur, list):
+                stack.extend(v for v in cur if isinstance(v, (dict, list)))
+                continue
+            typename = cur.get("__typename")
+            if isinstance(typename, str):
+                self._nodes.setdefault(typename, []).append((self._seq, cur))
+                self._seq += 1
+            page_info = cur.get("page_info")
+            if isinstance(page_info, dict):
+                end_cursor = page_info.get("end_cursor")
+                if end_cursor:
+                    self._end_cursors.append(end_cursor)
+            stack.extend(v for k, v in cur.items() if isinstance(v, (dict, list)) and k not in pruned_keys)
+
+    def nodes(self, *typenames: str) -> List[Dict[str, Any]]:
+        """Return the nodes of any of ``typenames``, in traversal order."""
+        groups = [self._nodes.get(typename, []) for typename in typenames]
+        if len(groups) == 1:
+            return [node for _, node in groups[0]]
+        return [node for _, node in heapq.merge(*groups, key=lambda entry: entry[0])]
+
+    @property
+    def typenames(self) -> List[str]:
+        return list(self._nodes)
+
+    @property
+    def end_cursors(self) -> List[str]:
+        return list(self._end_cursors)
+
+    @property
+    def end_cursor(self) -> Optional[str]:
+        """The first ``page_info.end_cursor`` found, which is the page's cursor."""
+        return self._end_cursors[0] if self._end_cursors else None
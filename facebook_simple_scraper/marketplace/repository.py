@@ -1,15 +1,25 @@
+import asyncio
+import json
 import os
+import re
 import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from random import randint
-from typing import Iterable, List, Optional
+from random import uniform
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlencode
 
-from facebook_simple_scraper.entities import StopCondition
+from facebook_simple_scraper.checkpoints import CheckpointStore, CrawlCheckpoint
+from facebook_simple_scraper.dedupe import SeenIds, seen_ids_for
+from facebook_simple_scraper.default_values import DEFAULT_MAX_CONCURRENT_LISTING_DETAILS, \
+    DEFAULT_STREAMING_SEEN_IDS
+from facebook_simple_scraper.entities import StopCondition, StopReport
 from facebook_simple_scraper.marketplace.entities import (
     DaysSinceListed,
+    MarketplaceDetailResult,
     MarketplaceListingDetail,
     MarketplaceVehicleFilters,
+    MarketplaceVehicleList,
     MarketplaceVehicleListing,
     VehicleAvailability,
     VehicleCondition,
@@ -19,15 +29,29 @@ from facebook_simple_scraper.marketplace.extractor import (
     MarketplaceListingsExtractor,
     MarketplaceListingsParser,
 )
+from facebook_simple_scraper.pipeline import PagePipeline, parser_task
+from facebook_simple_scraper.requester.async_requester import AsyncRequester, ThreadedAsyncRequester
 from facebook_simple_scraper.requester.requester import Requester
+from facebook_simple_scraper.stop_conditions import StopConditionSet
 
 
 @dataclass
 class GetMarketplaceVehiclesOptions:
     requester: Requester
     parser: MarketplaceListingsParser
-    sleep_time_min: int = 5
-    sleep_time_max: int = 10
+    sleep_time_min: float = 5
+    sleep_time_max: float = 10
+    async_requester: Optional[AsyncRequester] = None
+    parse_executor: Optional[Executor] = None
+    on_stop: Optional[Callable[[StopReport], None]] = None
+    streaming: bool = False
+    max_seen_ids: int = DEFAULT_STREAMING_SEEN_IDS
+    checkpoint_store: Optional[CheckpointStore] = None
+    listing_index: Optional[SeenIds] = None
+    new_only: bool = False
+
+
+_END_CURSOR_RE = re.compile(r'"end_cursor"\s*:\s*"((?:[^"\\]|\\.)*)"')
 
 
 def _price_in_range(
@@ -60,32 +84,57 @@ class MarketplaceVehicleRepository:
         self._sleep_time_min = opts.sleep_time_min
         self._sleep_time_max = opts.sleep_time_max
         self._cursor: Optional[str] = None
+        self._pages_read = 0
+        self._parse_executor = opts.parse_executor
+        self._on_stop = opts.on_stop
+        self._streaming = opts.streaming
+        self._max_seen_ids = opts.max_seen_ids
+        self._checkpoint_store = opts.checkpoint_store
+        self._listing_index = opts.listing_index
+        self._new_only = opts.new_only
+        self._stop_reports: List[StopReport] = []
+        if opts.async_requester is not None:
+            self._async_requester = opts.async_requester
+        else:
+            self._async_requester = ThreadedAsyncRequester(opts.requester)
 
     def search(
         self,
         filters: MarketplaceVehicleFilters,
         stop_conditions: Optional[List[StopCondition]] = None,
+        max_pages: Optional[int] = None,
+        index_listings: bool = True,
     ) -> Iterable[MarketplaceVehicleListing]:
         """Yield vehicle listings matching ``filters``.
 
         Pagination is handled automatically using the ``end_cursor`` returned
-        by Facebook. Iteration stops when no further cursor is found or any
-        of the supplied ``stop_conditions`` returns True.
+        by Facebook. Iteration stops when no further cursor is found, after
+        ``max_pages`` pages or when any of the supplied ``stop_conditions``
+        returns True, which is checked before every listing. Each stop is
+        reported (see ``get_stop_reports``).
+
+        In streaming mode, duplicates are only looked for among the
+        ``max_seen_ids`` latest listings, so memory stays constant.
+
+        With a checkpoint store, a search with the same filters resumes from
+        the checkpoint a previous run left and saves one after every page.
+
+        With a listing index, every listing yielded is added to it once the
+        consumer asks for the next one, unless ``index_listings`` is False
+        (e.g. when the consumer only queues listings for someone else and
+        indexes them once they are delivered). In new-only mode, listings
+        already in the index are skipped: they are neither yielded nor
+        counted by the stop conditions.
         """
-        stop_conditions = stop_conditions or []
-        seen_ids: set = set()
-        accumulated: List = []
-        self._cursor = None
+        conditions = StopConditionSet(stop_conditions, self._on_stop, self._streaming)
+        self._stop_reports = conditions.reports
+        seen_ids = self._resume(filters, conditions)
         debug = os.environ.get("FB_MARKETPLACE_DEBUG") == "1"
         debug_raw = os.environ.get("FB_MARKETPLACE_DEBUG_RAW") == "1"
 
-        while True:
-            url = self._build_url(filters, cursor=self._cursor)
-            if debug:
-                print(f"[fb-marketplace] GET {url}")
-            response = self._requester.request("GET", url)
-            page = self._parser.extract(response.text)
+        for page in self._iter_pages(filters, debug):
             self._cursor = page.cursor
+            self._pages_read += 1
             if debug:
                 print(
                     f"[fb-marketplace] extracted {len(page.listings)} listings "
@@ -93,35 +142,67 @@ class MarketplaceVehicleRepository:
                 )
 
             for listing in page.listings:
-                if listing.id in seen_ids:
+                if not self._accept_listing(listing, filters, seen_ids, debug, debug_raw) or self._is_known(listing):
                     continue
-                seen_ids.add(listing.id)
-                if not _price_in_range(listing.price_amount, filters):
-                    if debug:
-                        print(
-                            f"[fb-marketplace] DROP price={listing.price_amount!r} "
-                            f"str={listing.price!r} id={listing.id} "
-                            f"title={listing.title[:60]!r}"
-                        )
+                if conditions.check(saved_requests=1 if self._cursor else 0):
+                    break
+                conditions.observe(listing)
+                yield listing
+                if index_listings:
+                    self._index(listing)
+
+            if conditions.stopped or not self._cursor or self._pages_read == max_pages \
+                    or conditions.check(saved_requests=1):
+                break
+            self._save_checkpoint(filters, conditions, seen_ids)
+        self._delete_checkpoint(filters, conditions)
+
+    async def asearch(
+        self,
+        filters: MarketplaceVehicleFilters,
+        stop_conditions: Optional[List[StopCondition]] = None,
+        max_pages: Optional[int] = None,
+        index_listings: bool = True,
+    ) -> AsyncIterator[MarketplaceVehicleListing]:
+        """Async variant of :meth:`search`.
+
+        Pages are fetched through the async requester and parsed on the
+        default executor, so the event loop stays free while a search page
+        is downloaded or decoded.
+        """
+        conditions = StopConditionSet(stop_conditions, self._on_stop, self._streaming)
+        self._stop_reports = conditions.reports
+        seen_ids = await asyncio.to_thread(self._resume, filters, conditions)
+        debug = os.environ.get("FB_MARKETPLACE_DEBUG") == "1"
+        debug_raw = os.environ.get("FB_MARKETPLACE_DEBUG_RAW") == "1"
+        loop = asyncio.get_running_loop()
+        extract = parser_task(self._parser, 'extract', self._parse_executor)
+
+        while True:
+            url = self._build_url(filters, cursor=self._cursor)
+            if debug:
+                print(f"[fb-marketplace] GET {url}")
+            response = await self._async_requester.request("GET", url)
+            page = await loop.run_in_executor(self._parse_executor, extract, response.text)
+            self._cursor = page.cursor
+            self._pages_read += 1
+
+            for listing in page.listings:
+                if not self._accept_listing(listing, filters, seen_ids, debug, debug_raw) or self._is_known(listing):
                     continue
-                if debug:
-                    print(
-                        f"[fb-marketplace] KEEP price={listing.price_amount!r} "
-                        f"str={listing.price!r} id={listing.id} "
-                        f"title={listing.title[:60]!r}"
-                    )
-                if debug_raw and listing.raw is not None:
-                    import json as _json
-                    print("[fb-marketplace] RAW:", _json.dumps(listing.raw, default=str)[:2000])
-                accumulated.append(listing)
+                if conditions.check(saved_requests=1 if self._cursor else 0):
+                    break
+                conditions.observe(listing)
                 yield listing
+                if index_listings:
+                    self._index(listing)
 
-            if not self._cursor:
-                return
-            for cond in stop_conditions:
-                if cond.should_stop(accumulated):
-                    return
-            self._sleep()
+            if conditions.stopped or not self._cursor or self._pages_read == max_pages \
+                    or conditions.check(saved_requests=1):
+                break
+            await asyncio.to_thread(self._save_checkpoint, filters, conditions, seen_ids)
+            await asyncio.sleep(self._sleep_time())
+        await asyncio.to_thread(self._delete_checkpoint, filters, conditions)
 
     def get_detail(self, listing_id: str) -> Optional[MarketplaceListingDetail]:
         """Fetch and parse the detail page for a single listing.
@@ -134,16 +215,214 @@ class MarketplaceVehicleRepository:
             A :class:`MarketplaceListingDetail` if data could be extracted,
             ``None`` otherwise.
         """
-        url = f"https://www.facebook.com/marketplace/item/{listing_id}/"
-        response = self._requester.request("GET", url)
+        response = self._requester.request("GET", self._detail_url(listing_id))
         extractor = MarketplaceDetailExtractor()
         return extractor.extract(response.text, listing_id)
 
+    def get_details(
+        self,
+        listing_ids: Iterable[str],
+        workers: int = DEFAULT_MAX_CONCURRENT_LISTING_DETAILS,
+    ) -> Iterable[MarketplaceDetailResult]:
+        """Fetch and parse the detail pages of many listings, yielding each as soon as it is parsed.
+
+        Up to ``workers`` pages are downloaded at once. Pages are parsed on
+        the parse executor (or on a thread of their own without one), so
+        downloads go on while a page is parsed, and at most ``2 * workers``
+        listings are in flight. A listing that fails yields a result carrying
+        the error; the others keep going.
+
+        Args:
+            listing_ids: The numeric listing IDs. Duplicates are fetched once.
+            workers: Maximum number of detail pages downloaded at the same time.
+
+        Yields:
+            MarketplaceDetailResult: The detail of a listing, or its error, in completion order.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        ids = iter(dict.fromkeys(listing_ids))
+        fetch_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="listing-detail")
+        parse_executor = self._parse_executor
+        own_parse_executor = parse_executor is None
+        if own_parse_executor:
+            parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="listing-detail-parse")
+        extract = parser_task(MarketplaceDetailExtractor(), 'extract', parse_executor)
+        # The listing of every future, and whether its page is being downloaded (else parsed)
+        in_flight: Dict[Future, Tuple[str, bool]] = {}
+
+        def fetch(listing_id: str) -> str:
+            return self._requester.request("GET", self._detail_url(listing_id)).text
+
+        def fill() -> None:
+            while len(in_flight) < 2 * workers:
+                listing_id = next(ids, None)
+                if listing_id is None:
+                    return
+                in_flight[fetch_executor.submit(fetch, listing_id)] = (listing_id, True)
+
+        try:
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listing_id, downloaded = in_flight.pop(future)
+                    error = future.exception()
+                    if downloaded and error is None:
+                        in_flight[parse_executor.submit(extract, future.result(), listing_id)] = (listing_id, False)
+                        continue
+                    if error is not None:
+                        yield MarketplaceDetailResult(listing_id=listing_id, error=error)
+                    else:
+                        yield MarketplaceDetailResult(listing_id=listing_id, detail=future.result())
+                fill()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            fetch_executor.shutdown(wait=False, cancel_futures=True)
+            if own_parse_executor:
+                parse_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aget_detail(self, listing_id: str) -> Optional[MarketplaceListingDetail]:
+        """Async variant of :meth:`get_detail`."""
+        response = await self._async_requester.request("GET", self._detail_url(listing_id))
+        extractor = MarketplaceDetailExtractor()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, extractor.extract, response.text, listing_id)
+
     def get_cursor(self) -> Optional[str]:
         return self._cursor
 
+    def get_pages_read(self) -> int:
+        """How many search pages the latest search read."""
+        return self._pages_read
+
+    def get_stop_reports(self) -> List[StopReport]:
+        """The stops of the latest search."""
+        return list(self._stop_reports)
+
     # -------- helpers ---------------------------------------------------
 
+    def _resume(self, filters: MarketplaceVehicleFilters, conditions: StopConditionSet) -> SeenIds:
+        """Start from the checkpoint of ``filters`` if there is one. Returns the ids seen so far."""
+        self._cursor = None
+        self._pages_read = 0
+        checkpoint = self._checkpoint_store.load(self._checkpoint_key(filters, conditions)) \
+            if self._checkpoint_store is not None else None
+        if checkpoint is None:
+            return seen_ids_for(self._max_seen_ids if self._streaming else None)
+        self._cursor = checkpoint.cursor
+        conditions.restore(checkpoint.stop_conditions)
+        return checkpoint.seen_ids
+
+    def _is_known(self, listing: MarketplaceVehicleListing) -> bool:
+        """Whether new-only mode skips ``listing``, yielded by an earlier search."""
+        return self._new_only and self._listing_index is not None and listing.id in self._listing_index
+
+    def _index(self, listing: MarketplaceVehicleListing) -> None:
+        if self._listing_index is not None:
+            self._listing_index.add(listing.id)
+
+    def _save_checkpoint(self, filters: MarketplaceVehicleFilters, conditions: StopConditionSet,
+                         seen_ids: SeenIds) -> None:
+        # The index is written first, so a resumed search does not yield the listings of the page again
+        if self._listing_index is not None:
+            self._listing_index.flush()
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.save(self._checkpoint_key(filters, conditions), CrawlCheckpoint(
+                cursor=self._cursor, seen_ids=seen_ids, stop_conditions=conditions.conditions))
+
+    def _delete_checkpoint(self, filters: MarketplaceVehicleFilters, conditions: StopConditionSet) -> None:
+        if self._listing_index is not None:
+            self._listing_index.flush()
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.delete(self._checkpoint_key(filters, conditions))
+
+    @classmethod
+    def _checkpoint_key(cls, filters: MarketplaceVehicleFilters, conditions: StopConditionSet) -> str:
+        # A search with other stop conditions does not carry on with the counters of this one
+        return f"marketplace:{cls._build_url(filters)}:{conditions.digest()}"
+
+    def _iter_pages(self, filters: MarketplaceVehicleFilters, debug: bool) -> Iterable[MarketplaceVehicleList]:
+        """Yield the parsed search pages, pausing before every page but the first.
+
+        With a parse executor, pages are parsed on it while the next page is
+        downloaded (see :class:`PagePipeline`).
+        """
+
+        def fetch(url: str) -> str:
+            if debug:
+                print(f"[fb-marketplace] GET {url}")
+            return self._requester.request("GET", url).text
+
+        def next_url(page: MarketplaceVehicleList) -> Optional[str]:
+            return self._build_url(filters, cursor=page.cursor) if page.cursor else None
+
+        url = self._build_url(filters, cursor=self._cursor)
+        if self._parse_executor is not None:
+            pipeline = PagePipeline(
+                fetch=fetch,
+                parse=parser_task(self._parser, 'extract', self._parse_executor),
+                next_url=next_url,
+                peek_next_url=lambda html: self._peek_next_url(filters, html),
+                parse_executor=self._parse_executor,
+                pause=self._sleep_time,
+            )
+            yield from pipeline.pages(url)
+            return
+        while url:
+            page = self._parser.extract(fetch(url))
+            yield page
+            url = next_url(page)
+            if url:
+                self._sleep()
+
+    @classmethod
+    def _peek_next_url(cls, filters: MarketplaceVehicleFilters, html_content: str) -> Optional[str]:
+        """The search URL for the first ``end_cursor`` of ``html_content``, without decoding its payloads."""
+        match = _END_CURSOR_RE.search(html_content)
+        if match is None:
+            return None
+        try:
+            cursor = json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            return None
+        return cls._build_url(filters, cursor=cursor) if cursor else None
+
+    @staticmethod
+    def _detail_url(listing_id: str) -> str:
+        return f"https://www.facebook.com/marketplace/item/{listing_id}/"
+
+    @staticmethod
+    def _accept_listing(
+        listing: MarketplaceVehicleListing,
+        filters: MarketplaceVehicleFilters,
+        seen_ids: SeenIds,
+        debug: bool,
+        debug_raw: bool,
+    ) -> bool:
+        """Dedupe + price-filter a listing, logging the decision in debug mode."""
+        if not seen_ids.add(listing.id):
+            return False
+        if not _price_in_range(listing.price_amount, filters):
+            if debug:
+                print(
+                    f"[fb-marketplace] DROP price={listing.price_amount!r} "
+                    f"str={listing.price!r} id={listing.id} "
+                    f"title={listing.title[:60]!r}"
+                )
+            return False
+        if debug:
+            print(
+                f"[fb-marketplace] KEEP price={listing.price_amount!r} "
+                f"str={listing.price!r} id={listing.id} "
+                f"title={listing.title[:60]!r}"
+            )
+        if debug_raw and listing.raw is not None:
+            import json as _json
+            print("[fb-marketplace] RAW:", _json.dumps(listing.raw, default=str)[:2000])
+        return True
+
     @staticmethod
     def _build_url(
         filters: MarketplaceVehicleFilters, cursor: Optional[str] = None
@@ -187,13 +466,24 @@ class MarketplaceVehicleRepository:
     def _sleep(self) -> None:
         if self._sleep_time_max <= 0:
             return
-        time.sleep(randint(self._sleep_time_min, self._sleep_time_max))
+        time.sleep(self._sleep_time())
+
+    def _sleep_time(self) -> float:
+        if self._sleep_time_max <= 0:
+            return 0
+        return uniform(self._sleep_time_min, self._sleep_time_max)
 
 
 def build_default_marketplace_repository(
     requester: Requester,
-    sleep_time_min: int = 5,
-    sleep_time_max: int = 10,
+    sleep_time_min: float = 5,
+    sleep_time_max: float = 10,
+    parse_executor: Optional[Executor] = None,
+    on_stop: Optional[Callable[[StopReport], None]] = None,
+    streaming: bool = False,
+    checkpoint_store: Optional[CheckpointStore] = None,
+    listing_index: Optional[SeenIds] = None,
+    new_only: bool = False,
 ) -> MarketplaceVehicleRepository:
     return MarketplaceVehicleRepository(
         GetMarketplaceVehiclesOptions(
@@ -201,5 +491,11 @@ def build_default_marketplace_repository(
             parser=MarketplaceListingsExtractor(),
             sleep_time_min=sleep_time_min,
             sleep_time_max=sleep_time_max,
+            parse_executor=parse_executor,
+            on_stop=on_stop,
+            streaming=streaming,
+            checkpoint_store=checkpoint_store,
+            listing_index=listing_index,
+            new_only=new_only,
         )
     )
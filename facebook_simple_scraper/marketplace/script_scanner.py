@@ -0,0 +1,60 @@
+"""Locate ``<script>`` bodies in an HTML document without parsing it.
+
+Marketplace pages are several megabytes of HTML whose only interesting
+content is the JSON embedded in ``<script>`` tags. :func:`iter_script_spans`
+finds those tags with a handful of regular expression searches and yields
+the ``(start, end)`` offsets of every body, so callers can decode JSON
+straight out of the original string (``json.JSONDecoder.raw_decode`` takes a
+start index) instead of copying it into a tree first.
+
+Script bodies are raw text: like an HTML parser, the scanner ends a body at
+the first ``</script`` and skips ``<script>`` tags that sit inside HTML
+comments.
+"""
+import re
+from typing import AnyStr, Iterator, Pattern, Tuple
+
+_TAG_OR_COMMENT = r"""<!--|<script\b(?:[^>"']|"[^"]*"|'[^']*')*>"""
+_COMMENT_END = r"-->"
+_SCRIPT_END = r"</script[\t\n\f\r />]|</script\Z"
+
+_STR_PATTERNS = (
+    re.compile(_TAG_OR_COMMENT, re.IGNORECASE),
+    re.compile(_COMMENT_END),
+    re.compile(_SCRIPT_END, re.IGNORECASE),
+)
+_BYTES_PATTERNS = (
+    re.compile(_TAG_OR_COMMENT.encode("ascii"), re.IGNORECASE),
+    re.compile(_COMMENT_END.encode("ascii")),
+    re.compile(_SCRIPT_END.encode("ascii"), re.IGNORECASE),
+)
+
+
+def _patterns(document: AnyStr) -> Tuple[Pattern, Pattern, Pattern]:
+    return _BYTES_PATTERNS if isinstance(document, (bytes, bytearray)) else _STR_PATTERNS
+
+
+def iter_script_spans(document: AnyStr) -> Iterator[Tuple[int, int]]:
+    """Yield the ``(start, end)`` offsets of the body of every ``<script>`` of ``document``.
+
+    ``document`` may be a ``str`` or UTF-8 ``bytes``; offsets index into it.
+    A script left open at the end of the document runs to its end.
+    """
+    tag_or_comment, comment_end, script_end = _patterns(document)
+    n = len(document)
+    pos = 0
+    while pos < n:
+        match = tag_or_comment.search(document, pos)
+        if match is None:
+            return
+        if match.group(0)[1:2] in ("!", b"!"):
+            closing = comment_end.search(document, match.end())
+            if closing is None:
+                return
+            pos = closing.end()
+            continue
+        start = match.end()
+        closing = script_end.search(document, start)
+        end = closing.start() if closing is not None else n
+        yield start, end
+        pos = end
@@ -0,0 +1,385 @@
+"""Sweeping a whole region of Marketplace, one circle at a time.
+
+A search covers a single ``latitude``/``longitude``/``radius_km`` circle and
+Facebook only paginates so deep into it. A region (a bounding box, or
+polygons loaded from a GeoJSON file) is cut into a grid of square tiles,
+each searched through the circle drawn around it, so neighbouring circles
+overlap and the region is covered without gaps. A tile whose search reads
+``max_pages_per_tile`` pages is too dense to be read completely: it is split
+into four smaller tiles, down to ``min_radius_km``.
+
+Regions crossing the antimeridian are not supported.
+"""
+import abc
+import json
+import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from facebook_simple_scraper.dedupe import SeenIds, seen_ids_for
+from facebook_simple_scraper.default_values import DEFAULT_CRAWL_WORKERS, DEFAULT_MAX_PAGES_PER_TILE, \
+    DEFAULT_MIN_TILE_RADIUS_KM, DEFAULT_STREAMING_SEEN_IDS, DEFAULT_TILE_RADIUS_KM
+from facebook_simple_scraper.entities import StopCondition, StopReport
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters, MarketplaceVehicleListing
+from facebook_simple_scraper.marketplace.repository import MarketplaceVehicleRepository
+from facebook_simple_scraper.stop_conditions import StopConditionSet
+
+KM_PER_DEGREE = 111.32
+# Keeps the longitude step finite close to the poles
+_MIN_COS_LATITUDE = 0.01
+
+Point = Tuple[float, float]
+"""A (longitude, latitude) pair, in GeoJSON order."""
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    """A latitude/longitude rectangle, in decimal degrees."""
+
+    south: float
+    west: float
+    north: float
+    east: float
+
+    def __post_init__(self):
+        if self.south >= self.north or self.west >= self.east:
+            raise ValueError(f"Empty bounding box: {self}")
+
+    def intersects(self, other: 'BoundingBox') -> bool:
+        return (self.south <= other.north and other.south <= self.north
+                and self.west <= other.east and other.west <= self.east)
+
+    def contains(self, point: Point) -> bool:
+        longitude, latitude = point
+        return self.south <= latitude <= self.north and self.west <= longitude <= self.east
+
+    def corners(self) -> List[Point]:
+        return [(self.west, self.south), (self.east, self.south), (self.east, self.north), (self.west, self.north)]
+
+
+class Region(abc.ABC):
+    """An area to sweep."""
+
+    @property
+    @abc.abstractmethod
+    def bounds(self) -> BoundingBox:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def intersects(self, box: BoundingBox) -> bool:
+        """Whether part of ``box`` lies in the region."""
+        raise NotImplementedError()
+
+
+class BoxRegion(Region):
+    """A bounding box."""
+
+    def __init__(self, box: BoundingBox):
+        self.box = box
+
+    @property
+    def bounds(self) -> BoundingBox:
+        return self.box
+
+    def intersects(self, box: BoundingBox) -> bool:
+        return self.box.intersects(box)
+
+
+class PolygonRegion(Region):
+    """Polygons, each an outer ring followed by the rings of its holes.
+
+    Rings are lists of (longitude, latitude) points, as in GeoJSON.
+    """
+
+    def __init__(self, polygons: Sequence[Sequence[Sequence[Point]]]):
+        self.polygons = [[[(float(x), float(y)) for x, y in ring] for ring in polygon]
+                         for polygon in polygons if polygon]
+        if not self.polygons:
+            raise ValueError("A region needs at least one polygon")
+        self._bounds = [self._ring_bounds(polygon[0]) for polygon in self.polygons]
+
+    @property
+    def bounds(self) -> BoundingBox:
+        return BoundingBox(south=min(b.south for b in self._bounds), west=min(b.west for b in self._bounds),
+                           north=max(b.north for b in self._bounds), east=max(b.east for b in self._bounds))
+
+    def intersects(self, box: BoundingBox) -> bool:
+        for polygon, bounds in zip(self.polygons, self._bounds):
+            if not bounds.intersects(box):
+                continue
+            if any(_in_polygon(corner, polygon) for corner in box.corners()):
+                return True
+            if any(box.contains(point) for point in polygon[0]):
+                return True
+            box_edges = list(_edges(box.corners()))
+            if any(_segments_cross(edge, box_edge) for ring in polygon for edge in _edges(ring)
+                   for box_edge in box_edges):
+                return True
+        return False
+
+    @staticmethod
+    def _ring_bounds(ring: List[Point]) -> BoundingBox:
+        return BoundingBox(south=min(y for _, y in ring), west=min(x for x, _ in ring),
+                           north=max(y for _, y in ring), east=max(x for x, _ in ring))
+
+
+def load_region(path: str) -> PolygonRegion:
+    """The polygons of a GeoJSON file (a FeatureCollection, Feature, Polygon or MultiPolygon)."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return PolygonRegion(_geojson_polygons(data))
+
+
+def _geojson_polygons(data: dict) -> List[list]:
+    kind = data.get('type')
+    if kind == 'FeatureCollection':
+        return [polygon for feature in data['features'] for polygon in _geojson_polygons(feature)]
+    if kind == 'Feature':
+        return _geojson_polygons(data['geometry']) if data.get('geometry') else []
+    if kind == 'Polygon':
+        return [data['coordinates']]
+    if kind == 'MultiPolygon':
+        return list(data['coordinates'])
+    if kind == 'GeometryCollection':
+        return [polygon for geometry in data['geometries'] for polygon in _geojson_polygons(geometry)]
+    raise ValueError(f"Unsupported GeoJSON type: {kind}")
+
+
+def _edges(ring: List[Point]) -> Iterable[Tuple[Point, Point]]:
+    for i in range(len(ring)):
+        yield ring[i - 1], ring[i]
+
+
+def _in_polygon(point: Point, polygon: List[List[Point]]) -> bool:
+    """Even-odd rule over every ring, so points in a hole are outside."""
+    x, y = point
+    inside = False
+    for ring in polygon:
+        for (x1, y1), (x2, y2) in _edges(ring):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+def _segments_cross(a: Tuple[Point, Point], b: Tuple[Point, Point]) -> bool:
+    def side(p: Point, q: Point, r: Point) -> float:
+        return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+    (p1, p2), (q1, q2) = a, b
+    return (side(p1, p2, q1) * side(p1, p2, q2) <= 0) and (side(q1, q2, p1) * side(q1, q2, p2) <= 0)
+
+
+def _km_per_longitude_degree(box: BoundingBox) -> float:
+    # Measured at the latitude of the box closest to the equator, where a degree is widest
+    latitude = 0.0 if box.south <= 0 <= box.north else min(abs(box.south), abs(box.north))
+    return KM_PER_DEGREE * max(math.cos(math.radians(latitude)), _MIN_COS_LATITUDE)
+
+
+@dataclass(frozen=True)
+class Tile:
+    """A square of the grid, searched through the circle drawn around it."""
+
+    box: BoundingBox
+    depth: int = 0
+
+    @property
+    def latitude(self) -> float:
+        return (self.box.south + self.box.north) / 2
+
+    @property
+    def longitude(self) -> float:
+        return (self.box.west + self.box.east) / 2
+
+    @property
+    def radius_km(self) -> int:
+        """Half the diagonal of the tile, rounded up: searches take whole kilometers."""
+        height = (self.box.north - self.box.south) * KM_PER_DEGREE
+        width = (self.box.east - self.box.west) * _km_per_longitude_degree(self.box)
+        return max(1, math.ceil(math.hypot(height, width) / 2 - 1e-9))
+
+    def split(self) -> List['Tile']:
+        """The four quarters of the tile."""
+        b, latitude, longitude = self.box, self.latitude, self.longitude
+        return [Tile(BoundingBox(south, west, north, east), self.depth + 1)
+                for south, north in ((b.south, latitude), (latitude, b.north))
+                for west, east in ((b.west, longitude), (longitude, b.east))]
+
+    def filters(self, base: MarketplaceVehicleFilters) -> MarketplaceVehicleFilters:
+        """``base`` scoped to the circle of the tile."""
+        return base.model_copy(update={'location': None, 'latitude': self.latitude, 'longitude': self.longitude,
+                                       'radius_km': self.radius_km})
+
+
+def plan_tiles(region: Region, radius_km: float = DEFAULT_TILE_RADIUS_KM) -> List[Tile]:
+    """The tiles of the grid covering ``region``, each searched with a radius of about ``radius_km``."""
+    side_km = radius_km * math.sqrt(2)
+    bounds = region.bounds
+    step = side_km / KM_PER_DEGREE
+    tiles: List[Tile] = []
+    south = bounds.south
+    while south < bounds.north:
+        north = south + step
+        row = BoundingBox(south, bounds.west, north, bounds.east)
+        width = side_km / _km_per_longitude_degree(row)
+        west = bounds.west
+        while west < bounds.east:
+            box = BoundingBox(south, west, north, west + width)
+            if region.intersects(box):
+                tiles.append(Tile(box))
+            west += width
+        south = north
+    return tiles
+
+
+@dataclass
+class TileReport:
+    """How the search of a tile went."""
+
+    tile: Tile
+    pages_read: int = 0
+    listings: int = 0
+    split: bool = False
+    """Whether the tile hit the pagination ceiling and its quarters were searched too."""
+    saturated: bool = False
+    """Whether the tile hit the pagination ceiling but was too small to split, so listings may be missing."""
+    error: Optional[Exception] = None
+
+
+@dataclass
+class _TileDone:
+    report: TileReport
+    children: List[Tile]
+
+
+class TiledMarketplaceSearch:
+    """Sweeps a region with concurrent tile searches, merged into one stream of distinct listings.
+
+    Args:
+        repository: Builds the repository searching a tile. Tiles are searched
+            concurrently, so every call must return a new repository; they may
+            share one logged-in requester.
+        workers: Maximum number of tiles searched at the same time.
+        radius_km: The search radius of the tiles of the initial grid.
+        max_pages_per_tile: The pagination ceiling. A tile reading that many pages is split.
+        min_radius_km: Tiles are not split below this radius.
+        streaming: Whether to look for duplicates among the latest listings only, in constant memory.
+        on_stop: Receives the stops of ``stop_conditions``.
+        listing_index: The listing index of the repositories, if any. Tiles
+            only queue their listings, so they are added to it here, once
+            delivered: listings queued but never delivered stay new.
+    """
+
+    def __init__(self, repository: Callable[[], MarketplaceVehicleRepository], workers: int = DEFAULT_CRAWL_WORKERS,
+                 radius_km: float = DEFAULT_TILE_RADIUS_KM, max_pages_per_tile: int = DEFAULT_MAX_PAGES_PER_TILE,
+                 min_radius_km: float = DEFAULT_MIN_TILE_RADIUS_KM, streaming: bool = False,
+                 on_stop: Optional[Callable[[StopReport], None]] = None, listing_index: Optional[SeenIds] = None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_pages_per_tile < 1:
+            raise ValueError("max_pages_per_tile must be at least 1")
+        self._repository = repository
+        self.workers = workers
+        self.radius_km = radius_km
+        self.max_pages_per_tile = max_pages_per_tile
+        self.min_radius_km = min_radius_km
+        self._streaming = streaming
+        self._on_stop = on_stop
+        self._listing_index = listing_index
+        self._tile_reports: List[TileReport] = []
+        self._stop_reports: List[StopReport] = []
+
+    def search(self, region: Region, filters: MarketplaceVehicleFilters,
+               stop_conditions: Optional[List[StopCondition]] = None) -> Iterable[MarketplaceVehicleListing]:
+        """Yield the listings matching ``filters`` in ``region``, in arrival order, each once.
+
+        The location of ``filters`` is replaced by the circle of every tile.
+        ``stop_conditions`` apply to the whole sweep. A tile that fails is
+        reported (see ``get_tile_reports``) and the others keep going.
+        """
+        conditions = StopConditionSet(stop_conditions, self._on_stop, self._streaming)
+        self._stop_reports = conditions.reports
+        self._tile_reports = []
+        seen_ids = seen_ids_for(DEFAULT_STREAMING_SEEN_IDS if self._streaming else None)
+        results: queue.Queue = queue.Queue(maxsize=self.workers * 16)
+        cancelled = threading.Event()
+
+        def emit(item: object) -> bool:
+            while not cancelled.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def run(tile: Tile) -> None:
+            report, children = TileReport(tile), []
+            try:
+                if cancelled.is_set():
+                    return
+                repository = self._repository()
+                listings = repository.search(tile.filters(filters), max_pages=self.max_pages_per_tile,
+                                             index_listings=False)
+                for listing in listings:
+                    if not emit(listing):
+                        return
+                    report.listings += 1
+                report.pages_read = repository.get_pages_read()
+                if report.pages_read >= self.max_pages_per_tile:
+                    children = self._children(tile, region)
+                    report.split, report.saturated = bool(children), not children
+            except Exception as e:
+                report.error = e
+            finally:
+                emit(_TileDone(report, children))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tile")
+        pending = 0
+
+        def submit(tile: Tile) -> None:
+            nonlocal pending
+            pending += 1
+            executor.submit(run, tile)
+
+        try:
+            for tile in plan_tiles(region, self.radius_km):
+                submit(tile)
+            while pending > 0:
+                item = results.get()
+                if isinstance(item, _TileDone):
+                    pending -= 1
+                    self._tile_reports.append(item.report)
+                    for child in item.children:
+                        submit(child)
+                    continue
+                if not seen_ids.add(item.id):
+                    continue
+                # Every tile still searched would cost at least one more request
+                if conditions.check(saved_requests=pending):
+                    break
+                conditions.observe(item)
+                yield item
+                if self._listing_index is not None:
+                    self._listing_index.add(item.id)
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if self._listing_index is not None:
+                self._listing_index.flush()
+
+    def get_tile_reports(self) -> List[TileReport]:
+        """The tiles searched by the latest sweep, in the order they finished."""
+        return list(self._tile_reports)
+
+    def get_stop_reports(self) -> List[StopReport]:
+        """The stops of the latest sweep."""
+        return list(self._stop_reports)
+
+    def _children(self, tile: Tile, region: Region) -> List[Tile]:
+        children = [child for child in tile.split() if region.intersects(child.box)]
+        if not children or children[0].radius_km < self.min_radius_km:
+            return []
+        return children
@@ -0,0 +1,118 @@
+"""Pagination that downloads the next page while the current one is parsed.
+
+Timeline and marketplace search pages are chained by a cursor, so page N+1
+can only be requested once page N is known. Parsing a page is CPU bound and
+holds the GIL, so it is run on an executor (a ``ProcessPoolExecutor`` to use
+several cores) while a dedicated I/O thread downloads. To overlap the two,
+the URL of the next page is read cheaply from the raw HTML of the current one
+(a regex, no parsing) and requested while the page is parsed. When the parse
+is done, the guess is checked against the cursor the parser found; a wrong
+guess is thrown away and the right page fetched instead.
+
+At most one page is downloaded ahead of the consumer. That bounds the pages
+held in memory and the work done past a stop condition: the prefetch waits
+out the pause between pages first, and gives up if the consumer stops
+meanwhile. A parse executor shared by many crawls gets at most one page of
+each crawl at a time.
+"""
+import functools
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Generic, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+MAX_WORKER_PARSERS = 16
+
+_worker_parsers: 'OrderedDict[bytes, Any]' = OrderedDict()
+_worker_parsers_lock = threading.Lock()
+
+
+def _run_parser(state: bytes, method: str, *args: Any) -> Any:
+    # The unpickled parser is kept, so its caches stay warm in the worker process
+    with _worker_parsers_lock:
+        parser = _worker_parsers.get(state)
+        if parser is None:
+            parser = _worker_parsers[state] = pickle.loads(state)
+            if len(_worker_parsers) > MAX_WORKER_PARSERS:
+                _worker_parsers.popitem(last=False)
+        else:
+            _worker_parsers.move_to_end(state)
+    return getattr(parser, method)(*args)
+
+
+def parser_task(parser: Any, method: str, executor: Optional[Executor]) -> Callable[..., Any]:
+    """``parser.<method>`` as a callable to submit to ``executor``.
+
+    For a process pool, the parser is pickled once here instead of with
+    every submitted page, and unpickled once per worker process.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        return functools.partial(_run_parser, pickle.dumps(parser), method)
+    return getattr(parser, method)
+
+
+class PagePipeline(Generic[T]):
+    """Yields the parsed pages of a cursor paginated listing, fetching one page ahead.
+
+    Args:
+        fetch: Downloads a URL and returns its HTML.
+        parse: Parses the HTML of a page. Runs on ``parse_executor``, so it must be
+            picklable for a process pool (see :func:`parser_task`).
+        next_url: The URL of the page after a parsed page, None on the last page.
+        peek_next_url: A guess of the URL of the next page read from the raw HTML, None
+            when there is nothing worth prefetching.
+        parse_executor: The executor pages are parsed on.
+        pause: Seconds to wait before requesting the next page.
+    """
+
+    def __init__(self, fetch: Callable[[str], str], parse: Callable[[str], T],
+                 next_url: Callable[[T], Optional[str]], peek_next_url: Callable[[str], Optional[str]],
+                 parse_executor: Executor, pause: Callable[[], float] = lambda: 0):
+        self._fetch = fetch
+        self._parse = parse
+        self._next_url = next_url
+        self._peek_next_url = peek_next_url
+        self._parse_executor = parse_executor
+        self._pause = pause
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+
+    def pages(self, first_url: str) -> Iterator[T]:
+        io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-fetch')
+        abandon = threading.Event()
+        fetching: Future = io.submit(self._fetch, first_url)
+        try:
+            while True:
+                html = fetching.result()
+                parsing = self._parse_executor.submit(self._parse, html)
+                guess = self._peek_next_url(html)
+                del html
+                prefetch: Optional[Future] = None
+                if guess:
+                    abandon = threading.Event()
+                    prefetch = io.submit(self._fetch_after_pause, guess, abandon)
+                page = parsing.result()
+                url = self._next_url(page)
+                yield page
+                if not url:
+                    return
+                if prefetch is not None and guess == url:
+                    self.prefetch_hits += 1
+                    fetching = prefetch
+                    continue
+                if prefetch is not None:
+                    self.prefetch_misses += 1
+                    abandon.set()
+                abandon = threading.Event()
+                fetching = io.submit(self._fetch_after_pause, url, abandon)
+        finally:
+            abandon.set()
+            io.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch_after_pause(self, url: str, abandon: threading.Event) -> Optional[str]:
+        if abandon.wait(self._pause()):
+            return None
+        return self._fetch(url)
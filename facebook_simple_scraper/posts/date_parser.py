@@ -0,0 +1,168 @@
+"""Fast parsing of the post dates shown by mbasic.
+
+Every post of a timeline page carries its date as free text in an
+``<abbr>``: ``"May 2 at 1:27 PM"``, ``"September 14, 2015 at 11:04 PM"``,
+``"Yesterday at 3:04 PM"``, ``"3 hrs"``, ``"Just now"``... ``dateparser``
+understands all of them but is slow and heavy to import. :class:`PostDateParser`
+matches the formats mbasic emits with precompiled patterns, memoizes results
+in an LRU keyed on the raw text and the reference time, and only imports and
+calls ``dateparser`` for anything else.
+
+Dates are resolved like ``dateparser`` does: relative to the reference time
+(now, to the minute, by default) and in the current year when it is omitted.
+"""
+import functools
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+DEFAULT_CACHE_SIZE = 4096
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4, "may": 5,
+    "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+_WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+}
+_UNITS = {
+    "s": "seconds", "sec": "seconds", "secs": "seconds", "second": "seconds", "seconds": "seconds",
+    "m": "minutes", "min": "minutes", "mins": "minutes", "minute": "minutes", "minutes": "minutes",
+    "h": "hours", "hr": "hours", "hrs": "hours", "hour": "hours", "hours": "hours",
+    "d": "days", "day": "days", "days": "days",
+    "w": "weeks", "week": "weeks", "weeks": "weeks",
+}
+
+_TIME = r"(?:\s+at\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?:\s*(?P<ampm>[AP]M))?)?"
+_ABSOLUTE_RE = re.compile(
+    r"(?P<month>[A-Z]+)\.?\s+(?P<day>\d{1,2})(?:,\s*(?P<year>\d{4}))?" + _TIME, re.IGNORECASE)
+_DAY_RE = re.compile(r"(?P<day>yesterday|today|[A-Z]+day)" + _TIME, re.IGNORECASE)
+_RELATIVE_RE = re.compile(r"(?P<count>\d+|an?)\s*(?P<unit>[A-Z]+)(?:\s+ago)?", re.IGNORECASE)
+_NOW_RE = re.compile(r"just now|now", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class DateParserStats:
+    """Memo and fallback counters of a :class:`PostDateParser`."""
+
+    hits: int
+    misses: int
+    fallbacks: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def fallback_rate(self) -> float:
+        """Share of the parsed (not memoized) strings that needed ``dateparser``."""
+        return self.fallbacks / self.misses if self.misses else 0.0
+
+
+def _dateparser_parse(date_string: str) -> Optional[datetime]:
+    try:
+        import dateparser
+        return dateparser.parse(date_string)
+    except Exception:
+        from dateutil.parser import parse
+        return parse(date_string.replace('at', ''))
+
+
+class PostDateParser:
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE,
+                 fallback: Callable[[str], Optional[datetime]] = _dateparser_parse):
+        self._fallback = fallback
+        self._fallbacks = 0
+        self._lock = threading.Lock()
+        self._cached_parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def parse(self, date_string: str, reference: Optional[datetime] = None) -> Optional[datetime]:
+        """Return the date ``date_string`` stands for, relative to ``reference`` (default: now)."""
+        if reference is None:
+            reference = datetime.now().replace(second=0, microsecond=0)
+        return self._cached_parse(date_string, reference)
+
+    def stats(self) -> DateParserStats:
+        info = self._cached_parse.cache_info()
+        return DateParserStats(hits=info.hits, misses=info.misses, fallbacks=self._fallbacks, size=info.currsize)
+
+    def clear(self) -> None:
+        self._cached_parse.cache_clear()
+        with self._lock:
+            self._fallbacks = 0
+
+    def _parse(self, date_string: str, reference: datetime) -> Optional[datetime]:
+        text = date_string.strip()
+        parsed = self._parse_known_format(text, reference)
+        if parsed is not None:
+            return parsed
+        with self._lock:
+            self._fallbacks += 1
+        return self._fallback(date_string)
+
+    @classmethod
+    def _parse_known_format(cls, text: str, reference: datetime) -> Optional[datetime]:
+        try:
+            match = _ABSOLUTE_RE.fullmatch(text)
+            if match is not None and match.group("month").lower() in _MONTHS:
+                year = int(match.group("year") or reference.year)
+                day = datetime(year, _MONTHS[match.group("month").lower()], int(match.group("day")))
+                return cls._at_time(day, match)
+            match = _DAY_RE.fullmatch(text)
+            if match is not None:
+                return cls._parse_day(match, reference)
+            match = _RELATIVE_RE.fullmatch(text)
+            if match is not None and match.group("unit").lower() in _UNITS:
+                count = match.group("count")
+                count = 1 if count.lower() in ("a", "an") else int(count)
+                return reference - timedelta(**{_UNITS[match.group("unit").lower()]: count})
+            if _NOW_RE.fullmatch(text):
+                return reference
+        except ValueError:
+            # Out of range values (February 29 of a common year, 25:00...) are left to dateparser
+            return None
+        return None
+
+    @classmethod
+    def _parse_day(cls, match: re.Match, reference: datetime) -> Optional[datetime]:
+        day_name = match.group("day").lower()
+        if day_name == "today":
+            days_back = 0
+        elif day_name == "yesterday":
+            days_back = 1
+        elif day_name in _WEEKDAYS:
+            days_back = (reference.weekday() - _WEEKDAYS[day_name]) % 7
+        else:
+            return None
+        day = reference - timedelta(days=days_back)
+        if match.group("hour") is None:
+            return day
+        return cls._at_time(day.replace(hour=0, minute=0, second=0, microsecond=0), match)
+
+    @staticmethod
+    def _at_time(day: datetime, match: re.Match) -> datetime:
+        if match.group("hour") is None:
+            return day
+        hour = int(match.group("hour"))
+        ampm = (match.group("ampm") or "").upper()
+        if ampm and not 1 <= hour <= 12:
+            raise ValueError(f"invalid 12-hour clock time: {match.group(0)}")
+        if ampm == "AM" and hour == 12:
+            hour = 0
+        elif ampm == "PM" and hour != 12:
+            hour += 12
+        return day.replace(hour=hour, minute=int(match.group("minute")))
+
+
+default_date_parser = PostDateParser()
+
+
+def parse_post_date(date_string: str, reference: Optional[datetime] = None) -> Optional[datetime]:
+    """Parse ``date_string`` with the shared :data:`default_date_parser`."""
+    return default_date_parser.parse(date_string, reference)
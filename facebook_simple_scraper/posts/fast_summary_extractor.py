@@ -0,0 +1,478 @@
+"""Single-pass timeline parser.
+
+``FastPostSummaryListExtractor`` produces the same :class:`PostList` as
+:class:`PostSummaryListExtractor` without building a BeautifulSoup tree. The
+page is tokenized once and every field of every post is collected while the
+tokens stream by: each element is matched against the live selectors of the
+page's layout (see :mod:`facebook_simple_scraper.posts.selectors`), and the
+fields are then read with the same chains, in the same order, as the
+original extractor. ``lxml`` is used as tokenizer when it is installed, the
+standard library ``html.parser`` otherwise.
+
+The collector reproduces the tree BeautifulSoup's ``html.parser`` builder
+would build (how end tags close elements, how text nodes are merged, which
+strings ``get_text`` ignores) so both extractors agree field by field. Pages
+the original extractor would fail on are handed over to it, so the same
+error is raised. With the ``lxml`` tokenizer, unknown entities and CDATA
+sections are decoded the libxml2 way; use ``backend='html.parser'`` where
+even those must match.
+"""
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+
+from bs4.dammit import EntitySubstitution
+
+from facebook_simple_scraper.entities import Post, PostList
+from facebook_simple_scraper.posts.selectors import DEFAULT_SELECTOR_CHAINS, Layout, LayoutCache, Selector, \
+    SelectorChains
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - depends on the environment
+    etree = None
+
+LXML_BACKEND = 'lxml'
+HTML_PARSER_BACKEND = 'html.parser'
+
+_EMPTY_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+_STRING_CONTAINERS = frozenset(['rt', 'rp', 'style', 'script', 'template'])
+_PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+_COMMENTS_RE = re.compile(r'\d+ Comments')
+
+# Kinds of text nodes
+_TEXT = 0
+"""Text that ``get_text`` returns (outside script, style, template, rt and rp)."""
+_CDATA = 1
+_OTHER = 2
+"""Comments, declarations, processing instructions and text inside string containers."""
+
+_CAPTURED_FIELDS = frozenset(['text', 'likes'])
+"""Chain fields read from the text of the matched element, the other ones are read from its attributes."""
+_DATE = 'date'
+
+# A field lookup: the chain field and one of its selectors
+_Key = Tuple[str, Selector]
+
+
+class _Fallback(Exception):
+    """Raised when the page must be parsed by the original extractor."""
+
+
+class _Capture:
+    """Text of one element, as ``get_text(strip=...)`` would return it."""
+
+    __slots__ = ('feed', 'key', 'strip', 'parts')
+
+    def __init__(self, feed: '_Feed', key: Any, strip: bool):
+        self.feed = feed
+        self.key = key
+        self.strip = strip
+        self.parts: List[str] = []
+
+    def add(self, text: str) -> None:
+        if self.strip:
+            text = text.strip()
+            if not text:
+                return
+        self.parts.append(text)
+
+    def finish(self) -> None:
+        self.feed.matches[self.key] = ''.join(self.parts)
+
+
+class _Feed:
+    """Fields of one post container, i.e. the first match of each lookup in its descendants."""
+
+    __slots__ = ('matches', 'like_span_id', 'comments_text', 'found')
+
+    def __init__(self):
+        # Text or attributes of the first element matched by each lookup, the date under _DATE
+        self.matches: Dict[Any, Any] = {}
+        self.like_span_id: Optional[str] = None
+        self.comments_text: Optional[str] = None
+        # Lookups already matched (their capture may still be running)
+        self.found = set()
+
+
+@lru_cache(maxsize=256)
+def _selectors_by_tag(chains: SelectorChains) -> Tuple[Dict[str, List[Selector]], Dict[str, List[_Key]]]:
+    """The post container selectors and the field lookups of ``chains``, by tag name."""
+    containers: Dict[str, List[Selector]] = {}
+    lookups: Dict[str, List[_Key]] = {}
+    for selector in chains.posts:
+        containers.setdefault(selector.tag, []).append(selector)
+    for field in ('text', 'likes', 'image', 'story_id'):
+        for selector in getattr(chains, field):
+            lookups.setdefault(selector.tag, []).append((field, selector))
+    return containers, lookups
+
+
+class _Element:
+    __slots__ = ('name', 'captures', 'feed')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.captures: Optional[List[_Capture]] = None
+        self.feed: Optional[_Feed] = None
+
+
+class _PostCollector:
+    """Receives tokenizer events and collects the fields of every post container."""
+
+    def __init__(self, chains: SelectorChains):
+        self._containers, self._lookups = _selectors_by_tag(chains)
+        # Post containers found by each selector of the posts chain
+        self.feeds: Dict[Selector, List[_Feed]] = {}
+        self.next_page_href: Optional[str] = None
+        self._stack: List[_Element] = []
+        self._open_counts: Dict[str, int] = {}
+        self._open_feeds: List[_Feed] = []
+        self._captures: List[_Capture] = []
+        self._string_containers = 0
+        self._preserve_whitespace = 0
+        self._already_closed_empty: List[str] = []
+        self._data: List[str] = []
+
+    # ----- events -------------------------------------------------------
+
+    def start(self, name: str, attrs: Dict[str, str], handle_empty_element: bool = True) -> None:
+        self.flush()
+        element = _Element(name)
+        classes = None
+        class_attr = attrs.get('class')
+        if class_attr is not None:
+            classes = class_attr.split()
+        if self._open_feeds:
+            self._match(element, name, attrs, classes)
+        if name == 'a' and self.next_page_href is None:
+            href = attrs.get('href')
+            if href is None:
+                # The original extractor fails on links without href
+                raise _Fallback()
+            if 'cursor=' in href:
+                self.next_page_href = href
+        containers = self._containers.get(name)
+        if containers is not None:
+            feed = None
+            for selector in containers:
+                if selector.matches(attrs, classes):
+                    feed = feed or _Feed()
+                    self.feeds.setdefault(selector, []).append(feed)
+            if feed is not None:
+                element.feed = feed
+                self._open_feeds.append(feed)
+        self._push(element)
+        if handle_empty_element and name in _EMPTY_ELEMENTS:
+            self.end(name, check_already_closed=False)
+            self._already_closed_empty.append(name)
+
+    def end(self, name: str, check_already_closed: bool = True) -> None:
+        if check_already_closed and name in self._already_closed_empty:
+            self._already_closed_empty.remove(name)
+            return
+        self.flush()
+        if not self._open_counts.get(name):
+            return
+        while self._stack:
+            element = self._pop()
+            if element.name == name:
+                break
+
+    def data(self, text: str) -> None:
+        self._data.append(text)
+
+    def node(self, text: str, kind: int) -> None:
+        """A comment, declaration or CDATA section: a text node of its own."""
+        self.flush()
+        self._data.append(text)
+        self.flush(kind)
+
+    def close(self) -> None:
+        self.flush()
+        while self._stack:
+            self._pop()
+
+    def flush(self, kind: Optional[int] = None) -> None:
+        if not self._data:
+            return
+        text = ''.join(self._data)
+        self._data = []
+        if not self._preserve_whitespace and not text.strip(_ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        if kind is None:
+            kind = _OTHER if self._string_containers else _TEXT
+        for feed in self._open_feeds:
+            if feed.comments_text is None and _COMMENTS_RE.search(text):
+                feed.comments_text = text
+        if kind != _OTHER:
+            for capture in self._captures:
+                capture.add(text)
+
+    # ----- tree ---------------------------------------------------------
+
+    def _push(self, element: _Element) -> None:
+        self._stack.append(element)
+        name = element.name
+        self._open_counts[name] = self._open_counts.get(name, 0) + 1
+        if name in _STRING_CONTAINERS:
+            self._string_containers += 1
+        if name in _PRESERVE_WHITESPACE:
+            self._preserve_whitespace += 1
+
+    def _pop(self) -> _Element:
+        element = self._stack.pop()
+        name = element.name
+        self._open_counts[name] -= 1
+        if name in _STRING_CONTAINERS:
+            self._string_containers -= 1
+        if name in _PRESERVE_WHITESPACE:
+            self._preserve_whitespace -= 1
+        if element.captures:
+            for capture in element.captures:
+                capture.finish()
+                self._captures.remove(capture)
+        if element.feed is not None:
+            self._open_feeds.remove(element.feed)
+        return element
+
+    def _capture(self, element: _Element, feed: _Feed, key: Any, strip: bool) -> None:
+        feed.found.add(key)
+        capture = _Capture(feed, key, strip)
+        if element.captures is None:
+            element.captures = []
+        element.captures.append(capture)
+        self._captures.append(capture)
+
+    def _match(self, element: _Element, name: str, attrs: Dict[str, str], classes: Optional[List[str]]) -> None:
+        lookups = self._lookups.get(name)
+        matched = [key for key in lookups if key[1].matches(attrs, classes)] if lookups is not None else ()
+        for feed in self._open_feeds:
+            found = feed.found
+            for key in matched:
+                if key in found:
+                    continue
+                if key[0] in _CAPTURED_FIELDS:
+                    self._capture(element, feed, key, True)
+                else:
+                    found.add(key)
+                    feed.matches[key] = attrs
+            if name == 'span':
+                if feed.like_span_id is None:
+                    span_id = attrs.get('id')
+                    if span_id and span_id.startswith('like_'):
+                        feed.like_span_id = span_id
+            elif name == 'abbr':
+                if _DATE not in found:
+                    self._capture(element, feed, _DATE, False)
+
+
+class _HTMLParserTokenizer(HTMLParser):
+    """Feeds a :class:`_PostCollector` with the events BeautifulSoup's ``html.parser`` builder uses."""
+
+    def __init__(self, collector: _PostCollector):
+        super().__init__(convert_charrefs=False)
+        self.collector = collector
+
+    def handle_startendtag(self, tag, attrs):
+        self.collector.start(tag, self._attrs(attrs), handle_empty_element=False)
+        self.collector.end(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, self._attrs(attrs))
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def handle_charref(self, name):
+        if name.startswith('x'):
+            code = int(name.lstrip('x'), 16)
+        elif name.startswith('X'):
+            code = int(name.lstrip('X'), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.collector.data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.collector.data(character if character is not None else f'&{name}')
+
+    def handle_comment(self, data):
+        self.collector.node(data, _OTHER)
+
+    def handle_decl(self, data):
+        self.collector.node(data[len('DOCTYPE '):], _OTHER)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self.collector.node(data[len('CDATA['):], _CDATA)
+        else:
+            self.collector.node(data, _OTHER)
+
+    def handle_pi(self, data):
+        self.collector.node(data, _OTHER)
+
+    @staticmethod
+    def _attrs(attrs: List[Tuple[str, Optional[str]]]) -> Dict[str, str]:
+        return {key: '' if value is None else value for key, value in attrs}
+
+
+class _LxmlTarget:
+    """lxml parser target forwarding events to a :class:`_PostCollector`."""
+
+    def __init__(self, collector: _PostCollector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        self.collector.start(tag, dict(attrib))
+
+    def end(self, tag):
+        self.collector.end(tag)
+
+    def data(self, data):
+        self.collector.data(data)
+
+    def comment(self, text):
+        self.collector.node(text, _OTHER)
+
+    def pi(self, target, data=None):
+        self.collector.node(f'{target} {data}' if data else target, _OTHER)
+
+    def close(self):
+        self.collector.close()
+
+
+class FastPostSummaryListExtractor(PostSummaryListExtractor):
+    """Drop-in replacement for :class:`PostSummaryListExtractor` that parses each page in a single pass.
+
+    The scraper uses it when ``ScraperOptions.fast_post_extraction`` is set.
+
+    Args:
+        backend: ``'lxml'`` or ``'html.parser'``. Defaults to ``'lxml'`` when it is installed.
+        selector_chains: See :class:`PostSummaryListExtractor`.
+        layout_cache: See :class:`PostSummaryListExtractor`.
+    """
+
+    def __init__(self, backend: Optional[str] = None, selector_chains: SelectorChains = DEFAULT_SELECTOR_CHAINS,
+                 layout_cache: Optional[LayoutCache] = None):
+        super().__init__(selector_chains, layout_cache)
+        if backend is None:
+            backend = LXML_BACKEND if etree is not None else HTML_PARSER_BACKEND
+        if backend == LXML_BACKEND and etree is None:
+            raise ValueError("The 'lxml' backend requires lxml to be installed")
+        if backend not in (LXML_BACKEND, HTML_PARSER_BACKEND):
+            raise ValueError(f"Unknown backend '{backend}'")
+        self.backend = backend
+
+    def extract_posts(self, html_content: str) -> PostList:
+        layout = self.layout_cache.resolve(self.selector_chains, html_content)
+        try:
+            collector = self._collect(html_content, layout.chains)
+            feeds = layout.first('posts', lambda selector: collector.feeds.get(selector)) or []
+            posts = [self._build_post(feed, layout) for feed in feeds]
+            cursor, profile_id = self._next_page_params(collector.next_page_href)
+        except _Fallback:
+            return self._extract_posts_from_html(html_content)
+        posts.sort(key=lambda x: x.date, reverse=True)
+        return PostList(posts=posts, cursor=cursor, profile_id=profile_id)
+
+    def _collect(self, html_content: str, chains: SelectorChains) -> _PostCollector:
+        collector = _PostCollector(chains)
+        if self.backend == LXML_BACKEND:
+            parser = etree.HTMLParser(target=_LxmlTarget(collector))
+            parser.feed(html_content)
+            parser.close()
+        else:
+            tokenizer = _HTMLParserTokenizer(collector)
+            tokenizer.feed(html_content)
+            tokenizer.close()
+            collector.close()
+        return collector
+
+    def _build_post(self, feed: _Feed, layout: Layout) -> Post:
+        matches = feed.matches
+
+        def text_lookup(selector: Selector) -> Optional[str]:
+            return matches.get(('text', selector)) or None
+
+        text = layout.first('text', text_lookup) or ''
+
+        like_count = 0
+        likes_text = layout.first('likes', lambda selector: matches.get(('likes', selector)))
+        if likes_text is not None:
+            try:
+                like_count = int(likes_text.replace(",", '').split(' ')[-1])
+            except ValueError:
+                like_count = 0
+
+        def image_lookup(selector: Selector) -> Optional[str]:
+            attrs = matches.get(('image', selector))
+            if attrs is None:
+                return None
+            if selector.attr not in attrs:
+                raise _Fallback()
+            return attrs[selector.attr]
+
+        image_url = layout.first('image', image_lookup) or ''
+
+        def story_id_lookup(selector: Selector) -> Optional[str]:
+            attrs = matches.get(('story_id', selector))
+            if attrs is None or 'href' not in attrs:
+                return None
+            try:
+                return selector.read_param(attrs['href']) or None
+            except IndexError:
+                raise _Fallback()
+
+        story_id = layout.first('story_id', story_id_lookup) or ''
+        if story_id == '' and feed.like_span_id is not None:
+            story_id = feed.like_span_id.split('_')[1]
+
+        comment_count = 0
+        if feed.comments_text is not None:
+            comment_count = int(re.search(r'\d+', feed.comments_text).group())
+
+        if _DATE not in matches:
+            raise _Fallback()
+        return Post(
+            id=story_id,
+            url=f'https://www.facebook.com/{story_id}',
+            text=text,
+            image_url=image_url,
+            video_url='',
+            like_count=like_count,
+            comment_count=comment_count,
+            date=self._parse_date(matches[_DATE]),
+        )
+
+    @staticmethod
+    def _next_page_params(href: Optional[str]) -> Tuple[str, str]:
+        if href is None:
+            return '', ''
+        try:
+            cursor = href.split('cursor=')[1].split('&')[0]
+            profile_id = href.split('profile_id=')[1].split('&')[0]
+        except IndexError:
+            raise _Fallback()
+        return cursor.strip().replace("'", ''), profile_id.strip()
@@ -0,0 +1,281 @@
+"""What earlier crawls of every account have seen, for incremental timeline crawls.
+
+Timelines are read newest first. A crawl that gets down to the posts seen by
+the previous complete crawl (or to the end of the timeline) has seen every
+post from the newest one it went through down: the next crawl of the account
+only has to read until it reaches that post again. Posts already seen are
+skipped without fetching their details, and paging stops after the first
+page ending in one.
+
+A crawl stopped earlier (a stop condition, an error, a consumer that stops
+iterating) leaves a gap between the posts it went through and the ones seen
+before. The range it went through is then kept apart, as ``pending``: later
+crawls skip it too, and the first one that gets through it down to the
+posts seen before merges both.
+
+Posts are ordered by date, then by id for posts sharing a date (dates are
+often only precise to the minute), so a post published in the same minute as
+the newest one seen is not taken for an old one.
+"""
+import abc
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from facebook_simple_scraper.entities import Post
+
+
+@dataclass(frozen=True)
+class TimelinePosition:
+    """Where a post sits in a timeline."""
+
+    post_id: str
+    date: datetime
+
+    @property
+    def key(self) -> Tuple[datetime, int, str]:
+        # Post ids are numbers growing over time, compared as such without assuming they parse
+        return _comparable(self.date), len(self.post_id), self.post_id
+
+    @classmethod
+    def of(cls, post: Post) -> 'TimelinePosition':
+        return cls(post_id=post.id, date=post.date)
+
+
+def _comparable(date: datetime) -> datetime:
+    # Dates parsed from different formats may or may not carry a timezone
+    return date.replace(tzinfo=None)
+
+
+def timeline_order(posts: List[Post]) -> List[Post]:
+    """``posts`` newest first, ties on the date broken by id."""
+    return sorted(posts, key=lambda post: TimelinePosition.of(post).key, reverse=True)
+
+
+@dataclass(frozen=True)
+class SeenRange:
+    """Every post from ``newest`` down to ``oldest``, both included, or down to the first post when it is None."""
+
+    newest: TimelinePosition
+    oldest: Optional[TimelinePosition] = None
+
+    def covers(self, post: Post) -> bool:
+        key = TimelinePosition.of(post).key
+        return key <= self.newest.key and (self.oldest is None or key >= self.oldest.key)
+
+    def overlaps(self, other: 'SeenRange') -> bool:
+        return (self.oldest is None or self.oldest.key <= other.newest.key) and \
+            (other.oldest is None or other.oldest.key <= self.newest.key)
+
+    def union(self, other: 'SeenRange') -> 'SeenRange':
+        """The range covering both, which must overlap."""
+        newest = max(self.newest, other.newest, key=lambda position: position.key)
+        if self.oldest is None or other.oldest is None:
+            return SeenRange(newest)
+        return SeenRange(newest, min(self.oldest, other.oldest, key=lambda position: position.key))
+
+
+@dataclass(frozen=True)
+class HighWaterMark:
+    """What earlier crawls of an account have seen.
+
+    ``seen`` reaches down to the first post of the timeline; crawls stop
+    paging once they get to it. ``pending`` is what a crawl stopped before
+    getting down to ``seen`` went through.
+    """
+
+    seen: Optional[SeenRange] = None
+    pending: Optional[SeenRange] = None
+
+    def covers(self, post: Post) -> bool:
+        """Whether an earlier crawl went through ``post``."""
+        return any(r.covers(post) for r in (self.seen, self.pending) if r is not None)
+
+    def reached(self, post: Post) -> bool:
+        """Whether every post older than ``post`` was seen, so paging can stop."""
+        return self.seen is not None and self.seen.covers(post)
+
+    def merged(self, traversed: SeenRange) -> 'HighWaterMark':
+        """This mark plus the range a crawl went through."""
+        ranges = [r for r in (self.seen, self.pending) if r is not None]
+        merged = traversed
+        overlapping = [r for r in ranges if r.overlaps(merged)]
+        while overlapping:
+            for r in overlapping:
+                merged = merged.union(r)
+                ranges.remove(r)
+            overlapping = [r for r in ranges if r.overlaps(merged)]
+        ranges.append(merged)
+        seen = next((r for r in ranges if r.oldest is None), None)
+        # Of two disjoint pending ranges, the newest is kept: the next crawls get to it first. The posts of the
+        # other one are yielded again, never lost.
+        pending = max((r for r in ranges if r.oldest is not None), key=lambda r: r.newest.key, default=None)
+        return HighWaterMark(seen=seen, pending=pending)
+
+    @classmethod
+    def of(cls, post: Post) -> 'HighWaterMark':
+        """The mark of a complete crawl whose newest post was ``post``."""
+        return cls(seen=SeenRange(TimelinePosition.of(post)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'seen': _range_to_dict(self.seen), 'pending': _range_to_dict(self.pending)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HighWaterMark':
+        return cls(seen=_range_from_dict(data.get('seen')), pending=_range_from_dict(data.get('pending')))
+
+
+def _position_to_dict(position: Optional[TimelinePosition]) -> Optional[Dict[str, str]]:
+    if position is None:
+        return None
+    return {'post_id': position.post_id, 'date': position.date.isoformat()}
+
+
+def _position_from_dict(data: Optional[Dict[str, str]]) -> Optional[TimelinePosition]:
+    if data is None:
+        return None
+    return TimelinePosition(post_id=data['post_id'], date=datetime.fromisoformat(data['date']))
+
+
+def _range_to_dict(seen: Optional[SeenRange]) -> Optional[Dict[str, Any]]:
+    if seen is None:
+        return None
+    return {'newest': _position_to_dict(seen.newest), 'oldest': _position_to_dict(seen.oldest)}
+
+
+def _range_from_dict(data: Optional[Dict[str, Any]]) -> Optional[SeenRange]:
+    if data is None:
+        return None
+    return SeenRange(newest=_position_from_dict(data['newest']), oldest=_position_from_dict(data.get('oldest')))
+
+
+class Traversal:
+    """The range of posts a crawl went through: each one yielded, or covered by the mark.
+
+    Pages are handed over in timeline order (``start_page``). The last post
+    of the first page never moves the range down, since it may be a pinned
+    post older than the next page.
+    """
+
+    def __init__(self):
+        self.newest: Optional[TimelinePosition] = None
+        self.oldest: Optional[TimelinePosition] = None
+        self.reached_end = False
+        self._page: List[Post] = []
+        self._pages = 0
+
+    def start_page(self, posts: List[Post]) -> List[Post]:
+        """Start going through ``posts``. Returns them in timeline order."""
+        self._page = timeline_order(posts)
+        self._pages += 1
+        return self._page
+
+    def went_through(self, post: Post) -> None:
+        """``post`` of the current page was yielded, and the ones before it yielded or covered."""
+        if self.newest is None:
+            self.newest = TimelinePosition.of(self._page[0])
+        if self._pages > 1 or post is not self._page[-1]:
+            self.oldest = TimelinePosition.of(post)
+
+    def finished_page(self, last: bool) -> None:
+        """Every post of the current page was yielded or covered. ``last`` when it ends the timeline."""
+        posts = self._page[:-1] if self._pages == 1 else self._page
+        if posts:
+            if self.newest is None:
+                self.newest = TimelinePosition.of(posts[0])
+            self.oldest = TimelinePosition.of(posts[-1])
+        self.reached_end = last
+
+    def page_bottom(self) -> Optional[Post]:
+        """The oldest post of the current page known to be in timeline order."""
+        posts = self._page[:-1] if self._pages == 1 else self._page
+        return posts[-1] if posts else None
+
+    def seen_range(self) -> Optional[SeenRange]:
+        if self.newest is None:
+            return None
+        return SeenRange(self.newest, None if self.reached_end else self.oldest or self.newest)
+
+
+class HighWaterMarkStore(abc.ABC):
+    """Persists the high-water mark of every account. Implementations must be thread safe."""
+
+    @abc.abstractmethod
+    def get(self, account: str) -> Optional[HighWaterMark]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def update(self, account: str, traversed: SeenRange) -> HighWaterMark:
+        """Merge the range a crawl went through into the stored mark, in one step. Returns the new mark."""
+        raise NotImplementedError()
+
+
+class FileHighWaterMarkStore(HighWaterMarkStore):
+    """Every mark in one JSON file, rewritten atomically on every update."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get(self, account: str) -> Optional[HighWaterMark]:
+        with self._lock:
+            return self._read().get(account)
+
+    def update(self, account: str, traversed: SeenRange) -> HighWaterMark:
+        with self._lock:
+            marks = self._read()
+            mark = marks[account] = marks.get(account, HighWaterMark()).merged(traversed)
+            data = {name: m.to_dict() for name, m in marks.items()}
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            return mark
+
+    def _read(self) -> Dict[str, HighWaterMark]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {name: HighWaterMark.from_dict(m) for name, m in data.items()}
+
+
+class SqliteHighWaterMarkStore(HighWaterMarkStore):
+    """Marks in a SQLite database, merged in a write transaction so other processes wait for it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS timeline_marks (account TEXT PRIMARY KEY, mark TEXT NOT NULL)')
+
+    def get(self, account: str) -> Optional[HighWaterMark]:
+        with self._lock:
+            row = self._connection.execute('SELECT mark FROM timeline_marks WHERE account = ?',
+                                           (account,)).fetchone()
+        return HighWaterMark.from_dict(json.loads(row[0])) if row is not None else None
+
+    def update(self, account: str, traversed: SeenRange) -> HighWaterMark:
+        with self._lock, self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            row = self._connection.execute('SELECT mark FROM timeline_marks WHERE account = ?',
+                                           (account,)).fetchone()
+            mark = HighWaterMark.from_dict(json.loads(row[0])) if row is not None else HighWaterMark()
+            mark = mark.merged(traversed)
+            self._connection.execute(
+                'INSERT INTO timeline_marks (account, mark) VALUES (?, ?) '
+                'ON CONFLICT(account) DO UPDATE SET mark = excluded.mark',
+                (account, json.dumps(mark.to_dict())))
+            return mark
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,243 @@
+"""Selector chains used to find the fields of a post, and a per-layout cache of them.
+
+mbasic serves several layouts, each with its own obfuscated class names, so
+every field of a post is looked up with a chain of selectors tried in order
+(``'_5rgn'``, then ``'ca'``, then ``'t bs'`` for the text, ...). Chains are
+plain data: :func:`load_selector_chains` reads them from JSON so a new layout
+can be supported without code changes.
+
+Trying selectors that cannot match is where most of the extraction time
+goes, since every miss walks the whole post. :class:`LayoutCache`
+fingerprints a page by which selectors can match on it at all (their class
+tokens occur in the page's ``class`` attributes, their markers in its raw
+HTML) and keeps a :class:`Layout` per fingerprint: the chains restricted to
+those selectors. Chains are still tried in their order: which selector
+comes first decides what is extracted when several match.
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Pattern, Tuple, TypeVar
+
+from bs4 import Tag
+
+DEFAULT_MAX_LAYOUTS = 64
+
+_CLASS_ATTR_RE = re.compile(r'''(?<![\w-])class\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+
+T = TypeVar('T')
+
+
+def class_tokens(html_content: str) -> FrozenSet[str]:
+    """Every class name used in the ``class`` attributes of ``html_content``."""
+    tokens = set()
+    for match in _CLASS_ATTR_RE.finditer(html_content):
+        tokens.update((match.group(1) or match.group(2) or match.group(3) or '').split())
+    return frozenset(tokens)
+
+
+@dataclass(frozen=True)
+class Selector:
+    """An element lookup: a tag name plus an optional exact class and href pattern.
+
+    ``marker`` is a literal that occurs in the raw HTML of any page the
+    selector can match on. Without one, the selector can only match on pages
+    using all its class names; a selector without class nor marker is
+    assumed to be able to match everywhere.
+    ``param`` names the query parameter an id is read from, ``until`` where
+    its value ends, and ``attr`` the attribute a URL is read from.
+    """
+
+    tag: str
+    class_: Optional[str] = None
+    href: Optional[str] = None
+    src: Optional[str] = None
+    marker: Optional[str] = None
+    param: Optional[str] = None
+    until: Optional[str] = '&'
+    attr: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Selector':
+        data = dict(data)
+        if 'class' in data:
+            data['class_'] = data.pop('class')
+        return cls(**data)
+
+    def can_match(self, html_content: str, classes: FrozenSet[str]) -> bool:
+        """Whether this selector may match on ``html_content``, whose class names are ``classes``."""
+        if self.marker is not None:
+            return self.marker in html_content
+        if self.class_ is not None:
+            return all(token in classes for token in self.class_.split())
+        return True
+
+    def _kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {}
+        if self.class_ is not None:
+            kwargs['class_'] = self.class_
+        if self.href is not None:
+            kwargs['href'] = _compiled(self.href)
+        if self.src is not None:
+            kwargs['src'] = _compiled(self.src)
+        return kwargs
+
+    def matches(self, attrs: Dict[str, str], classes: Optional[List[str]]) -> bool:
+        """Whether an element with ``attrs`` (``classes`` being its split class) passes ``find``'s filters.
+
+        The tag name is not checked. Classes match the way BeautifulSoup matches ``class_``: any single
+        class name, or the whole attribute.
+        """
+        if self.class_ is not None:
+            if not classes or (self.class_ not in classes and self.class_ != ' '.join(classes)):
+                return False
+        for name, pattern in (('href', self.href), ('src', self.src)):
+            if pattern is not None:
+                value = attrs.get(name)
+                if value is None or not _compiled(pattern).search(value):
+                    return False
+        return True
+
+    def find(self, tag: Tag) -> Optional[Tag]:
+        return tag.find(self.tag, **self._kwargs())
+
+    def find_all(self, tag: Tag) -> list:
+        return tag.find_all(self.tag, **self._kwargs())
+
+    def read_param(self, value: str) -> str:
+        """The value of ``param`` in ``value`` (an href), the way ids are cut out of post links."""
+        value = value.split(f'{self.param}=')[1]
+        return value.split(self.until)[0] if self.until else value
+
+
+_PATTERNS: Dict[str, Pattern] = {}
+
+
+def _compiled(pattern: str) -> Pattern:
+    compiled = _PATTERNS.get(pattern)
+    if compiled is None:
+        compiled = _PATTERNS[pattern] = re.compile(pattern)
+    return compiled
+
+
+@dataclass(frozen=True)
+class SelectorChains:
+    """The selector chain of every looked up field of a timeline page."""
+
+    posts: Tuple[Selector, ...]
+    text: Tuple[Selector, ...]
+    likes: Tuple[Selector, ...]
+    image: Tuple[Selector, ...]
+    story_id: Tuple[Selector, ...]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SelectorChains':
+        return cls(**{f.name: tuple(Selector.from_dict(s) for s in data[f.name]) for f in fields(cls)})
+
+    def fingerprint(self, html_content: str) -> Tuple[bool, ...]:
+        """For every selector, whether it can match on ``html_content``."""
+        classes = class_tokens(html_content)
+        return tuple(
+            selector.can_match(html_content, classes)
+            for f in fields(self) for selector in getattr(self, f.name)
+        )
+
+    def restricted_to(self, fingerprint: Tuple[bool, ...]) -> 'SelectorChains':
+        """These chains without the selectors that cannot match on a page with ``fingerprint``."""
+        live = iter(fingerprint)
+        return SelectorChains(**{
+            f.name: tuple(selector for selector in getattr(self, f.name) if next(live))
+            for f in fields(self)
+        })
+
+
+DEFAULT_SELECTOR_CHAINS = SelectorChains.from_dict({
+    'posts': [
+        {'tag': 'article'},
+        {'tag': 'div', 'class': '_55wo _56bf _5rgl'},
+        {'tag': 'div', 'class': 'bm bn bo'},
+    ],
+    'text': [
+        {'tag': 'div', 'class': '_5rgn'},
+        {'tag': 'div', 'class': 'ca'},
+        {'tag': 'td', 'class': 't bs'},
+    ],
+    'likes': [
+        {'tag': 'a', 'class': '_2e4w nowrap'},
+        {'tag': 'a', 'class': 'cn co'},
+    ],
+    'image': [
+        {'tag': 'a', 'class': 'cf cg ch', 'attr': 'href'},
+        {'tag': 'img', 'src': r'https://.*\.fna\.fbcdn\.net/v/', 'marker': '.fbcdn.net/v/', 'attr': 'src'},
+    ],
+    'story_id': [
+        {'tag': 'a', 'href': r'/story.php\?story_fbid=\d+', 'marker': 'story_fbid=', 'param': 'story_fbid'},
+        {'tag': 'a', 'href': r'/photo.php\?fbid=\d+', 'marker': 'fbid=', 'param': 'fbid'},
+        {'tag': 'a', 'href': r'/reactions/picker/\?ft_id=\d+', 'marker': 'ft_id=', 'param': 'ft_id',
+         'until': None},
+    ],
+})
+
+
+def load_selector_chains(path: str) -> SelectorChains:
+    """Read selector chains from a JSON file shaped like ``DEFAULT_SELECTOR_CHAINS``."""
+    with open(path, 'r') as f:
+        return SelectorChains.from_dict(json.load(f))
+
+
+class Layout:
+    """The selectors that can match on one page layout.
+
+    ``chains`` are the chains restricted to those selectors. They keep their
+    order, so the extracted fields are the same as with the full chains.
+    """
+
+    def __init__(self, chains: SelectorChains):
+        self.chains = chains
+
+    def first(self, field: str, lookup: Callable[[Selector], Optional[T]]) -> Optional[T]:
+        """The first value other than ``None`` ``lookup`` returns for the selectors of ``field``, in chain order."""
+        for selector in getattr(self.chains, field):
+            value = lookup(selector)
+            if value is not None:
+                return value
+        return None
+
+
+class LayoutCache:
+    """Remembers, for every page layout seen, the selectors that can match on it."""
+
+    def __init__(self, max_layouts: int = DEFAULT_MAX_LAYOUTS):
+        self.max_layouts = max_layouts
+        self.hits = 0
+        self.misses = 0
+        self._layouts: 'OrderedDict[Tuple[SelectorChains, Tuple[bool, ...]], Layout]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, chains: SelectorChains, html_content: str) -> Layout:
+        """Return the layout of ``html_content``: ``chains`` restricted to the selectors that can match on it."""
+        key = (chains, chains.fingerprint(html_content))
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                self.hits += 1
+                return layout
+            self.misses += 1
+            layout = self._layouts[key] = Layout(chains.restricted_to(key[1]))
+            if len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+            return layout
+
+    @property
+    def layouts(self) -> int:
+        return len(self._layouts)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent to parsing processes empty: every process warms up its own copy
+        return {'max_layouts': self.max_layouts}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state['max_layouts'])
@@ -1,13 +1,14 @@
 import abc
 import re
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-import dateparser
 from bs4 import BeautifulSoup, Tag
-from dateutil.parser import parse
 
 from facebook_simple_scraper.entities import Post, PostList
+from facebook_simple_scraper.posts.date_parser import parse_post_date
+from facebook_simple_scraper.posts.selectors import DEFAULT_SELECTOR_CHAINS, Layout, LayoutCache, Selector, \
+    SelectorChains
 
 
 class PostSummaryHTMLParser(abc.ABC):
@@ -17,15 +18,29 @@ class PostSummaryHTMLParser(abc.ABC):
 
 
 class PostSummaryListExtractor(PostSummaryHTMLParser):
+    """Extracts the posts of a timeline page with BeautifulSoup.
+
+    Args:
+        selector_chains: Where to look for every field, see :mod:`facebook_simple_scraper.posts.selectors`.
+        layout_cache: Skips the selectors that cannot match on a page and tries the ones that matched
+            on its layout first. Share it to keep what was learnt about the layouts seen by other extractors.
+    """
+
+    def __init__(self, selector_chains: SelectorChains = DEFAULT_SELECTOR_CHAINS,
+                 layout_cache: Optional[LayoutCache] = None):
+        self.selector_chains = selector_chains
+        self.layout_cache = layout_cache if layout_cache is not None else LayoutCache()
+
     def extract_posts(self, html_content: str) -> PostList:
         return self._extract_posts_from_html(html_content)
 
     def _extract_posts_from_html(self, html_content: str) -> PostList:
         results: List[Post] = []
+        layout = self.layout_cache.resolve(self.selector_chains, html_content)
         soup = BeautifulSoup(html_content, 'html.parser')
-        feeds = self._extract_post_tags(soup)
+        feeds = self._extract_post_tags(soup, layout)
         for feed in feeds:
-            post_summary = self._extract_post_from_tag(feed)
+            post_summary = self._extract_post_from_tag(feed, layout)
             results.append(post_summary)
         cursor, profile_id = self._extract_next_page_params(soup)
         # sort by date
@@ -34,18 +49,11 @@ class PostSummaryListExtractor(PostSummaryHTMLParser):
             posts=results, cursor=cursor, profile_id=profile_id,
         )
 
-    def _extract_post_from_tag(self, feed: BeautifulSoup) -> Post:
-        text, text_tag = self._extract_post_text(feed)
-        like_count = self._extract_like_count(feed)
-        image_tag = feed.find('a', class_='cf cg ch')
-        image_url = ''
-        if image_tag is None:
-            image_tag = feed.find('img', src=re.compile(r'https://.*\.fna\.fbcdn\.net/v/'))
-            if image_tag is not None:
-                image_url = image_tag.attrs['src']
-        else:
-            image_url = image_tag.attrs['href']
-        story_id = self._extract_story_id(feed)
+    def _extract_post_from_tag(self, feed: BeautifulSoup, layout: Layout) -> Post:
+        text, text_tag = self._extract_post_text(feed, layout)
+        like_count = self._extract_like_count(feed, layout)
+        image_url = self._extract_image_url(feed, layout)
+        story_id = self._extract_story_id(feed, layout)
         comment_count = self._extract_comments_count(feed)
         # in format like "'May 2 at 1:27 PM'"
         post_date = self._extract_post_date(feed)
@@ -61,44 +69,38 @@ class PostSummaryListExtractor(PostSummaryHTMLParser):
         )
 
     @staticmethod
-    def _extract_post_tags(soup: BeautifulSoup) -> List[BeautifulSoup]:
-        feeds = soup.find_all('article')
-        if feeds is None or len(feeds) == 0:
-            feeds = soup.find_all('div', class_='_55wo _56bf _5rgl')
-            if feeds is None or len(feeds) == 0:
-                feeds = soup.find_all('div', class_='bm bn bo')
-        if feeds is None or len(feeds) == 0:
-            return []
-        return feeds
+    def _extract_post_tags(soup: BeautifulSoup, layout: Layout) -> List[BeautifulSoup]:
+        return layout.first('posts', lambda selector: selector.find_all(soup) or None) or []
 
     @staticmethod
-    def _extract_post_text(feed: BeautifulSoup) -> Tuple[str, Tag]:
-        text_tag = feed.find('div', class_='_5rgn')
-        text = ''
-        if text_tag is not None:
+    def _extract_post_text(feed: BeautifulSoup, layout: Layout) -> Tuple[str, Optional[Tag]]:
+        def lookup(selector: Selector) -> Optional[Tuple[str, Tag]]:
+            text_tag = selector.find(feed)
+            if text_tag is None:
+                return None
             text = text_tag.get_text(strip=True)
-        if text == '':
-            text_tag = feed.find_all('div', class_='ca')
-            if text_tag is not None and len(text_tag) > 0:
-                text = text_tag[0].get_text(strip=True)
-        if text == '':
-            text_tag = feed.find('td', class_='t bs')
-            if text_tag is not None:
-                text = text_tag.get_text(strip=True)
-        return text, text_tag
+            return (text, text_tag) if text != '' else None
+
+        return layout.first('text', lookup) or ('', None)
 
     @staticmethod
-    def _extract_like_count(feed: Tag) -> int:
-        likes_tag = feed.find('a', class_='_2e4w nowrap')
+    def _extract_like_count(feed: Tag, layout: Layout) -> int:
+        likes_tag = layout.first('likes', lambda selector: selector.find(feed))
         if likes_tag is None:
-            likes_tag = feed.find('a', class_='cn co')
-            if likes_tag is None:
-                return 0
+            return 0
         try:
             return int(likes_tag.get_text(strip=True).replace(",", '').split(' ')[-1])
         except:
             return 0
 
+    @staticmethod
+    def _extract_image_url(feed: Tag, layout: Layout) -> str:
+        def lookup(selector: Selector) -> Optional[str]:
+            image_tag = selector.find(feed)
+            return image_tag.attrs[selector.attr] if image_tag is not None else None
+
+        return layout.first('image', lookup) or ''
+
     @classmethod
     def _extract_post_date(cls, feed: BeautifulSoup) -> datetime:
         post_date_str = feed.find("abbr").text
@@ -120,10 +122,7 @@ class PostSummaryListExtractor(PostSummaryHTMLParser):
         :param date_string:
         :return:
         """
-        try:
-            return dateparser.parse(date_string)
-        except Exception as e:
-            return parse(date_string.replace('at', ''))
+        return parse_post_date(date_string)
 
     @staticmethod
     def _extract_next_page_params(soup: BeautifulSoup) -> Tuple[str, str]:
@@ -140,24 +139,14 @@ class PostSummaryListExtractor(PostSummaryHTMLParser):
         return cursor.strip().replace("'", ''), profile_id.strip()
 
     @staticmethod
-    def _extract_story_id(feed: BeautifulSoup) -> str:
-        story_id = ''
-        story_id_regex = re.compile(r'/story.php\?story_fbid=\d+')
-        story_id_query_params_tag = feed.find('a', href=story_id_regex)
-        if story_id_query_params_tag is not None and 'href' in story_id_query_params_tag.attrs:
-            story_id_query_params = story_id_query_params_tag['href'].split('story_fbid=')[1]
-            story_id = story_id_query_params.split('&')[0]
-        else:
-            story_id_regex = re.compile(r'/photo.php\?fbid=\d+')
-            story_id_query_params_tag = feed.find('a', href=story_id_regex)
-            if story_id_query_params_tag is not None and 'href' in story_id_query_params_tag.attrs:
-                story_id_query_params = story_id_query_params_tag['href'].split('fbid=')[1]
-                story_id = story_id_query_params.split('&')[0]
-        if story_id in [None, '']:
-            story_id_regex = re.compile(r'/reactions/picker/\?ft_id=\d+')
-            story_id_query_params_tag = feed.find('a', href=story_id_regex)
-            if story_id_query_params_tag is not None and 'href' in story_id_query_params_tag.attrs:
-                story_id = story_id_query_params_tag['href'].split('ft_id=')[1]
+    def _extract_story_id(feed: BeautifulSoup, layout: Layout) -> str:
+        def lookup(selector: Selector) -> Optional[str]:
+            story_id_query_params_tag = selector.find(feed)
+            if story_id_query_params_tag is None or 'href' not in story_id_query_params_tag.attrs:
+                return None
+            return selector.read_param(story_id_query_params_tag['href']) or None
+
+        story_id = layout.first('story_id', lookup)
         if story_id in [None, '']:
             story_id = PostSummaryListExtractor._extract_story_id_by_like_tag(str(feed))
         return story_id
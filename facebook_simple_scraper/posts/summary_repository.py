@@ -1,31 +1,50 @@
+import asyncio
+import html
+import re
 import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from random import randint
-from typing import Iterable, Optional, List
+from random import uniform
+from typing import AsyncIterator, Callable, Deque, Iterable, Optional, List
 
+from facebook_simple_scraper.checkpoints import CheckpointStore, CrawlCheckpoint
 from facebook_simple_scraper.details.repository import PostDetailRepository, PostDetails
-from facebook_simple_scraper.entities import StopCondition, Post, PostList
+from facebook_simple_scraper.entities import StopCondition, Post, PostList, StopReport
+from facebook_simple_scraper.pipeline import PagePipeline, parser_task
+from facebook_simple_scraper.posts.high_water_mark import HighWaterMark, HighWaterMarkStore, Traversal
 from facebook_simple_scraper.posts.summary_extractor import PostSummaryHTMLParser
 from facebook_simple_scraper.requester import requester
+from facebook_simple_scraper.requester.async_requester import AsyncRequester, ThreadedAsyncRequester
+from facebook_simple_scraper.stop_conditions import StopConditionSet
+
+_NEXT_PAGE_HREF_RE = re.compile(r'href="([^"]*cursor=[^"]*)"')
 
 
 @dataclass
 class GetPostOptions:
     requester: requester.Requester
     parser: PostSummaryHTMLParser
-    sleep_time_min: int = 5
-    sleep_time_max: int = 10
+    sleep_time_min: float = 5
+    sleep_time_max: float = 10
     max_comments: int = 10
     comments_repository: Optional[PostDetailRepository] = None
     stop_conditions: Optional[List[StopCondition]] = None
+    async_requester: Optional[AsyncRequester] = None
+    details_workers: int = 1
+    parse_executor: Optional[Executor] = None
+    on_stop: Optional[Callable[[StopReport], None]] = None
+    streaming: bool = False
+    checkpoint_store: Optional[CheckpointStore] = None
+    high_water_marks: Optional[HighWaterMarkStore] = None
 
 
 class PostSummaryListRepository:
     _profile_id: Optional[str]
     _cursor: Optional[str]
     _requester: requester.Requester
-    _sleep_time_min: int
-    _sleep_time_max: int
+    _sleep_time_min: float
+    _sleep_time_max: float
 
     def __init__(self, opts: GetPostOptions):
         self._requester = opts.requester
@@ -36,59 +55,321 @@ class PostSummaryListRepository:
         self._sleep_time_max = opts.sleep_time_max
         self._max_comments = opts.max_comments
         self._comments_repository = opts.comments_repository
+        self._details_workers = max(1, opts.details_workers)
+        self._parse_executor = opts.parse_executor
+        self._on_stop = opts.on_stop
+        self._streaming = opts.streaming
+        self._checkpoint_store = opts.checkpoint_store
+        self._high_water_marks = opts.high_water_marks
+        self._stop_reports: List[StopReport] = []
+        if opts.async_requester is not None:
+            self._async_requester = opts.async_requester
+        else:
+            self._async_requester = ThreadedAsyncRequester(opts.requester)
 
     def get_posts(self, account_name: str, stop_conditions: List[StopCondition]) -> Iterable[Post]:
-        post_list: List[Post] = []
+        """Yield the posts of ``account_name`` until a stop condition says otherwise.
+
+        The conditions are checked before every post, so the details of the
+        posts left on the page are not requested, and between the comment
+        pages of a post. Each stop is reported (see ``get_stop_reports``).
+
+        With a checkpoint store, the crawl resumes from the checkpoint a
+        previous run left for ``account_name`` and saves one after every page.
+
+        With a high-water mark store, the crawl is incremental: posts already
+        seen by an earlier crawl of ``account_name`` are skipped and paging
+        stops at the first page ending in one. However the crawl ends, the
+        range of posts it went through is then merged into the mark (see
+        :mod:`facebook_simple_scraper.posts.high_water_mark`).
+        """
+        conditions = StopConditionSet(stop_conditions, self._on_stop, self._streaming)
+        self._stop_reports = conditions.reports
+        self._resume(account_name, conditions)
+        mark = self._high_water_marks.get(account_name) if self._high_water_marks is not None else None
+        traversal = Traversal() if self._high_water_marks is not None else None
+        try:
+            for r in self._iter_pages(account_name):
+                self._profile_id = r.profile_id
+                self._cursor = r.cursor
+                unseen = self._unseen_posts(r.posts, mark, traversal)
+                yielded = 0
+                for post in self._iter_posts_with_details(unseen, conditions):
+                    conditions.observe(post)
+                    if traversal is not None:
+                        traversal.went_through(post)
+                    yield post
+                    yielded += 1
+                if yielded == len(unseen) and traversal is not None:
+                    traversal.finished_page(last=not self._cursor)
+                if conditions.stopped or not self._cursor or self._reached_mark(mark, traversal, conditions) \
+                        or conditions.check(saved_requests=1):
+                    break
+                self._save_checkpoint(account_name, conditions)
+            self._delete_checkpoint(account_name, conditions)
+        finally:
+            self._update_mark(account_name, traversal)
+
+    async def aget_posts(self, account_name: str, stop_conditions: List[StopCondition]) -> AsyncIterator[Post]:
+        """Async variant of ``get_posts``.
+
+        Requests go through the async requester, parsing runs on the default
+        executor and the pause between pages is an ``asyncio.sleep``, so many
+        timelines can be crawled concurrently from a single event loop.
+        """
+        conditions = StopConditionSet(stop_conditions, self._on_stop, self._streaming)
+        self._stop_reports = conditions.reports
+        await asyncio.to_thread(self._resume, account_name, conditions)
+        mark = await asyncio.to_thread(self._high_water_marks.get, account_name) \
+            if self._high_water_marks is not None else None
+        traversal = Traversal() if self._high_water_marks is not None else None
+        loop = asyncio.get_running_loop()
+        extract_posts = parser_task(self._parser, 'extract_posts', self._parse_executor)
+        try:
+            while True:
+                if self._cursor is None:
+                    url = self._first_page_url(account_name)
+                else:
+                    url = self._next_page_url(self._cursor, self._profile_id)
+                response = await self._async_requester.request("GET", url)
+                r = await loop.run_in_executor(self._parse_executor, extract_posts, response.text)
+                self._profile_id = r.profile_id
+                self._cursor = r.cursor
+                unseen = self._unseen_posts(r.posts, mark, traversal)
+                yielded = 0
+                async for post in self._aiter_posts_with_details(unseen, conditions):
+                    conditions.observe(post)
+                    if traversal is not None:
+                        traversal.went_through(post)
+                    yield post
+                    yielded += 1
+                if yielded == len(unseen) and traversal is not None:
+                    traversal.finished_page(last=not self._cursor)
+                if conditions.stopped or not self._cursor or self._reached_mark(mark, traversal, conditions) \
+                        or conditions.check(saved_requests=1):
+                    break
+                await asyncio.to_thread(self._save_checkpoint, account_name, conditions)
+                await asyncio.sleep(self._sleep_time())
+            await asyncio.to_thread(self._delete_checkpoint, account_name, conditions)
+        finally:
+            await asyncio.to_thread(self._update_mark, account_name, traversal)
+
+    def _iter_pages(self, account_name: str) -> Iterable[PostList]:
+        """Yield the parsed timeline pages, pausing before every page but the first.
+
+        With a parse executor, pages are parsed on it while the next page is
+        downloaded (see :class:`PagePipeline`).
+        """
+        if self._cursor is None:
+            url = self._first_page_url(account_name)
+        else:
+            url = self._next_page_url(self._cursor, self._profile_id)
+        if self._parse_executor is not None:
+            pipeline = PagePipeline(
+                fetch=lambda page_url: self._requester.request("GET", page_url).text,
+                parse=parser_task(self._parser, 'extract_posts', self._parse_executor),
+                next_url=lambda r: self._next_page_url(r.cursor, r.profile_id) if r.cursor else None,
+                peek_next_url=self._peek_next_page_url,
+                parse_executor=self._parse_executor,
+                pause=self._sleep_time,
+            )
+            yield from pipeline.pages(url)
+            return
+        if self._cursor is None:
+            page_html = self._get_posts_first_page_html(account_name)
+        else:
+            page_html = self._get_posts_next_page_html(self._cursor, self._profile_id)
         while True:
-            if self._cursor is None:
-                page_html = self._get_posts_first_page_html(account_name)
-            else:
-                page_html = self._get_posts_next_page_html(self._cursor, self._profile_id)
             r = self._parser.extract_posts(page_html)
-            self._profile_id = r.profile_id
-            self._cursor = r.cursor
-            for post in r.posts:
-                if self._max_comments > 0 and self._comments_repository is not None:
-                    details = self.get_post_details(post.id)
-                    if details.reactions not in [None, []]:
-                        post.reactions = details.reactions
-                    post.comments = details.comments
-                    post.share_count = details.share_count
-                    post.view_count = details.view_count
-
-                post_list.append(post)
-                yield post
-            if not self._cursor:
-                break
-            for cond in stop_conditions:
-                if cond.should_stop(post_list):
-                    return
+            yield r
+            if not r.cursor:
+                return
             self._sleep()
+            page_html = self._get_posts_next_page_html(r.cursor, r.profile_id)
 
     def get_post_details(self, post_id: str) -> Optional[PostDetails]:
         return self._comments_repository.get_details(post_id, self._max_comments)
 
+    async def aget_post_details(self, post_id: str) -> Optional[PostDetails]:
+        return await self._comments_repository.aget_details(post_id, self._max_comments)
+
     def get_cursor(self) -> Optional[str]:
         return self._cursor
 
+    def get_stop_reports(self) -> List[StopReport]:
+        """The stops of the latest crawl, including the comment paginations cut short."""
+        return list(self._stop_reports)
+
+    def _resume(self, account_name: str, conditions: StopConditionSet) -> None:
+        checkpoint = self._checkpoint_store.load(self._checkpoint_key(account_name, conditions)) \
+            if self._checkpoint_store is not None else None
+        if checkpoint is None:
+            return
+        self._cursor = checkpoint.cursor
+        self._profile_id = checkpoint.profile_id
+        conditions.restore(checkpoint.stop_conditions)
+
+    def _save_checkpoint(self, account_name: str, conditions: StopConditionSet) -> None:
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.save(self._checkpoint_key(account_name, conditions), CrawlCheckpoint(
+                cursor=self._cursor, profile_id=self._profile_id, stop_conditions=conditions.conditions))
+
+    def _delete_checkpoint(self, account_name: str, conditions: StopConditionSet) -> None:
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.delete(self._checkpoint_key(account_name, conditions))
+
+    @staticmethod
+    def _checkpoint_key(account_name: str, conditions: StopConditionSet) -> str:
+        # A crawl with other stop conditions does not carry on with the counters of this one
+        return f"posts:{account_name}:{conditions.digest()}"
+
+    @staticmethod
+    def _unseen_posts(posts: List[Post], mark: Optional[HighWaterMark], traversal: Optional[Traversal]) -> List[Post]:
+        if traversal is None:
+            return posts
+        posts = traversal.start_page(posts)
+        if mark is None:
+            return posts
+        return [post for post in posts if not mark.covers(post)]
+
+    @staticmethod
+    def _reached_mark(mark: Optional[HighWaterMark], traversal: Optional[Traversal],
+                      conditions: StopConditionSet) -> bool:
+        """Whether the page ends in a post seen by an earlier crawl, so the next pages hold only older posts."""
+        if mark is None:
+            return False
+        bottom = traversal.page_bottom()
+        if bottom is None or not mark.reached(bottom):
+            return False
+        conditions.record(StopReport(reason=repr(mark), saved_requests=1))
+        return True
+
+    def _update_mark(self, account_name: str, traversal: Optional[Traversal]) -> None:
+        traversed = traversal.seen_range() if traversal is not None else None
+        if traversed is not None:
+            self._high_water_marks.update(account_name, traversed)
+
+    def _iter_posts_with_details(self, posts: List[Post], conditions: StopConditionSet) -> Iterable[Post]:
+        """Attach details to ``posts`` and yield them in their original order, until ``conditions`` stop.
+
+        With more than one worker, the details of the next posts of the page
+        are requested in parallel, never more than the number of workers ahead
+        of the consumer, so a stop leaves little in flight. Each post is
+        yielded as soon as its own details (and those of the posts before it)
+        are ready.
+        """
+        fetch_details = self._should_fetch_details()
+        if not fetch_details or self._details_workers == 1 or len(posts) <= 1:
+            for i, post in enumerate(posts):
+                if conditions.check(self._saved_requests(len(posts) - i, fetch_details)):
+                    return
+                if fetch_details:
+                    self._apply_details(post, self._get_post_details_until(post.id, conditions))
+                yield post
+            return
+        workers = min(self._details_workers, len(posts))
+        futures: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for i, post in enumerate(posts):
+                    condition = conditions.stopping_condition()
+                    if condition is not None:
+                        # Details already being fetched are not saved, the queued ones are
+                        cancelled = sum(1 for future in futures if future.cancel())
+                        conditions.report(condition, cancelled + self._saved_requests(len(posts) - i - len(futures),
+                                                                                      fetch_details))
+                        return
+                    while len(futures) < workers and i + len(futures) < len(posts):
+                        futures.append(executor.submit(self._get_post_details_until,
+                                                       posts[i + len(futures)].id, conditions))
+                    self._apply_details(post, futures.popleft().result())
+                    yield post
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    async def _aiter_posts_with_details(self, posts: List[Post],
+                                        conditions: StopConditionSet) -> AsyncIterator[Post]:
+        """Async counterpart of ``_iter_posts_with_details``, fetching up to ``details_workers`` details ahead."""
+        fetch_details = self._should_fetch_details()
+        tasks: Deque[asyncio.Future] = deque()
+        try:
+            for i, post in enumerate(posts):
+                if conditions.check(self._saved_requests(len(posts) - i - len(tasks), fetch_details)):
+                    return
+                if fetch_details:
+                    while len(tasks) < self._details_workers and i + len(tasks) < len(posts):
+                        tasks.append(asyncio.ensure_future(
+                            self._aget_post_details_until(posts[i + len(tasks)].id, conditions)))
+                    self._apply_details(post, await tasks.popleft())
+                yield post
+        finally:
+            # Their requests may already be on their way, so they are not counted as saved
+            for task in tasks:
+                task.cancel()
+
+    def _get_post_details_until(self, post_id: str, conditions: StopConditionSet) -> Optional[PostDetails]:
+        return self._comments_repository.get_details_until(post_id, self._max_comments, conditions.check_comments)
+
+    async def _aget_post_details_until(self, post_id: str, conditions: StopConditionSet) -> Optional[PostDetails]:
+        return await self._comments_repository.aget_details_until(post_id, self._max_comments,
+                                                                  conditions.check_comments)
+
+    def _saved_requests(self, unfetched_details: int, fetch_details: bool) -> int:
+        """The requests saved by stopping with ``unfetched_details`` posts of the page left without details."""
+        return (unfetched_details if fetch_details else 0) + (1 if self._cursor else 0)
+
+    def _should_fetch_details(self) -> bool:
+        return self._max_comments > 0 and self._comments_repository is not None
+
+    @staticmethod
+    def _apply_details(post: Post, details: PostDetails) -> None:
+        if details.reactions not in [None, []]:
+            post.reactions = details.reactions
+        post.comments = details.comments
+        post.share_count = details.share_count
+        post.view_count = details.view_count
+
     def _sleep(self):
-        time.sleep(randint(self._sleep_time_min, self._sleep_time_max))
+        time.sleep(self._sleep_time())
+
+    def _sleep_time(self) -> float:
+        return uniform(self._sleep_time_min, self._sleep_time_max)
 
     def _get_posts_first_page_html(self, account_name: str) -> str:
-        url = f"https://mbasic.facebook.com/{account_name}?v=timeline"
-        response = self._requester.request("GET", url)
+        response = self._requester.request("GET", self._first_page_url(account_name))
         return response.text
 
     def _get_posts_next_page_html(self, cursor: str, profile_id: str) -> str:
+        response = self._requester.request("GET", self._next_page_url(cursor, profile_id))
+        return response.text
+
+    @staticmethod
+    def _first_page_url(account_name: str) -> str:
+        return f"https://mbasic.facebook.com/{account_name}?v=timeline"
+
+    @staticmethod
+    def _next_page_url(cursor: str, profile_id: str) -> str:
         url = f"https://mbasic.facebook.com/profile/timeline/stream/"
         params = {
             "cursor": cursor,
             "profile_id": profile_id,
         }
         qp = "&".join([f"{k}={v}" for k, v in params.items()])
-        url = f"{url}?{qp}"
-        response = self._requester.request("GET", url)
-        return response.text
+        return f"{url}?{qp}"
+
+    @classmethod
+    def _peek_next_page_url(cls, page_html: str) -> Optional[str]:
+        """The next page URL of the first cursor link of ``page_html``, without parsing it."""
+        match = _NEXT_PAGE_HREF_RE.search(page_html)
+        if match is None:
+            return None
+        href = html.unescape(match.group(1))
+        if 'profile_id=' not in href:
+            return None
+        cursor = href.split('cursor=')[1].split('&')[0]
+        profile_id = href.split('profile_id=')[1].split('&')[0]
+        return cls._next_page_url(cursor.strip().replace("'", ''), profile_id.strip())
 
     def _parse_posts_html_first_page(self, page_html: str) -> PostList:
         return self._parser.extract_posts(page_html)
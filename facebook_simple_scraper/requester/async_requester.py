@@ -0,0 +1,70 @@
+import abc
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import Optional
+
+import requests
+
+from facebook_simple_scraper.requester.requester import Requester
+
+
+class AsyncRequester(abc.ABC):
+    """Asyncio counterpart of :class:`Requester`.
+
+    Only ``request`` is a coroutine; the session helpers are cheap, in-memory
+    operations and keep the same (blocking) signature as in ``Requester``.
+    """
+
+    @abc.abstractmethod
+    async def request(self, method: str, url: str, data: Optional[dict] = None,
+                      headers: Optional[dict] = None) -> requests.Response:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def validate(self) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def save_session_variables(self, session_variables: dict) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def load_session_variables(self) -> dict:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def get_latest_request(self) -> Optional[requests.Request]:
+        raise NotImplementedError()
+
+
+class ThreadedAsyncRequester(AsyncRequester):
+    """Adapts a blocking :class:`Requester` to :class:`AsyncRequester`.
+
+    Each request runs on ``executor`` (the loop's default executor if None),
+    so the event loop only ever waits on futures. The wrapped requester keeps
+    owning the cookies and session variables, which means a session restored
+    by ``SessionStorage`` can be shared by sync and async code alike.
+    """
+
+    def __init__(self, requester: Requester, executor: Optional[Executor] = None):
+        self.requester = requester
+        self._executor = executor
+
+    async def request(self, method: str, url: str, data: Optional[dict] = None,
+                      headers: Optional[dict] = None) -> requests.Response:
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.requester.request, method, url, data=data, headers=headers)
+        return await loop.run_in_executor(self._executor, call)
+
+    def validate(self) -> None:
+        self.requester.validate()
+
+    def save_session_variables(self, session_variables: dict) -> None:
+        self.requester.save_session_variables(session_variables)
+
+    def load_session_variables(self) -> dict:
+        return self.requester.load_session_variables()
+
+    def get_latest_request(self) -> Optional[requests.Request]:
+        return self.requester.get_latest_request()
@@ -0,0 +1,284 @@
+"""HTTP response cache for :class:`Requester` implementations.
+
+``CachingRequester`` decorates any requester and serves repeated requests from
+a :class:`ResponseCache`. Only requests matching a :class:`CachePolicy` are
+cached, each policy carrying its own TTL. Entries are keyed by the normalized
+URL, the request body and the credential that issued the request, so two
+accounts never see each other's pages.
+
+The cache keeps the most recently used entries in memory and, when a
+``directory`` is given, persists every entry on disk so that it survives
+process restarts. Both tiers are bounded by entry count and by byte size and
+evict least-recently-used entries first.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from facebook_simple_scraper.requester.requester import Requester, RequesterDecorator, session_credential
+
+
+@dataclass
+class CachePolicy:
+    """Caching rule for the requests whose normalized URL matches ``pattern``."""
+
+    pattern: str
+    """Regular expression searched in the normalized URL."""
+
+    ttl: float
+    """Seconds a cached response stays fresh."""
+
+    methods: Tuple[str, ...] = ("GET",)
+    """HTTP methods the rule applies to."""
+
+    def matches(self, method: str, url: str) -> bool:
+        return method.upper() in self.methods and re.search(self.pattern, url) is not None
+
+
+DEFAULT_CACHE_POLICIES: List[CachePolicy] = [
+    CachePolicy(pattern=r"facebook\.com/marketplace/item/\d+", ttl=60 * 60),
+    CachePolicy(pattern=r"mbasic\.facebook\.com/[^/?]+\?v=timeline", ttl=5 * 60),
+    CachePolicy(pattern=r"mbasic\.facebook\.com/profile/timeline/stream/", ttl=5 * 60),
+    CachePolicy(pattern=r"facebook\.com/api/graphql/", ttl=10 * 60, methods=("POST",)),
+]
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme and host, sort the query string and drop the fragment."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+@dataclass
+class _CacheEntry:
+    expires_at: float
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+    url: str
+    encoding: Optional[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response._content_consumed = True
+        response.url = self.url
+        response.encoding = self.encoding
+        return response
+
+
+class ResponseCache:
+    """Two-tier (memory + optional disk) LRU store of HTTP responses.
+
+    Args:
+        directory: Where to persist entries. ``None`` keeps the cache in memory only.
+        max_entries: Maximum number of entries kept in memory.
+        max_bytes: Maximum total body size kept in memory.
+        max_disk_entries: Maximum number of entries kept on disk.
+        max_disk_bytes: Maximum total body size kept on disk.
+        clock: Time source, mainly useful for tests.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024,
+                 max_disk_entries: int = 10_000, max_disk_bytes: int = 1024 * 1024 * 1024,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load_disk_index()
+
+    def get(self, key: str) -> Optional[requests.Response]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            elif key in self._disk:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._disk.move_to_end(key)
+                    self._put_memory(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= self._clock():
+                self._delete(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.to_response()
+
+    def put(self, key: str, response: requests.Response, ttl: float) -> None:
+        entry = _CacheEntry(
+            expires_at=self._clock() + ttl,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+            url=response.url,
+            encoding=response.encoding,
+        )
+        with self._lock:
+            self._put_memory(key, entry)
+            if self.directory is not None:
+                self._write_disk(key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._disk.keys()):
+                self._delete_disk(key)
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(set(self._memory.keys()) | set(self._disk.keys()))
+
+    # ----- memory tier --------------------------------------------------
+
+    def _put_memory(self, key: str, entry: _CacheEntry) -> None:
+        self._delete_memory(key)
+        if entry.size > self.max_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_bytes += entry.size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+
+    def _delete_memory(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+
+    # ----- disk tier ----------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _load_disk_index(self) -> None:
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name[:-len(".pkl")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key: str) -> Optional[_CacheEntry]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            self._delete_disk(key)
+            return None
+
+    def _write_disk(self, key: str, entry: _CacheEntry) -> None:
+        self._delete_disk(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+        size = os.path.getsize(self._path(key))
+        self._disk[key] = size
+        self._disk_bytes += size
+        while len(self._disk) > self.max_disk_entries or self._disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(self._disk))
+            self._delete_disk(oldest)
+
+    def _delete_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _delete(self, key: str) -> None:
+        self._delete_memory(key)
+        self._delete_disk(key)
+
+
+class CachingRequester(RequesterDecorator):
+    """Requester decorator that serves cacheable requests from a :class:`ResponseCache`.
+
+    Args:
+        requester: The requester that performs cache misses.
+        cache: Shared response store.
+        policies: Which URLs are cached and for how long. The first matching
+            policy wins. Requests matching no policy are never cached.
+        credential: Cache namespace. Defaults to the ``username`` (or
+            ``target``) session variable of ``requester``.
+    """
+
+    def __init__(self, requester: Requester, cache: ResponseCache,
+                 policies: Optional[Sequence[CachePolicy]] = None, credential: Optional[str] = None):
+        super().__init__(requester)
+        self.cache = cache
+        self.policies = list(policies) if policies is not None else list(DEFAULT_CACHE_POLICIES)
+        self._credential = credential
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        normalized = normalize_url(url)
+        policy = self._find_policy(method, normalized)
+        if policy is None:
+            return self.requester.request(method, url, data=data, headers=headers)
+        key = self._cache_key(method, normalized, data)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = self.requester.request(method, url, data=data, headers=headers)
+        if response.status_code == 200:
+            self.cache.put(key, response, policy.ttl)
+        return response
+
+    def _find_policy(self, method: str, normalized_url: str) -> Optional[CachePolicy]:
+        for policy in self.policies:
+            if policy.matches(method, normalized_url):
+                return policy
+        return None
+
+    def _credential_key(self) -> str:
+        if self._credential is not None:
+            return self._credential
+        return session_credential(self.requester)
+
+    def _cache_key(self, method: str, normalized_url: str, data: Optional[dict]) -> str:
+        body = json.dumps(data, sort_keys=True, default=str) if data else ""
+        raw = "\n".join([self._credential_key(), method.upper(), normalized_url, body])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
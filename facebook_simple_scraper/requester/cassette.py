@@ -0,0 +1,198 @@
+"""Record / replay of HTTP interactions ("cassettes").
+
+A cassette is a JSON-lines archive where every line holds one request and the
+response that was received for it. ``RecordingRequester`` appends to a
+cassette while a real crawl runs; ``ReplayRequester`` serves a cassette back,
+so whole ``Scraper`` runs (login, timeline, comments, marketplace) can be
+benchmarked and profiled offline and deterministically.
+"""
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from facebook_simple_scraper.error_dict import CassetteMissError
+from facebook_simple_scraper.requester.cache import normalize_url
+from facebook_simple_scraper.requester.requester import Requester, RequesterDecorator
+
+DEFAULT_IGNORED_BODY_FIELDS = ("m_ts",)
+"""Request body fields that change on every run and are ignored when matching (login timestamp)."""
+
+
+class CassetteMode(Enum):
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+
+@dataclass
+class CassetteInteraction:
+    """One request/response pair of a cassette."""
+
+    method: str
+    url: str
+    data: Optional[dict]
+    status_code: int
+    headers: Dict[str, str]
+    body: str
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body.encode('utf-8')
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.url = self.url
+        return response
+
+
+def load_cassette(path: str) -> List[CassetteInteraction]:
+    interactions: List[CassetteInteraction] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                interactions.append(CassetteInteraction(**json.loads(line)))
+    return interactions
+
+
+def save_cassette(path: str, interactions: Iterable[CassetteInteraction]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for interaction in interactions:
+            f.write(json.dumps(asdict(interaction), default=str))
+            f.write('\n')
+
+
+class Cassette:
+    """Cassette configuration shared by every requester of a scraper run.
+
+    Args:
+        path: JSON-lines archive to write (record) or read (replay).
+        mode: Whether requests are recorded or replayed.
+        latency: Replay only. Seconds each replayed request waits before returning,
+            to simulate network round trips.
+    """
+
+    def __init__(self, path: str, mode: CassetteMode = CassetteMode.REPLAY, latency: float = 0.0):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._replayer: Optional[ReplayRequester] = None
+
+    def append(self, interaction: CassetteInteraction) -> None:
+        line = json.dumps(asdict(interaction), default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.write('\n')
+
+    def replayer(self) -> 'ReplayRequester':
+        """Return the (single, shared) replay requester of this cassette."""
+        with self._lock:
+            if self._replayer is None:
+                self._replayer = ReplayRequester(load_cassette(self.path), latency=self.latency)
+            return self._replayer
+
+
+class RecordingRequester(RequesterDecorator):
+    """Requester decorator that appends every request/response pair to a cassette."""
+
+    def __init__(self, requester: Requester, cassette: Cassette):
+        super().__init__(requester)
+        self.cassette = cassette
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        response = self.requester.request(method, url, data=data, headers=headers)
+        self.cassette.append(CassetteInteraction(
+            method=method.upper(),
+            url=url,
+            data=data,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            body=response.text,
+        ))
+        return response
+
+
+class ReplayRequester(Requester):
+    """Requester that serves the responses of a cassette instead of hitting the network.
+
+    Requests are matched on method, normalized URL and body (ignoring
+    ``ignored_body_fields``). Several recorded responses for the same request
+    are served in recording order; once they are used up the last one is
+    repeated when ``allow_repeats`` is set, otherwise :class:`CassetteMissError`
+    is raised.
+    """
+
+    def __init__(self, interactions: Sequence[CassetteInteraction], latency: float = 0.0,
+                 allow_repeats: bool = True, ignored_body_fields: Sequence[str] = DEFAULT_IGNORED_BODY_FIELDS):
+        self.latency = latency
+        self.allow_repeats = allow_repeats
+        self.ignored_body_fields = tuple(ignored_body_fields)
+        self.session_variables: dict = {}
+        self.latest_request: Optional[requests.Request] = None
+        self.served = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, str], Deque[CassetteInteraction]] = {}
+        self._last: Dict[Tuple[str, str, str], CassetteInteraction] = {}
+        for interaction in interactions:
+            key = self._key(interaction.method, interaction.url, interaction.data)
+            self._pending.setdefault(key, deque()).append(interaction)
+
+    @classmethod
+    def from_file(cls, path: str, latency: float = 0.0) -> 'ReplayRequester':
+        return cls(load_cassette(path), latency=latency)
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        key = self._key(method, url, data)
+        with self._lock:
+            self.latest_request = requests.Request(method, url, headers=headers, data=data)
+            pending = self._pending.get(key)
+            if pending:
+                interaction = pending.popleft()
+                self._last[key] = interaction
+            elif self.allow_repeats and key in self._last:
+                interaction = self._last[key]
+            else:
+                raise CassetteMissError(method, url)
+            self.served += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return interaction.to_response()
+
+    def validate(self) -> None:
+        pass
+
+    def save_session_variables(self, session_variables: dict) -> None:
+        self.session_variables = session_variables
+
+    def load_session_variables(self) -> dict:
+        return self.session_variables
+
+    def get_latest_request(self) -> Optional[requests.Request]:
+        return self.latest_request
+
+    def _key(self, method: str, url: str, data: Optional[dict]) -> Tuple[str, str, str]:
+        body = ''
+        if data:
+            kept = {k: v for k, v in data.items() if k not in self.ignored_body_fields}
+            body = json.dumps(kept, sort_keys=True, default=str)
+        return method.upper(), normalize_url(url), body
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
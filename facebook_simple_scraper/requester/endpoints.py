@@ -0,0 +1,30 @@
+from enum import Enum
+from urllib.parse import urlsplit
+
+
+class Endpoint(str, Enum):
+    """Facebook endpoints that get their own request budgets and health tracking."""
+
+    LOGIN = "login"
+    TIMELINE = "timeline"
+    GRAPHQL = "graphql"
+    MARKETPLACE_SEARCH = "marketplace_search"
+    MARKETPLACE_DETAIL = "marketplace_detail"
+    OTHER = "other"
+
+
+def classify_endpoint(url: str) -> Endpoint:
+    """Map a request URL to the :class:`Endpoint` it belongs to."""
+    parts = urlsplit(url)
+    path = parts.path
+    if path.startswith("/api/graphql"):
+        return Endpoint.GRAPHQL
+    if path.startswith("/marketplace/item/"):
+        return Endpoint.MARKETPLACE_DETAIL
+    if path.startswith("/marketplace/"):
+        return Endpoint.MARKETPLACE_SEARCH
+    if path.startswith("/login") or "/checkpoint" in path:
+        return Endpoint.LOGIN
+    if path.startswith("/profile/timeline/stream") or "v=timeline" in parts.query:
+        return Endpoint.TIMELINE
+    return Endpoint.OTHER
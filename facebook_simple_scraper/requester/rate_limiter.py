@@ -0,0 +1,200 @@
+"""Adaptive, shared request pacing.
+
+Every (credential, endpoint) pair gets its own token bucket. Requests reserve
+a token before being sent and wait until the bucket can pay for it, plus a
+small random jitter. The refill rate of each bucket adapts AIMD-style: it
+grows additively while responses stay healthy and is cut multiplicatively
+on errors, throttling responses or checkpoint pages.
+
+A single :class:`RateLimiter` is meant to be shared by every repository (and
+thread) that talks to Facebook with the same accounts, so the budget of an
+account is respected no matter which crawl spends it.
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from facebook_simple_scraper.requester.endpoints import Endpoint, classify_endpoint
+from facebook_simple_scraper.requester.requester import Requester, RequesterDecorator, session_credential
+
+
+@dataclass
+class RateBudget:
+    """Request budget of one endpoint, in requests per second."""
+
+    rate: float
+    """Initial refill rate."""
+
+    min_rate: float
+    """Lower bound the rate can be cut to after failures."""
+
+    max_rate: float
+    """Upper bound the rate can grow to while responses stay healthy."""
+
+    burst: float = 1.0
+    """Maximum number of tokens that can be accumulated while idle."""
+
+
+DEFAULT_RATE_BUDGETS: Dict[Endpoint, RateBudget] = {
+    Endpoint.LOGIN: RateBudget(rate=0.2, min_rate=0.02, max_rate=0.5),
+    Endpoint.TIMELINE: RateBudget(rate=0.5, min_rate=0.05, max_rate=1.0),
+    Endpoint.GRAPHQL: RateBudget(rate=1.0, min_rate=0.1, max_rate=2.0, burst=2.0),
+    Endpoint.MARKETPLACE_SEARCH: RateBudget(rate=0.3, min_rate=0.03, max_rate=0.7),
+    Endpoint.MARKETPLACE_DETAIL: RateBudget(rate=0.5, min_rate=0.05, max_rate=1.0, burst=2.0),
+    Endpoint.OTHER: RateBudget(rate=0.5, min_rate=0.05, max_rate=1.0),
+}
+
+
+class TokenBucket:
+    """Token bucket whose refill rate can be adjusted at runtime.
+
+    ``reserve`` never blocks: it takes a token (letting the balance go
+    negative when the bucket is empty) and returns how long the caller must
+    wait before sending. Concurrent callers therefore queue up naturally.
+    """
+
+    def __init__(self, budget: RateBudget, increase: float, decrease_factor: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = budget.rate
+        self.min_rate = budget.min_rate
+        self.max_rate = budget.max_rate
+        self.capacity = budget.burst
+        self._increase = increase
+        self._decrease_factor = decrease_factor
+        self._clock = clock
+        self._tokens = budget.burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self._increase)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self._decrease_factor)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class RateLimiter:
+    """Registry of per-credential, per-endpoint token buckets.
+
+    Args:
+        budgets: Budget of every endpoint. Missing endpoints use ``Endpoint.OTHER``'s.
+        jitter: Maximum random delay (seconds, may be fractional) added to every request.
+        increase: Requests/second added to a bucket's rate after a healthy response.
+        decrease_factor: Factor a bucket's rate is multiplied by after an unhealthy response.
+        clock: Monotonic time source.
+        sleep: Function used to wait, mainly useful for tests.
+    """
+
+    def __init__(self, budgets: Optional[Dict[Endpoint, RateBudget]] = None, jitter: float = 0.5,
+                 increase: float = 0.05, decrease_factor: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.budgets = dict(DEFAULT_RATE_BUDGETS)
+        if budgets is not None:
+            self.budgets.update(budgets)
+        self.jitter = jitter
+        self._increase = increase
+        self._decrease_factor = decrease_factor
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: Dict[Tuple[str, Endpoint], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_sleep_range(cls, sleep_time_min: float, sleep_time_max: float, **kwargs) -> 'RateLimiter':
+        """Build a limiter whose initial budgets match the average of a min/max sleep range."""
+        average = max((sleep_time_min + sleep_time_max) / 2, 0.1)
+        rate = 1 / average
+        budget = RateBudget(rate=rate, min_rate=rate / 10, max_rate=rate * 2)
+        return cls(budgets={endpoint: budget for endpoint in Endpoint}, **kwargs)
+
+    def bucket(self, credential: str, endpoint: Endpoint) -> TokenBucket:
+        key = (credential, endpoint)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                budget = self.budgets.get(endpoint, self.budgets[Endpoint.OTHER])
+                bucket = TokenBucket(budget, self._increase, self._decrease_factor, self._clock)
+                self._buckets[key] = bucket
+            return bucket
+
+    def delay(self, credential: str, endpoint: Endpoint) -> float:
+        """Reserve a request and return how many seconds to wait before sending it."""
+        wait = self.bucket(credential, endpoint).reserve()
+        if self.jitter > 0:
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    def acquire(self, credential: str, endpoint: Endpoint) -> None:
+        wait = self.delay(credential, endpoint)
+        if wait > 0:
+            self._sleep(wait)
+
+    def record(self, credential: str, endpoint: Endpoint, healthy: bool) -> None:
+        bucket = self.bucket(credential, endpoint)
+        if healthy:
+            bucket.on_success()
+        else:
+            bucket.on_failure()
+
+
+def is_checkpoint_response(response: requests.Response) -> bool:
+    """True when Facebook answered with (or redirected to) a checkpoint page."""
+    if "/checkpoint/" in (response.url or ""):
+        return True
+    return 'action="/login/checkpoint/"' in response.text
+
+
+def is_healthy_response(response: requests.Response) -> bool:
+    """False for errors, throttling and checkpoint pages."""
+    if response.status_code >= 400:
+        return False
+    return not is_checkpoint_response(response)
+
+
+class RateLimitedRequester(RequesterDecorator):
+    """Requester decorator that paces requests through a shared :class:`RateLimiter`.
+
+    Args:
+        requester: The requester that performs the requests.
+        limiter: Shared limiter.
+        credential: Budget owner. Defaults to the account ``requester`` is logged in as.
+    """
+
+    def __init__(self, requester: Requester, limiter: RateLimiter, credential: Optional[str] = None):
+        super().__init__(requester)
+        self.limiter = limiter
+        self._credential = credential
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        credential = self._credential if self._credential is not None else session_credential(self.requester)
+        endpoint = classify_endpoint(url)
+        self.limiter.acquire(credential, endpoint)
+        try:
+            response = self.requester.request(method, url, data=data, headers=headers)
+        except Exception:
+            self.limiter.record(credential, endpoint, healthy=False)
+            raise
+        self.limiter.record(credential, endpoint, healthy=is_healthy_response(response))
+        return response
@@ -1,10 +1,11 @@
 import abc
 import datetime
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple, Union
 
 import requests
 
+from facebook_simple_scraper.default_values import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
 from facebook_simple_scraper.error_dict import SessionExpiredError
 from facebook_simple_scraper.requester.headers import DEFAULT_HEADER
 
@@ -39,9 +40,56 @@ class Requester(abc.ABC):
         raise NotImplementedError()
 
 
+class RequesterDecorator(Requester):
+    """Base class for requesters that add behaviour on top of another requester.
+
+    Session handling is delegated to the wrapped ``requester``; subclasses
+    usually only override ``request``.
+    """
+
+    def __init__(self, requester: Requester):
+        self.requester = requester
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        return self.requester.request(method, url, data=data, headers=headers)
+
+    def validate(self) -> None:
+        self.requester.validate()
+
+    def save_session_variables(self, session_variables: dict) -> None:
+        self.requester.save_session_variables(session_variables)
+
+    def load_session_variables(self) -> dict:
+        return self.requester.load_session_variables()
+
+    def get_latest_request(self) -> Optional[requests.Request]:
+        return self.requester.get_latest_request()
+
+
+def session_credential(req: Requester) -> str:
+    """Identify the account a requester is logged in as (empty for anonymous sessions)."""
+    variables = req.load_session_variables() or {}
+    return str(variables.get("username") or variables.get("target") or "")
+
+
+def unwrap_requester(req: Requester) -> Requester:
+    """Return the innermost requester of a chain of :class:`RequesterDecorator`."""
+    while isinstance(req, RequesterDecorator):
+        req = req.requester
+    return req
+
+
+Timeout = Union[float, Tuple[float, float]]
+"""Seconds to wait for the server: a single value, or a ``(connect, read)`` tuple."""
+
+
 class FacebookSessionBasedRequester(Requester):
+    # Class level default so sessions pickled before timeouts existed still get one
+    timeout: Optional[Timeout] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
 
-    def __init__(self, session: Optional[requests.Session] = None, base_headers: Optional[dict] = None):
+    def __init__(self, session: Optional[requests.Session] = None, base_headers: Optional[dict] = None,
+                 timeout: Optional[Timeout] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
         if session is None:
             self.session = requests.Session()
         else:
@@ -52,6 +100,7 @@ class FacebookSessionBasedRequester(Requester):
             self.headers = DEFAULT_HEADER
         self.session_variables: dict = {}
         self.latest_request: Optional[requests.Request] = None
+        self.timeout = timeout
 
     def load_session_variables(self) -> dict:
         return self.session_variables
@@ -86,7 +135,7 @@ class FacebookSessionBasedRequester(Requester):
         # cookies = {k: v for k, v in self.session.cookies.items() if k in cookies_to_keep}
         # self.session.cookies.clear()
         # self.session.cookies.update(cookies)
-        return self.session.request(method, url, data=data, headers=headers)
+        return self.session.request(method, url, data=data, headers=headers, timeout=self.timeout)
 
     def get_session(self) -> requests.Session:
         return self.session
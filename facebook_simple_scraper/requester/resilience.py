@@ -0,0 +1,259 @@
+"""Retries, backoff and circuit breaking for :class:`Requester` implementations.
+
+``ResilientRequester`` decorates any requester:
+
+* idempotent requests (GET by default) that fail with a connection error, a
+  timeout or a retryable status code are retried with jittered exponential
+  backoff;
+* every endpoint has a :class:`CircuitBreaker`. After ``failure_threshold``
+  consecutive failures the circuit opens and requests to that endpoint fail
+  fast with :class:`CircuitOpenError` until ``reset_timeout`` has passed. Then
+  a single trial request is let through: success closes the circuit, failure
+  (any exception included) opens it again;
+* every attempt is reported as a :class:`RequestAttempt` to an optional
+  callback, e.g. a :class:`RequestMetrics` collector.
+"""
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from facebook_simple_scraper.error_dict import CircuitOpenError
+from facebook_simple_scraper.requester.endpoints import Endpoint, classify_endpoint
+from facebook_simple_scraper.requester.requester import Requester, RequesterDecorator
+
+
+@dataclass
+class RetryPolicy:
+    """When and how often failed requests are retried."""
+
+    max_attempts: int = 3
+    """Total number of attempts, including the first one."""
+
+    backoff_base: float = 0.5
+    """Upper bound (seconds) of the wait before the first retry. It doubles after every retry."""
+
+    backoff_max: float = 30.0
+    """Upper bound (seconds) of any single wait."""
+
+    retry_methods: Tuple[str, ...] = ("GET",)
+    """HTTP methods that are safe to retry."""
+
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    """Status codes that are retried (and count as endpoint failures)."""
+
+    def backoff(self, retry: int) -> float:
+        """Wait before retry number ``retry`` (1-based), using "full jitter"."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retry - 1)))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of a single endpoint."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return CircuitState.HALF_OPEN
+            return self._state
+
+    def allow(self) -> Optional[float]:
+        """Return ``None`` if a request may be sent, otherwise the seconds until the next trial."""
+        with self._lock:
+            if self._state == CircuitState.CLOSED:
+                return None
+            remaining = self.reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0:
+                return remaining
+            if self._trial_running:
+                return self.reset_timeout
+            self._state = CircuitState.HALF_OPEN
+            self._trial_running = True
+            return None
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._state = CircuitState.CLOSED
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self._state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = CircuitState.OPEN
+                self._opened_at = self._clock()
+
+    def on_abort(self) -> None:
+        """The request was interrupted before telling anything about the endpoint: let another trial through."""
+        with self._lock:
+            self._trial_running = False
+
+
+class CircuitBreakers:
+    """Registry of per-endpoint :class:`CircuitBreaker`, shareable between requesters."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._breakers: Dict[Endpoint, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: Endpoint) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout, self._clock)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+
+@dataclass
+class RequestAttempt:
+    """Metric emitted for every attempt made by :class:`ResilientRequester`."""
+
+    method: str
+    url: str
+    endpoint: Endpoint
+    attempt: int
+    """1-based attempt number of the logical request."""
+    elapsed: float
+    """Seconds the attempt took. 0 when it was rejected by an open circuit."""
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    """Exception class name when the attempt raised, ``"circuit_open"`` when it was rejected."""
+    will_retry: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code is not None and self.status_code < 400
+
+
+class RequestMetrics:
+    """Thread-safe collector of :class:`RequestAttempt`, usable as ``on_attempt`` callback.
+
+    Args:
+        max_history: Number of most recent attempts kept in ``history``.
+    """
+
+    def __init__(self, max_history: int = 1000):
+        self.history: Deque[RequestAttempt] = deque(maxlen=max_history)
+        self.attempts: Dict[Endpoint, int] = {}
+        self.failures: Dict[Endpoint, int] = {}
+        self.retries: Dict[Endpoint, int] = {}
+        self.rejected: Dict[Endpoint, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, attempt: RequestAttempt) -> None:
+        with self._lock:
+            self.history.append(attempt)
+            endpoint = attempt.endpoint
+            self.attempts[endpoint] = self.attempts.get(endpoint, 0) + 1
+            if attempt.error == "circuit_open":
+                self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+            elif not attempt.ok:
+                self.failures[endpoint] = self.failures.get(endpoint, 0) + 1
+            if attempt.will_retry:
+                self.retries[endpoint] = self.retries.get(endpoint, 0) + 1
+
+    def snapshot(self) -> List[RequestAttempt]:
+        with self._lock:
+            return list(self.history)
+
+
+class ResilientRequester(RequesterDecorator):
+    """Requester decorator adding retries with backoff and per-endpoint circuit breakers.
+
+    Args:
+        requester: The requester that performs the requests.
+        retry_policy: Retry configuration. Defaults to ``RetryPolicy()``.
+        breakers: Circuit breakers, usually shared by every requester of a scraper.
+            Defaults to a private ``CircuitBreakers()``.
+        on_attempt: Called with a :class:`RequestAttempt` after every attempt.
+        sleep: Function used to wait between attempts, mainly useful for tests.
+    """
+
+    def __init__(self, requester: Requester, retry_policy: Optional[RetryPolicy] = None,
+                 breakers: Optional[CircuitBreakers] = None,
+                 on_attempt: Optional[Callable[[RequestAttempt], None]] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__(requester)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breakers = breakers if breakers is not None else CircuitBreakers()
+        self.on_attempt = on_attempt
+        self._sleep = sleep
+
+    def request(self, method: str, url: str, data: Optional[dict] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        policy = self.retry_policy
+        endpoint = classify_endpoint(url)
+        breaker = self.breakers.get(endpoint)
+        max_attempts = policy.max_attempts if method.upper() in policy.retry_methods else 1
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = breaker.allow()
+            if retry_after is not None:
+                self._emit(RequestAttempt(method, url, endpoint, attempt, 0.0, error="circuit_open"))
+                raise CircuitOpenError(endpoint.value, retry_after)
+            started = time.monotonic()
+            try:
+                response = self.requester.request(method, url, data=data, headers=headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.on_failure()
+                will_retry = attempt < max_attempts
+                self._emit(RequestAttempt(method, url, endpoint, attempt, time.monotonic() - started,
+                                          error=type(e).__name__, will_retry=will_retry))
+                if not will_retry:
+                    raise
+            except Exception as e:
+                # Not worth retrying, but the endpoint failed all the same
+                breaker.on_failure()
+                self._emit(RequestAttempt(method, url, endpoint, attempt, time.monotonic() - started,
+                                          error=type(e).__name__))
+                raise
+            except BaseException:
+                # e.g. KeyboardInterrupt, which must not leave a half-open trial running forever
+                breaker.on_abort()
+                raise
+            else:
+                failed = response.status_code in policy.retry_statuses
+                if failed:
+                    breaker.on_failure()
+                else:
+                    breaker.on_success()
+                will_retry = failed and attempt < max_attempts
+                self._emit(RequestAttempt(method, url, endpoint, attempt, time.monotonic() - started,
+                                          status_code=response.status_code, will_retry=will_retry))
+                if not will_retry:
+                    return response
+            self._sleep(policy.backoff(attempt))
+
+    def _emit(self, attempt: RequestAttempt) -> None:
+        if self.on_attempt is not None:
+            self.on_attempt(attempt)
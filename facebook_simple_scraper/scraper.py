@@ -1,16 +1,32 @@
-from typing import Optional, Iterable
+import asyncio
+import copy
+import dataclasses
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, List, Optional, Iterable
 
-from facebook_simple_scraper.credentials_ring import CredentialsRingBuffer
+from facebook_simple_scraper.credential_pool import CredentialLease, CredentialOutcome, CredentialPool, \
+    LOGIN_USERNAME_VARIABLE
 from facebook_simple_scraper.dependency_builder import AbstractScraperDependencyBuilder, DefaultScraperDependencyBuilder
 from facebook_simple_scraper.details.extractor import PostDetails
-from facebook_simple_scraper.entities import ScraperOptions, Post
+from facebook_simple_scraper.default_values import DEFAULT_CRAWL_WORKERS, DEFAULT_MAX_CONCURRENT_LISTING_DETAILS, \
+    DEFAULT_MAX_PAGES_PER_TILE, DEFAULT_TILE_RADIUS_KM
+from facebook_simple_scraper.entities import AccountCrawlResult, LoginCredentials, ScraperOptions, Post, StopCondition, \
+    StopReport
+from facebook_simple_scraper.error_dict import CheckpointRequiredException
 from facebook_simple_scraper.marketplace.entities import (
+    MarketplaceDetailResult,
     MarketplaceListingDetail,
     MarketplaceVehicleFilters,
     MarketplaceVehicleListing,
 )
 from facebook_simple_scraper.marketplace.repository import MarketplaceVehicleRepository
+from facebook_simple_scraper.marketplace.tiling import Region, TiledMarketplaceSearch, TileReport
 from facebook_simple_scraper.posts.summary_repository import PostSummaryListRepository
+from facebook_simple_scraper.requester.requester import Requester
+
+_ACCOUNT_DONE = object()
 
 
 class Scraper:
@@ -26,11 +42,11 @@ class Scraper:
         Raises:
             ValueError: If required options such as credentials or stop conditions are missing.
         """
-        self.opts = opts
-
         # Use default dependency builder if none is provided
         if deps_builder is None:
             self.deps_builder = DefaultScraperDependencyBuilder()
+        else:
+            self.deps_builder = deps_builder
 
         # Validate credentials
         if opts.credentials is None:
@@ -42,11 +58,15 @@ class Scraper:
         if opts.stop_conditions in [None, []]:
             raise ValueError("Stop conditions are required")
 
-        # Initialize credential handling
-        self.current_credential_index = 0
-        self.creds_ring = CredentialsRingBuffer(opts.credentials)
+        # Initialize credential handling. The pool is also used by the
+        # dependency builder to report the health of every request.
+        if opts.credential_pool is None:
+            opts = dataclasses.replace(opts, credential_pool=CredentialPool(opts.credentials))
+        self.opts = opts
+        self.credential_pool: CredentialPool = opts.credential_pool
         self.post_repo: Optional[PostSummaryListRepository] = None
         self.marketplace_repo: Optional[MarketplaceVehicleRepository] = None
+        self.marketplace_sweep: Optional[TiledMarketplaceSearch] = None
 
     def get_posts(self, account_ids: str) -> Iterable[Post]:
         """Scrape posts from the given account IDs.
@@ -57,16 +77,10 @@ class Scraper:
         Yields:
             Iterable[Post]: A generator yielding posts.
         """
-        # Build the necessary dependencies
-        login_repo, post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts)
-
-        # Iterate through the credentials in a ring buffer fashion
-        for cred in self.creds_ring.next():
-            # Login using the current credential
-            login_resp = login_repo.login(cred.username, cred.password)
-            login_repo, post_repo, marketplace_repo = self.deps_builder.build_deps(
-                self.opts, req=login_resp.requester
-            )
+        # Lease a logged-in credential from the pool for the whole crawl
+        lease = self._lease_logged_in()
+        try:
+            _, post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
             self.post_repo = post_repo
             self.marketplace_repo = marketplace_repo
             # Get posts using the post repository and stop conditions
@@ -75,6 +89,146 @@ class Scraper:
             # Yield each post
             for post in gen:
                 yield post
+        finally:
+            lease.release()
+
+    async def aget_posts(self, account_ids: str) -> AsyncIterator[Post]:
+        """Async variant of :meth:`get_posts`, to be consumed with ``async for``.
+
+        Login runs on a worker thread; the crawl itself uses
+        :meth:`PostSummaryListRepository.aget_posts`, so several accounts can
+        be scraped concurrently from the same event loop.
+
+        Args:
+            account_ids (str): The IDs of the accounts to scrape posts from.
+
+        Yields:
+            Post: The scraped posts.
+        """
+        lease = await asyncio.to_thread(self._lease_logged_in)
+        try:
+            _, post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
+            self.post_repo = post_repo
+            self.marketplace_repo = marketplace_repo
+            async for post in post_repo.aget_posts(account_ids, self.opts.stop_conditions):
+                yield post
+        finally:
+            lease.release()
+
+    def crawl_accounts(
+        self,
+        account_ids: Iterable[str],
+        workers: int = DEFAULT_CRAWL_WORKERS,
+        stop_conditions: Optional[Callable[[str], List[StopCondition]]] = None,
+    ) -> Iterable[AccountCrawlResult]:
+        """Scrape the posts of many accounts in parallel.
+
+        Accounts are spread over a pool of ``workers`` threads. Each worker
+        leases a credential from the credential pool (logging it in once and
+        reusing its session for later accounts), crawls one account and gives
+        the credential back, so at most ``len(opts.credentials)`` accounts are
+        crawled at once.
+
+        Posts of every account come back in one stream, in arrival order,
+        tagged with their account id. An account that fails yields a single
+        result carrying the error; the other accounts keep going.
+
+        Args:
+            account_ids: The IDs of the accounts to scrape. Duplicates are crawled once.
+            workers: Maximum number of accounts crawled at the same time.
+            stop_conditions: Builds the stop conditions of an account from its id. Defaults
+                to a fresh copy of ``opts.stop_conditions`` for every account.
+
+        Yields:
+            AccountCrawlResult: A post, or the error that stopped an account.
+        """
+        ids = list(dict.fromkeys(account_ids))
+        if not ids:
+            return
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        results: queue.Queue = queue.Queue(maxsize=workers * 16)
+        cancelled = threading.Event()
+
+        def emit(item: object) -> bool:
+            while not cancelled.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def run(account_id: str) -> None:
+            try:
+                if stop_conditions is not None:
+                    conditions = stop_conditions(account_id)
+                else:
+                    conditions = copy.deepcopy(self.opts.stop_conditions)
+                self._crawl_account(account_id, conditions, emit, cancelled)
+            except Exception as e:
+                emit(AccountCrawlResult(account_id=account_id, error=e))
+            finally:
+                emit(_ACCOUNT_DONE)
+
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(ids)), thread_name_prefix="crawl")
+        try:
+            for account_id in ids:
+                executor.submit(run, account_id)
+            pending = len(ids)
+            while pending > 0:
+                item = results.get()
+                if item is _ACCOUNT_DONE:
+                    pending -= 1
+                else:
+                    yield item
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _crawl_account(self, account_id: str, conditions: List[StopCondition],
+                       emit: Callable[[object], bool], cancelled: threading.Event) -> None:
+        if cancelled.is_set():
+            return
+        with self._lease_logged_in() as lease:
+            _, post_repo, _ = self.deps_builder.build_deps(self.opts, req=lease.requester)
+            for post in post_repo.get_posts(account_id, conditions):
+                if not emit(AccountCrawlResult(account_id=account_id, post=post)):
+                    return
+
+    def _lease_logged_in(self) -> CredentialLease:
+        """Lease a credential whose requester is logged in, moving on to another one if login fails.
+
+        Raises:
+            NoCredentialAvailableError: If no credential became available within ``opts.credential_lease_timeout``.
+        """
+        error: Optional[Exception] = None
+        for _ in range(len(self.credential_pool)):
+            lease = self.credential_pool.lease(timeout=self.opts.credential_lease_timeout)
+            if lease.requester is not None:
+                return lease
+            try:
+                lease.requester = self._login(lease.credentials)
+                return lease
+            except CheckpointRequiredException as e:
+                lease.record(CredentialOutcome.CHECKPOINT)
+                lease.release()
+                error = e
+            except Exception as e:
+                lease.record(CredentialOutcome.ERROR)
+                lease.release()
+                error = e
+        raise error
+
+    def _login(self, cred: LoginCredentials) -> Requester:
+        # Every credential logs in through its own requester (the login repository keeps it)
+        login_repo, _, _ = self.deps_builder.build_deps(self.opts)
+        req = login_repo.login(cred.username, cred.password).requester
+        # Tag the session so its requests are charged to this credential
+        variables = dict(req.load_session_variables() or {})
+        variables[LOGIN_USERNAME_VARIABLE] = cred.username
+        req.save_session_variables(variables)
+        return req
 
     def get_post_details(self, post_id: str) -> PostDetails:
         if self.post_repo is None:
@@ -86,6 +240,12 @@ class Scraper:
             raise ValueError("Post repository is not initialized")
         return self.post_repo.get_cursor()
 
+    def get_latest_stop_reports(self) -> List[StopReport]:
+        """The stops of the latest post crawl. ``ScrapingCallbacks.on_stop`` receives them as they happen."""
+        if self.post_repo is None:
+            raise ValueError("Post repository is not initialized")
+        return self.post_repo.get_stop_reports()
+
     def get_marketplace_vehicles(
         self, filters: MarketplaceVehicleFilters
     ) -> Iterable[MarketplaceVehicleListing]:
@@ -102,18 +262,77 @@ class Scraper:
         Yields:
             Iterable[MarketplaceVehicleListing]: Listings matching the filters.
         """
-        login_repo, _post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts)
-
-        for cred in self.creds_ring.next():
-            login_resp = login_repo.login(cred.username, cred.password)
-            login_repo, post_repo, marketplace_repo = self.deps_builder.build_deps(
-                self.opts, req=login_resp.requester
-            )
+        with self._lease_logged_in() as lease:
+            _, post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
             self.post_repo = post_repo
             self.marketplace_repo = marketplace_repo
             for listing in marketplace_repo.search(filters, self.opts.stop_conditions or []):
                 yield listing
-            return
+
+    async def aget_marketplace_vehicles(
+        self, filters: MarketplaceVehicleFilters
+    ) -> AsyncIterator[MarketplaceVehicleListing]:
+        """Async variant of :meth:`get_marketplace_vehicles`, to be consumed with ``async for``.
+
+        Args:
+            filters: Filters to apply (location, condition, optional query).
+
+        Yields:
+            MarketplaceVehicleListing: Listings matching the filters.
+        """
+        lease = await asyncio.to_thread(self._lease_logged_in)
+        try:
+            _, post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
+            self.post_repo = post_repo
+            self.marketplace_repo = marketplace_repo
+            async for listing in marketplace_repo.asearch(filters, self.opts.stop_conditions or []):
+                yield listing
+        finally:
+            lease.release()
+
+    def sweep_marketplace_vehicles(
+        self,
+        region: Region,
+        filters: MarketplaceVehicleFilters,
+        workers: int = DEFAULT_CRAWL_WORKERS,
+        radius_km: float = DEFAULT_TILE_RADIUS_KM,
+        max_pages_per_tile: int = DEFAULT_MAX_PAGES_PER_TILE,
+    ) -> Iterable[MarketplaceVehicleListing]:
+        """Search vehicle listings over a whole region, e.g. a country.
+
+        The region is covered by overlapping circles of about ``radius_km``,
+        searched by ``workers`` threads sharing one logged-in session. Tiles
+        reading ``max_pages_per_tile`` pages are split into smaller ones, and
+        listings found by several tiles are yielded once. Stop conditions
+        configured in :class:`ScraperOptions.stop_conditions` apply to the
+        whole sweep. See :mod:`facebook_simple_scraper.marketplace.tiling`.
+
+        Args:
+            region: The area to sweep, e.g. ``BoxRegion(...)`` or ``load_region("country.geojson")``.
+            filters: Filters to apply. Their location is replaced by the circle of every tile.
+            workers: Maximum number of tiles searched at the same time.
+            radius_km: Search radius of the initial tiles.
+            max_pages_per_tile: Pages after which a tile is considered too dense and split.
+
+        Yields:
+            MarketplaceVehicleListing: The distinct listings found, in arrival order.
+        """
+        with self._lease_logged_in() as lease:
+            def repository() -> MarketplaceVehicleRepository:
+                _, _, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
+                return marketplace_repo
+
+            self.marketplace_sweep = TiledMarketplaceSearch(
+                repository, workers=workers, radius_km=radius_km, max_pages_per_tile=max_pages_per_tile,
+                streaming=self.opts.streaming, on_stop=self.opts.callbacks.on_stop,
+                listing_index=self.opts.listing_index)
+            yield from self.marketplace_sweep.search(region, filters, self.opts.stop_conditions or [])
+
+    def get_latest_tile_reports(self) -> List[TileReport]:
+        """The tiles searched by the latest sweep, with the ones that failed or were split."""
+        if self.marketplace_sweep is None:
+            raise ValueError("No marketplace sweep has been run")
+        return self.marketplace_sweep.get_tile_reports()
 
     def get_marketplace_vehicle_detail(
         self, listing_id: str
@@ -131,12 +350,34 @@ class Scraper:
             A :class:`MarketplaceListingDetail` with photos, description and
             vehicle attributes, or ``None`` if extraction failed.
         """
-        login_repo, _post_repo, marketplace_repo = self.deps_builder.build_deps(self.opts)
-
-        for cred in self.creds_ring.next():
-            login_resp = login_repo.login(cred.username, cred.password)
-            _, _, marketplace_repo = self.deps_builder.build_deps(
-                self.opts, req=login_resp.requester
-            )
+        with self._lease_logged_in() as lease:
+            _, _, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
             self.marketplace_repo = marketplace_repo
             return marketplace_repo.get_detail(listing_id)
+
+    def get_marketplace_vehicle_details(
+        self, listing_ids: Iterable[str], workers: int = DEFAULT_MAX_CONCURRENT_LISTING_DETAILS
+    ) -> Iterable[MarketplaceDetailResult]:
+        """Fetch the full detail of many Marketplace listings, e.g. every listing of a sweep.
+
+        Logs in and builds the repositories once, then downloads up to
+        ``workers`` detail pages at a time (see
+        :meth:`MarketplaceVehicleRepository.get_details`). Results come back
+        in completion order; a listing that fails yields its error and the
+        others continue:
+
+            for result in scraper.get_marketplace_vehicle_details(ids):
+                if result.ok and result.detail is not None:
+                    print(result.detail.title)
+
+        Args:
+            listing_ids: The numeric Facebook listing IDs. Duplicates are fetched once.
+            workers: Maximum number of detail pages downloaded at the same time.
+
+        Yields:
+            MarketplaceDetailResult: The detail of a listing, or the error fetching it.
+        """
+        with self._lease_logged_in() as lease:
+            _, _, marketplace_repo = self.deps_builder.build_deps(self.opts, req=lease.requester)
+            self.marketplace_repo = marketplace_repo
+            yield from marketplace_repo.get_details(listing_ids, workers)
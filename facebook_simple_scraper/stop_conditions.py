@@ -1,10 +1,16 @@
+import hashlib
 import time
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
-from facebook_simple_scraper.entities import Post, StopCondition
+from facebook_simple_scraper.entities import Comment, IncrementalStopCondition, Post, StopCondition, StopReport
 
+CRAWL_SCOPE = 'crawl'
+COMMENTS_SCOPE = 'comments'
+# Stop reports kept by a streaming crawl, the oldest are dropped first
+STREAMING_MAX_STOP_REPORTS = 100
 
-class StopAfterNPosts(StopCondition):
+
+class StopAfterNPosts(IncrementalStopCondition):
     """Stop condition that stops scraping after a specified number of posts."""
 
     def __init__(self, n: int):
@@ -13,20 +19,31 @@ class StopAfterNPosts(StopCondition):
             n (int): The number of posts after which to stop scraping.
         """
         self.n = n
+        self.count = 0
+
+    def observe(self, item: Any) -> None:
+        self.count += 1
 
-    def should_stop(self, post_list: List[Post]) -> bool:
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
         """Check if the number of posts scraped has reached the limit.
 
         Args:
-            post_list (List[Post]): The list of posts scraped so far.
+            post_list (Optional[List[Post]]): The list of posts scraped so far. Defaults to the observed posts.
 
         Returns:
             bool: True if the number of posts is greater than or equal to n, False otherwise.
         """
-        return len(post_list) >= self.n
+        count = len(post_list) if post_list is not None else self.count
+        return count >= self.n
+
+    def reset(self) -> None:
+        self.count = 0
 
+    def __repr__(self) -> str:
+        return f'StopAfterNPosts(n={self.n})'
 
-class StopAfterNComments(StopCondition):
+
+class StopAfterNComments(IncrementalStopCondition):
     """Stop condition that stops scraping after a specified number of comments."""
 
     def __init__(self, n: int):
@@ -35,21 +52,41 @@ class StopAfterNComments(StopCondition):
             n (int): The number of comments after which to stop scraping.
         """
         self.n = n
+        self.comments = 0
+
+    def observe(self, item: Any) -> None:
+        self.comments += len(getattr(item, 'comments', None) or [])
 
-    def should_stop(self, post_list: List[Post]) -> bool:
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
         """Check if the total number of comments scraped has reached the limit.
 
         Args:
-            post_list (List[Post]): The list of posts scraped so far.
+            post_list (Optional[List[Post]]): The list of posts scraped so far. Defaults to the observed posts.
 
         Returns:
             bool: True if the number of comments is greater than or equal to n, False otherwise.
         """
-        return sum([len(p.comments) for p in post_list]) >= self.n
+        if post_list is not None:
+            return sum([len(p.comments) for p in post_list]) >= self.n
+        return self.comments >= self.n
+
+    def should_stop_comments(self, comments: List[Comment]) -> bool:
+        return self.comments + len(comments) >= self.n
 
+    def reset(self) -> None:
+        self.comments = 0
 
-class StopAfterNSeconds(StopCondition):
-    """Stop condition that stops scraping after a specified number of seconds."""
+    def __repr__(self) -> str:
+        return f'StopAfterNComments(n={self.n})'
+
+
+class StopAfterNSeconds(IncrementalStopCondition):
+    """Stop condition that stops scraping after a specified number of seconds.
+
+    The clock starts when the condition is created, not when a crawl starts.
+    Checkpoints keep the time spent rather than the start time, so a crawl
+    resumed by a later run only gets what was left of ``n_secs``.
+    """
 
     def __init__(self, n_secs: int):
         """
@@ -59,19 +96,39 @@ class StopAfterNSeconds(StopCondition):
         self.start_time = time.time()
         self.n_secs = n_secs
 
-    def should_stop(self, post_list: List[Post]) -> bool:
+    def observe(self, item: Any) -> None:
+        pass
+
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
         """Check if the elapsed time has reached the limit.
 
         Args:
-            post_list (List[Post]): The list of posts scraped so far.
+            post_list (Optional[List[Post]]): Ignored.
 
         Returns:
             bool: True if the elapsed time is greater than or equal to n_secs, False otherwise.
         """
-        return (time.time() - self.start_time) >= self.n_secs
+        return self.elapsed() >= self.n_secs
+
+    def should_stop_comments(self, comments: List[Comment]) -> bool:
+        return self.should_stop()
+
+    def elapsed(self) -> float:
+        """Seconds spent since the clock started."""
+        return time.time() - self.start_time
 
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'n_secs': self.n_secs, 'elapsed': self.elapsed()}
 
-class StopAfterPostId(StopCondition):
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.n_secs = state['n_secs']
+        self.start_time = time.time() - state['elapsed']
+
+    def __repr__(self) -> str:
+        return f'StopAfterNSeconds(n_secs={self.n_secs})'
+
+
+class StopAfterPostId(IncrementalStopCondition):
     """Stop condition that stops scraping after a specific post ID is encountered."""
 
     def __init__(self, post_id: str):
@@ -80,14 +137,154 @@ class StopAfterPostId(StopCondition):
             post_id (str): The post ID after which to stop scraping.
         """
         self.post_id = post_id
+        self.found = False
 
-    def should_stop(self, post_list: List[Post]) -> bool:
+    def observe(self, item: Any) -> None:
+        if getattr(item, 'id', None) == self.post_id:
+            self.found = True
+
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
         """Check if the specified post ID is in the list of posts scraped.
 
         Args:
-            post_list (List[Post]): The list of posts scraped so far.
+            post_list (Optional[List[Post]]): The list of posts scraped so far. Defaults to the observed posts.
 
         Returns:
             bool: True if the post ID is found in the post list, False otherwise.
         """
-        return self.post_id in [p.id for p in post_list]
+        if post_list is not None:
+            return any(p.id == self.post_id for p in post_list)
+        return self.found
+
+    def reset(self) -> None:
+        self.found = False
+
+    def __repr__(self) -> str:
+        return f'StopAfterPostId(post_id={self.post_id!r})'
+
+
+class LegacyStopCondition(IncrementalStopCondition):
+    """Adapter running a list based :class:`StopCondition` on the items observed so far.
+
+    The items are kept for the condition, so crawls with legacy conditions
+    still hold everything they scraped in memory.
+    """
+
+    def __init__(self, condition: StopCondition):
+        """
+        Args:
+            condition (StopCondition): The condition to adapt.
+        """
+        self.condition = condition
+        self.items: List[Any] = []
+
+    def observe(self, item: Any) -> None:
+        self.items.append(item)
+
+    def should_stop(self, post_list: Optional[List[Post]] = None) -> bool:
+        return self.condition.should_stop(post_list if post_list is not None else self.items)
+
+    def reset(self) -> None:
+        self.items = []
+
+    def __repr__(self) -> str:
+        return type(self.condition).__name__
+
+
+def as_incremental(condition: StopCondition) -> IncrementalStopCondition:
+    """A fresh incremental copy of ``condition``, adapting legacy conditions."""
+    if isinstance(condition, IncrementalStopCondition):
+        return condition.fresh()
+    return LegacyStopCondition(condition)
+
+
+def _parameters(condition: IncrementalStopCondition) -> str:
+    # Conditions show their parameters, not their counters, in their repr. The default repr holds the object's
+    # address, which changes from one run to the next.
+    if type(condition).__repr__ is object.__repr__:
+        return f'{type(condition).__module__}.{type(condition).__qualname__}'
+    return repr(condition)
+
+
+class StopConditionSet:
+    """The stop conditions of one crawl, fed every item the crawl yields.
+
+    Built at the start of a crawl from the configured conditions, so that
+    conditions shared between crawls (e.g. ``ScraperOptions.stop_conditions``)
+    keep no state from one crawl to the next. Every stop is recorded as a
+    :class:`StopReport` in ``reports`` and handed to ``on_stop``.
+
+    A streaming crawl must run in constant memory: legacy conditions, which
+    keep every item, are refused and only the latest reports are kept.
+    """
+
+    def __init__(self, conditions: Optional[Iterable[StopCondition]],
+                 on_stop: Optional[Callable[[StopReport], None]] = None, streaming: bool = False):
+        self.conditions: List[IncrementalStopCondition] = [as_incremental(c) for c in conditions or []]
+        if streaming and self.keeps_items:
+            raise ValueError("Streaming crawls need incremental stop conditions, legacy ones keep every item")
+        self.reports: List[StopReport] = []
+        self.stopped = False
+        self._max_reports = STREAMING_MAX_STOP_REPORTS if streaming else None
+        self._on_stop = on_stop
+
+    def observe(self, item: Any) -> None:
+        for condition in self.conditions:
+            condition.observe(item)
+
+    def restore(self, conditions: List[IncrementalStopCondition]) -> bool:
+        """Carry on with ``conditions`` saved by an earlier run, if they are of the same types as ours."""
+        if [type(c) for c in conditions] != [type(c) for c in self.conditions]:
+            return False
+        self.conditions = list(conditions)
+        return True
+
+    def digest(self) -> str:
+        """A digest of the parameters of the conditions, telling apart crawls configured to stop differently."""
+        parameters = '\n'.join(_parameters(condition) for condition in self.conditions)
+        return hashlib.sha256(parameters.encode()).hexdigest()[:16]
+
+    def should_stop(self) -> bool:
+        return self.stopping_condition() is not None
+
+    def stopping_condition(self) -> Optional[IncrementalStopCondition]:
+        """The first condition telling the crawl to stop, if any."""
+        for condition in self.conditions:
+            if condition.should_stop():
+                return condition
+        return None
+
+    def check(self, saved_requests: int) -> bool:
+        """Whether to stop now, reporting the stop as saving ``saved_requests``."""
+        condition = self.stopping_condition()
+        if condition is None:
+            return False
+        self.report(condition, saved_requests)
+        return True
+
+    def check_comments(self, comments: List[Comment]) -> bool:
+        """Whether to stop paginating the comments of the next item, given its ``comments`` so far."""
+        for condition in self.conditions:
+            if condition.should_stop_comments(comments):
+                self.report(condition, 1, COMMENTS_SCOPE)
+                return True
+        return False
+
+    def report(self, condition: IncrementalStopCondition, saved_requests: int,
+               scope: str = CRAWL_SCOPE) -> StopReport:
+        return self.record(StopReport(reason=repr(condition), saved_requests=saved_requests, scope=scope))
+
+    def record(self, report: StopReport) -> StopReport:
+        """Record a stop decided outside the conditions, e.g. by the crawl reaching known content."""
+        self.stopped = self.stopped or report.scope == CRAWL_SCOPE
+        self.reports.append(report)
+        if self._max_reports is not None and len(self.reports) > self._max_reports:
+            del self.reports[0]
+        if self._on_stop is not None:
+            self._on_stop(report)
+        return report
+
+    @property
+    def keeps_items(self) -> bool:
+        """Whether a legacy condition makes the crawl keep every item it scraped."""
+        return any(isinstance(condition, LegacyStopCondition) for condition in self.conditions)
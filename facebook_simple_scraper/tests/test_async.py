@@ -0,0 +1,95 @@
+import asyncio
+import json
+import unittest
+from typing import List
+
+from facebook_simple_scraper.details.repository import GraphqlCommentsRepository
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.repository import build_default_marketplace_repository
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import PostSummaryListRepository, GetPostOptions
+from facebook_simple_scraper.requester.async_requester import ThreadedAsyncRequester
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_details import PAGE_1, EXPECTED_CURSOR_1
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+
+def _mock_requester(pages: List[str]) -> MockRequester:
+    req = MockRequester()
+    req.clear()
+    for page in pages:
+        req.add_expected_response(r_text=page)
+    return req
+
+
+def _marketplace_html(listing_id: str, cursor: str) -> str:
+    payload = {
+        "__typename": "MarketplaceListing",
+        "id": listing_id,
+        "marketplace_listing_title": f"Car {listing_id}",
+        "page_info": {"end_cursor": cursor},
+    }
+    return f'<html><script>require("x").handle({json.dumps(payload)});</script></html>'
+
+
+class TestAsyncRequester(unittest.TestCase):
+
+    def test_delegates_to_sync_requester(self):
+        req = _mock_requester(["hello"])
+        req.save_session_variables({"target": "1"})
+        async_req = ThreadedAsyncRequester(req)
+        resp = asyncio.run(async_req.request("GET", "https://example.com"))
+        self.assertEqual(resp.text, "hello")
+        self.assertEqual(async_req.load_session_variables(), {"target": "1"})
+        self.assertEqual(async_req.get_latest_request().url, "https://example.com")
+
+
+class TestAsyncPostRepository(unittest.TestCase):
+
+    def _repo(self) -> PostSummaryListRepository:
+        req = _mock_requester([read_test_file(POST_TEST_FIRST_FILE_HTML), read_test_file(POST_TEST_SECOND_FILE_HTML)])
+        return PostSummaryListRepository(GetPostOptions(
+            requester=req,
+            parser=PostSummaryListExtractor(),
+            sleep_time_min=0,
+            sleep_time_max=0,
+        ))
+
+    def test_aget_posts_matches_get_posts(self):
+        expected = [p.id for p in self._repo().get_posts('username', [StopAfterNPosts(3)])]
+
+        async def collect() -> List[str]:
+            return [p.id async for p in self._repo().aget_posts('username', [StopAfterNPosts(3)])]
+
+        self.assertEqual(asyncio.run(collect()), expected)
+
+
+class TestAsyncCommentsRepository(unittest.TestCase):
+
+    def test_aget_details(self):
+        session = MockRequester()
+        session.save_session_variables({'fb_dtsg': 'dtsg', 'target': '1'})
+        gql = _mock_requester([read_test_file(PAGE_1)])
+        repo = GraphqlCommentsRepository(session, await_time=0, gql_requester=gql)
+        detail = asyncio.run(repo.aget_details('123', max_comments=1))
+        self.assertEqual(detail.next_cursor, EXPECTED_CURSOR_1)
+        self.assertGreater(len(detail.comments), 0)
+        self.assertEqual(gql.get_latest_request().method, 'POST')
+
+
+class TestAsyncMarketplaceRepository(unittest.TestCase):
+
+    def test_asearch_paginates(self):
+        req = _mock_requester([_marketplace_html("1", "c1"), _marketplace_html("2", "")])
+        repo = build_default_marketplace_repository(req, sleep_time_min=0, sleep_time_max=0)
+
+        async def collect() -> List[str]:
+            return [listing.id async for listing in repo.asearch(MarketplaceVehicleFilters())]
+
+        self.assertEqual(asyncio.run(collect()), ["1", "2"])
+        self.assertIn("cursor=c1", req.get_latest_request().url)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import tempfile
+import unittest
+
+from facebook_simple_scraper.requester.cache import CachingRequester, ResponseCache, CachePolicy, normalize_url
+from facebook_simple_scraper.tests.utils import MockRequester
+
+ITEM_URL = 'https://www.facebook.com/marketplace/item/123/'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _mock_requester(*bodies: str, status: int = 200) -> MockRequester:
+    req = MockRequester()
+    req.clear()
+    req.save_session_variables({'username': 'user_a'})
+    for body in bodies:
+        req.add_expected_response(r_text=body, status=status)
+    return req
+
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_sorts_query_and_lowercases_host(self):
+        self.assertEqual(
+            normalize_url('HTTPS://WWW.Facebook.com/x?b=2&a=1#frag'),
+            'https://www.facebook.com/x?a=1&b=2',
+        )
+
+
+class TestCachingRequester(unittest.TestCase):
+
+    def test_repeated_get_is_served_from_cache(self):
+        req = _mock_requester('first', 'second')
+        caching = CachingRequester(req, ResponseCache())
+        self.assertEqual(caching.request('GET', ITEM_URL).text, 'first')
+        self.assertEqual(caching.request('GET', ITEM_URL).text, 'first')
+        self.assertEqual(len(req.last_request_history), 1)
+        self.assertEqual(caching.cache.hits, 1)
+
+    def test_uncached_urls_pass_through(self):
+        req = _mock_requester('first', 'second')
+        caching = CachingRequester(req, ResponseCache())
+        caching.request('GET', 'https://www.facebook.com/other')
+        self.assertEqual(caching.request('GET', 'https://www.facebook.com/other').text, 'second')
+
+    def test_errors_are_not_cached(self):
+        req = _mock_requester('boom', status=500)
+        req.add_expected_response(r_text='ok')
+        caching = CachingRequester(req, ResponseCache())
+        self.assertEqual(caching.request('GET', ITEM_URL).status_code, 500)
+        self.assertEqual(caching.request('GET', ITEM_URL).text, 'ok')
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        req = _mock_requester('first', 'second')
+        caching = CachingRequester(req, ResponseCache(clock=clock), policies=[CachePolicy(r'/item/', ttl=10)])
+        caching.request('GET', ITEM_URL)
+        clock.now += 11
+        self.assertEqual(caching.request('GET', ITEM_URL).text, 'second')
+
+    def test_credentials_do_not_share_entries(self):
+        cache = ResponseCache()
+        CachingRequester(_mock_requester('a'), cache, credential='a').request('GET', ITEM_URL)
+        resp = CachingRequester(_mock_requester('b'), cache, credential='b').request('GET', ITEM_URL)
+        self.assertEqual(resp.text, 'b')
+
+    def test_post_is_keyed_by_body(self):
+        req = _mock_requester('one', 'two')
+        caching = CachingRequester(req, ResponseCache())
+        url = 'https://web.facebook.com/api/graphql/'
+        self.assertEqual(caching.request('POST', url, data={'doc_id': 1}).text, 'one')
+        self.assertEqual(caching.request('POST', url, data={'doc_id': 2}).text, 'two')
+        self.assertEqual(caching.request('POST', url, data={'doc_id': 1}).text, 'one')
+
+
+class TestResponseCacheEviction(unittest.TestCase):
+
+    def _fill(self, cache: ResponseCache, n: int, body: str = 'x') -> CachingRequester:
+        req = _mock_requester(*[body] * n)
+        caching = CachingRequester(req, cache)
+        for i in range(n):
+            caching.request('GET', f'https://www.facebook.com/marketplace/item/{i}/')
+        return caching
+
+    def test_evicts_by_entry_count(self):
+        cache = ResponseCache(max_entries=2)
+        self._fill(cache, 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_evicts_by_byte_size(self):
+        cache = ResponseCache(max_bytes=25)
+        self._fill(cache, 3, body='0123456789')
+        self.assertEqual(len(cache), 2)
+
+    def test_disk_tier_survives_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._fill(ResponseCache(directory=tmp), 1, body='persisted')
+            caching = CachingRequester(_mock_requester('fresh'), ResponseCache(directory=tmp))
+            self.assertEqual(caching.request('GET', 'https://www.facebook.com/marketplace/item/0/').text, 'persisted')
+
+    def test_disk_tier_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(directory=tmp, max_disk_entries=2)
+            self._fill(cache, 4)
+            self.assertEqual(len(ResponseCache(directory=tmp)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
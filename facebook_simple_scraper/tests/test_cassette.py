@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from typing import List
+
+from facebook_simple_scraper.details.repository import GraphqlCommentsRepository
+from facebook_simple_scraper.entities import ScraperOptions, LoginCredentials, Post
+from facebook_simple_scraper.error_dict import CassetteMissError
+from facebook_simple_scraper.login.login import MobileBasicLoginRepository
+from facebook_simple_scraper.login.params import MbasicLoginParamsRepository
+from facebook_simple_scraper.login.session_storage import LocalFileSessionStorage
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import PostSummaryListRepository, GetPostOptions
+from facebook_simple_scraper.requester.cassette import Cassette, CassetteMode, RecordingRequester, ReplayRequester, \
+    load_cassette
+from facebook_simple_scraper.scraper import Scraper
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_details import PAGE_1
+from facebook_simple_scraper.tests.test_login import SUCCESS_LOGIN_PAGE_TEST_FILE
+from facebook_simple_scraper.tests.test_login_params import LOGIN_PARAM_TEST_FILE
+from facebook_simple_scraper.tests.test_login_user_info import LOGIN_SUCCESS_COMPLETE
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+
+def _record_run(cassette: Cassette, session_dir: str) -> List[Post]:
+    """Log in and crawl one timeline page against mocks, recording every interaction."""
+    mock = MockRequester()
+    mock.clear()
+    for path in [LOGIN_PARAM_TEST_FILE, SUCCESS_LOGIN_PAGE_TEST_FILE, LOGIN_SUCCESS_COMPLETE, POST_TEST_FIRST_FILE_HTML]:
+        mock.add_expected_response(r_text=read_test_file(path))
+    gql_mock = MockRequester()
+    gql_mock.clear()
+    for _ in range(10):
+        gql_mock.add_expected_response(r_text=read_test_file(PAGE_1))
+
+    req = RecordingRequester(mock, cassette)
+    login_repo = MobileBasicLoginRepository(
+        MbasicLoginParamsRepository(req),
+        session_storage=LocalFileSessionStorage(session_dir),
+        requester=req,
+    )
+    login_repo.login('user', 'password')
+    comments = GraphqlCommentsRepository(req, await_time=0, gql_requester=RecordingRequester(gql_mock, cassette))
+    repo = PostSummaryListRepository(GetPostOptions(
+        requester=req,
+        parser=PostSummaryListExtractor(),
+        sleep_time_min=0,
+        sleep_time_max=0,
+        max_comments=1,
+        comments_repository=comments,
+    ))
+    return list(repo.get_posts('account', [StopAfterNPosts(1)]))
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'run.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_record_then_replay_whole_scraper_run(self):
+        recorded = _record_run(Cassette(self.path, CassetteMode.RECORD), os.path.join(self.tmp.name, 'rec'))
+        self.assertGreater(len(load_cassette(self.path)), 4)
+
+        opts = ScraperOptions(
+            credentials=[LoginCredentials(username='user', password='password')],
+            stop_conditions=[StopAfterNPosts(1)],
+            max_comments_per_post=1,
+            session_storage=LocalFileSessionStorage(os.path.join(self.tmp.name, 'replay')),
+            cassette=Cassette(self.path, CassetteMode.REPLAY),
+        )
+        replayed = list(Scraper(opts).get_posts('account'))
+        self.assertEqual([p.id for p in replayed], [p.id for p in recorded])
+        self.assertEqual([len(p.comments) for p in replayed], [len(p.comments) for p in recorded])
+
+    def test_replay_serves_in_order_and_repeats_last(self):
+        cassette = Cassette(self.path, CassetteMode.RECORD)
+        mock = MockRequester()
+        mock.clear()
+        mock.add_expected_response(r_text='one')
+        mock.add_expected_response(r_text='two')
+        recorder = RecordingRequester(mock, cassette)
+        recorder.request('GET', 'https://example.com/?b=1&a=2')
+        recorder.request('GET', 'https://example.com/?b=1&a=2')
+
+        replay = ReplayRequester.from_file(self.path)
+        self.assertEqual(replay.request('GET', 'https://example.com/?a=2&b=1').text, 'one')
+        self.assertEqual(replay.request('GET', 'https://example.com/?a=2&b=1').text, 'two')
+        self.assertEqual(replay.request('GET', 'https://example.com/?a=2&b=1').text, 'two')
+        with self.assertRaises(CassetteMissError):
+            replay.request('GET', 'https://example.com/unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
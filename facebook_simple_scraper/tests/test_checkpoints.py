@@ -0,0 +1,125 @@
+import itertools
+import os
+import tempfile
+import unittest
+from typing import Callable, List
+
+from facebook_simple_scraper.checkpoints import CheckpointStore, CrawlCheckpoint, FileCheckpointStore, \
+    SqliteCheckpointStore
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts, StopConditionSet
+from facebook_simple_scraper.tests.test_pipeline import UrlRequester, _listings_page
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_LAST_FILE_HTML, \
+    POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+PAGES = [POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML, POST_TEST_LAST_FILE_HTML]
+
+
+class TestCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sqlite_store = SqliteCheckpointStore(os.path.join(directory.name, 'checkpoints.db'))
+        self.addCleanup(sqlite_store.close)
+        self.stores: List[Callable[[], CheckpointStore]] = [
+            lambda: FileCheckpointStore(os.path.join(directory.name, 'files')),
+            lambda: sqlite_store,
+        ]
+        self.page_ids = [[p.id for p in PostSummaryListExtractor().extract_posts(read_test_file(page)).posts]
+                         for page in PAGES]
+
+    @staticmethod
+    def _post_repo(store: CheckpointStore, pages: List[str]) -> PostSummaryListRepository:
+        req = MockRequester()
+        req.clear()
+        for page in pages:
+            req.add_expected_response(r_text=read_test_file(page))
+        return PostSummaryListRepository(GetPostOptions(
+            requester=req, parser=PostSummaryListExtractor(), sleep_time_min=0, sleep_time_max=0,
+            checkpoint_store=store))
+
+    def test_stores_replace_and_delete(self):
+        for make_store in self.stores:
+            store = make_store()
+            with self.subTest(store=type(store).__name__):
+                self.assertIsNone(store.load('k'))
+                store.save('k', CrawlCheckpoint(cursor='a'))
+                store.save('k', CrawlCheckpoint(cursor='b', profile_id='1'))
+                self.assertEqual((store.load('k').cursor, store.load('k').profile_id), ('b', '1'))
+                store.delete('k')
+                self.assertIsNone(store.load('k'))
+
+    def test_timeline_resumes_after_the_last_complete_page(self):
+        first_page = len(self.page_ids[0])
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                # The first run dies while on the second page
+                repo = self._post_repo(make_store(), PAGES)
+                posts = repo.get_posts('username', [StopAfterNPosts(first_page + 2)])
+                consumed = [p.id for p in itertools.islice(posts, first_page + 1)]
+                posts.close()
+                self.assertEqual(consumed, self.page_ids[0] + self.page_ids[1][:1])
+
+                # A new process carries on from the second page, with its counters
+                store = make_store()
+                repo = self._post_repo(store, PAGES[1:])
+                resumed = [p.id for p in repo.get_posts('username', [StopAfterNPosts(first_page + 2)])]
+                self.assertEqual(resumed, self.page_ids[1][:2])
+                self.assertIn('cursor=', repo._requester.last_request_history[0].url)
+                # The crawl is over, so the next one starts from scratch
+                key = repo._checkpoint_key('username', StopConditionSet([StopAfterNPosts(first_page + 2)]))
+                self.assertIsNone(store.load(key))
+
+    def test_timeline_with_other_stop_conditions_starts_over(self):
+        first_page = len(self.page_ids[0])
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                repo = self._post_repo(make_store(), PAGES)
+                posts = repo.get_posts('username', [StopAfterNPosts(first_page + 2)])
+                list(itertools.islice(posts, first_page + 1))
+                posts.close()
+
+                repo = self._post_repo(make_store(), PAGES)
+                restarted = [p.id for p in repo.get_posts('username', [StopAfterNPosts(3)])]
+                self.assertEqual(restarted, self.page_ids[0][:3])
+                self.assertNotIn('cursor=', repo._requester.last_request_history[0].url)
+
+    def test_marketplace_resumes_with_its_dedupe_state(self):
+        filters = MarketplaceVehicleFilters(location='santiago')
+        build_url = MarketplaceVehicleRepository._build_url
+        pages = {
+            build_url(filters): _listings_page(['1', '2'], 'C1'),
+            build_url(filters, cursor='C1'): _listings_page(['2', '3'], 'C2'),
+            build_url(filters, cursor='C2'): _listings_page(['3', '4'], None),
+        }
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                def search():
+                    req = UrlRequester(pages)
+                    repo = MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+                        requester=req, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0,
+                        checkpoint_store=make_store()))
+                    return req, repo.search(filters)
+
+                _, listings = search()
+                consumed = [listing.id for listing in itertools.islice(listings, 3)]
+                listings.close()
+                self.assertCountEqual(consumed, ['1', '2', '3'])
+
+                req, listings = search()
+                # '2' was yielded by the first page, so it is not yielded again
+                self.assertEqual(sorted(listing.id for listing in listings), ['3', '4'])
+                self.assertEqual(req.urls, [build_url(filters, cursor='C1'), build_url(filters, cursor='C2')])
+                self.assertIsNone(make_store().load(
+                    MarketplaceVehicleRepository._checkpoint_key(filters, StopConditionSet(None))))
+
+
+if __name__ == '__main__':
+    unittest.main()
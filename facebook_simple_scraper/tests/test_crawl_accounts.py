@@ -0,0 +1,133 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from facebook_simple_scraper.entities import ScraperOptions, LoginCredentials, Post, StopCondition
+from facebook_simple_scraper.error_dict import NoCredentialAvailableError
+from facebook_simple_scraper.login.domain import LoginResponse
+from facebook_simple_scraper.scraper import Scraper
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.utils import MockRequester
+
+
+def _post(account_id: str, n: int) -> Post:
+    return Post(id=f'{account_id}-{n}', url='', text='', date=datetime(2024, 1, 1), image_url='', video_url='',
+                like_count=0, comment_count=0)
+
+
+class FakeLoginRepository:
+    def __init__(self, deps: 'FakeDepsBuilder'):
+        self.deps = deps
+
+    def login(self, username: str, password: str) -> LoginResponse:
+        with self.deps.lock:
+            self.deps.logins.append(username)
+        req = MockRequester()
+        req.session_variables = {'username': username}
+        return LoginResponse(was_logged=True, save_device=False, requester=req)
+
+
+class FakePostRepository:
+    def __init__(self, deps: 'FakeDepsBuilder', req: Optional[MockRequester]):
+        self.deps = deps
+        self.req = req
+
+    def get_posts(self, account_id: str, stop_conditions: List[StopCondition]):
+        username = self.req.session_variables['username']
+        with self.deps.lock:
+            self.deps.active += 1
+            self.deps.max_active = max(self.deps.max_active, self.deps.active)
+            self.deps.in_use[username] = self.deps.in_use.get(username, 0) + 1
+            self.deps.max_in_use = max(self.deps.max_in_use, self.deps.in_use[username])
+        try:
+            posts: List[Post] = []
+            for n in range(100):
+                time.sleep(0.01)
+                if account_id == 'broken' and n == 1:
+                    raise RuntimeError('boom')
+                posts.append(_post(account_id, n))
+                yield posts[-1]
+                if any(c.should_stop(posts) for c in stop_conditions):
+                    return
+        finally:
+            with self.deps.lock:
+                self.deps.active -= 1
+                self.deps.in_use[username] -= 1
+
+
+class FakeDepsBuilder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logins: List[str] = []
+        self.active = 0
+        self.max_active = 0
+        self.in_use: Dict[str, int] = {}
+        self.max_in_use = 0
+
+    def build_deps(self, opts: ScraperOptions, req: Optional[MockRequester] = None):
+        return FakeLoginRepository(self), FakePostRepository(self, req), None
+
+
+class TestCrawlAccounts(unittest.TestCase):
+
+    def _scraper(self, n_credentials: int, **kwargs) -> Tuple[Scraper, FakeDepsBuilder]:
+        deps = FakeDepsBuilder()
+        opts = ScraperOptions(
+            credentials=[LoginCredentials(username=f'user{i}', password='pw') for i in range(n_credentials)],
+            stop_conditions=[StopAfterNPosts(3)],
+            **kwargs,
+        )
+        return Scraper(opts, deps_builder=deps), deps
+
+    def test_merged_tagged_stream_with_isolated_failures(self):
+        scraper, deps = self._scraper(n_credentials=2)
+        accounts = ['a', 'b', 'broken', 'c', 'd']
+        results = list(scraper.crawl_accounts(accounts, workers=4))
+
+        by_account: Dict[str, List[str]] = {}
+        for r in results:
+            if r.ok:
+                self.assertTrue(r.post.id.startswith(r.account_id))
+                by_account.setdefault(r.account_id, []).append(r.post.id)
+        for account in ['a', 'b', 'c', 'd']:
+            self.assertEqual(by_account[account], [f'{account}-0', f'{account}-1', f'{account}-2'])
+        errors = [r for r in results if not r.ok]
+        self.assertEqual([r.account_id for r in errors], ['broken'])
+        self.assertIsInstance(errors[0].error, RuntimeError)
+
+        # Each credential logs in once and is never used by two workers at once
+        self.assertEqual(sorted(deps.logins), ['user0', 'user1'])
+        self.assertEqual(deps.max_active, 2)
+        self.assertEqual(deps.max_in_use, 1)
+
+    def test_per_account_stop_conditions(self):
+        scraper, _ = self._scraper(n_credentials=2)
+        limits = {'a': 1, 'b': 4}
+        results = list(scraper.crawl_accounts(['a', 'b'], workers=2,
+                                              stop_conditions=lambda account: [StopAfterNPosts(limits[account])]))
+        self.assertEqual(len([r for r in results if r.account_id == 'a']), 1)
+        self.assertEqual(len([r for r in results if r.account_id == 'b']), 4)
+
+    def test_consumer_can_stop_early(self):
+        scraper, deps = self._scraper(n_credentials=1)
+        stream = scraper.crawl_accounts(['a', 'b', 'c'], workers=1,
+                                        stop_conditions=lambda account: [StopAfterNPosts(50)])
+        first = next(iter(stream))
+        stream.close()
+        self.assertTrue(first.ok)
+        time.sleep(0.1)
+        self.assertEqual(deps.active, 0)
+
+    def test_waiting_for_a_credential_is_bounded(self):
+        scraper, _ = self._scraper(n_credentials=1, credential_lease_timeout=0.05)
+        lease = scraper.credential_pool.lease()
+        self.addCleanup(lease.release)
+        results = list(scraper.crawl_accounts(['a'], workers=1))
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0].error, NoCredentialAvailableError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import threading
+import unittest
+
+from facebook_simple_scraper.credential_pool import CredentialPool, CredentialOutcome, CredentialHealthRequester
+from facebook_simple_scraper.credentials_ring import CredentialsRingBuffer
+from facebook_simple_scraper.entities import LoginCredentials
+from facebook_simple_scraper.error_dict import NoCredentialAvailableError
+from facebook_simple_scraper.tests.utils import MockRequester
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _credentials(n: int):
+    return [LoginCredentials(username=f'user{i}', password='pw') for i in range(n)]
+
+
+class TestCredentialPool(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = CredentialPool(_credentials(3), min_samples=4, min_score=0.5, cooldown=100, clock=self.clock)
+
+    def _tick(self):
+        self.clock.now += 1
+
+    def test_leases_are_exclusive_and_least_recently_used_first(self):
+        leases = []
+        for _ in range(3):
+            leases.append(self.pool.lease())
+            self._tick()
+        self.assertEqual([lease.username for lease in leases], ['user0', 'user1', 'user2'])
+        with self.assertRaises(NoCredentialAvailableError):
+            self.pool.lease(timeout=0)
+
+        leases[1].release()
+        self._tick()
+        leases[0].release()
+        self._tick()
+        self.assertEqual(self.pool.lease().username, 'user1')
+        self.assertEqual(self.pool.lease().username, 'user0')
+
+    def test_session_is_reused_by_next_lease(self):
+        with self.pool.lease() as lease:
+            lease.requester = MockRequester()
+        self._tick()
+        leases = [self.pool.lease() for _ in range(3)]
+        self.assertIsNotNone([lease for lease in leases if lease.username == 'user0'][0].requester)
+
+    def test_checkpoint_cools_down_credential(self):
+        with self.pool.lease() as lease:
+            lease.requester = MockRequester()
+            lease.record(CredentialOutcome.CHECKPOINT)
+        health = self.pool.health('user0')
+        self.assertEqual(health.checkpoints, 1)
+        self.assertEqual(health.cooldown_remaining, 100)
+        self.assertEqual({self.pool.lease().username for _ in range(2)}, {'user1', 'user2'})
+        with self.assertRaises(NoCredentialAvailableError):
+            self.pool.lease(timeout=0)
+
+        self.clock.now += 100
+        lease = self.pool.lease()
+        self.assertEqual(lease.username, 'user0')
+        # The session that hit the checkpoint is dropped
+        self.assertIsNone(lease.requester)
+
+    def test_low_score_cools_down_with_growing_duration(self):
+        for outcome in [CredentialOutcome.SUCCESS, CredentialOutcome.ERROR, CredentialOutcome.ERROR]:
+            self.pool.record('user0', outcome)
+        self.assertEqual(self.pool.health('user0').cooldown_remaining, 0)
+        self.pool.record('user0', CredentialOutcome.ERROR)
+        self.assertEqual(self.pool.health('user0').cooldown_remaining, 100)
+        self.clock.now += 100
+        for _ in range(4):
+            self.pool.record('user0', CredentialOutcome.ERROR)
+        self.assertEqual(self.pool.health('user0').cooldown_remaining, 200)
+
+    def test_blocked_lease_wakes_up_on_release(self):
+        pool = CredentialPool(_credentials(1))
+        lease = pool.lease()
+        leased = []
+        waiter = threading.Thread(target=lambda: leased.append(pool.lease(timeout=5)))
+        waiter.start()
+        lease.release()
+        waiter.join(5)
+        self.assertEqual(leased[0].username, 'user0')
+
+
+class TestCredentialsRingBuffer(unittest.TestCase):
+
+    def test_deprecated_round_robin_over_the_pool(self):
+        with self.assertWarns(DeprecationWarning):
+            ring = CredentialsRingBuffer(_credentials(2))
+        ring.append(LoginCredentials(username='user2', password='pw'))
+        usernames = [next(ring.next()).username for _ in range(3)]
+        self.assertEqual(sorted(usernames), ['user0', 'user1', 'user2'])
+
+        for _ in range(3):
+            ring.pool.lease()
+        with self.assertRaises(NoCredentialAvailableError):
+            next(ring.next())
+
+
+class TestCredentialHealthRequester(unittest.TestCase):
+    def test_responses_are_scored(self):
+        pool = CredentialPool(_credentials(1), min_samples=100)
+        req = MockRequester()
+        req.clear()
+        req.add_expected_response(r_text='ok')
+        req.add_expected_response(status=500)
+        health_req = CredentialHealthRequester(req, pool, 'user0')
+        health_req.request('GET', 'https://mbasic.facebook.com/nintendo?v=timeline')
+        health_req.request('GET', 'https://mbasic.facebook.com/nintendo?v=timeline')
+        health = pool.health('user0')
+        self.assertEqual((health.requests, health.errors), (2, 1))
+        self.assertAlmostEqual(health.score, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from facebook_simple_scraper.posts.date_parser import PostDateParser
+
+REFERENCE = datetime(2024, 5, 20, 15, 30)  # a Monday
+
+
+class TestPostDateParser(unittest.TestCase):
+
+    def setUp(self):
+        self.fallback = mock.Mock(return_value=datetime(2000, 1, 1))
+        self.parser = PostDateParser(fallback=self.fallback)
+
+    def _parse(self, text: str) -> datetime:
+        return self.parser.parse(text, REFERENCE)
+
+    def test_absolute_dates(self):
+        cases = {
+            'May 2 at 1:27 PM': datetime(2024, 5, 2, 13, 27),
+            'September 14, 2015 at 11:04 PM': datetime(2015, 9, 14, 23, 4),
+            'January 31 at 12:34 AM': datetime(2024, 1, 31, 0, 34),
+            'Dec 3 at 12:05 PM': datetime(2024, 12, 3, 12, 5),
+            'Sept 3': datetime(2024, 9, 3),
+            'May 2, 2023': datetime(2023, 5, 2),
+            'February 29 at 8:00 AM': datetime(2024, 2, 29, 8, 0),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self._parse(text), expected)
+        self.fallback.assert_not_called()
+
+    def test_relative_dates(self):
+        cases = {
+            'Just now': REFERENCE,
+            '3 hrs': datetime(2024, 5, 20, 12, 30),
+            '1 hour ago': datetime(2024, 5, 20, 14, 30),
+            '29 mins': datetime(2024, 5, 20, 15, 1),
+            'a minute ago': datetime(2024, 5, 20, 15, 29),
+            '2 d': datetime(2024, 5, 18, 15, 30),
+            'Yesterday': datetime(2024, 5, 19, 15, 30),
+            'Yesterday at 3:04 PM': datetime(2024, 5, 19, 15, 4),
+            'Today at 9:00 AM': datetime(2024, 5, 20, 9, 0),
+            'Saturday at 5:00 PM': datetime(2024, 5, 18, 17, 0),
+            'Monday at 5:00 PM': datetime(2024, 5, 20, 17, 0),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self._parse(text), expected)
+        self.fallback.assert_not_called()
+
+    def test_unknown_formats_fall_back(self):
+        for text in ['February 29, 2023 at 1:00 PM', '1 yr', 'May 15 at 8:01\\xe2\\x80\\xafPM', 'Someday', '']:
+            with self.subTest(text=text):
+                self.assertEqual(self._parse(text), datetime(2000, 1, 1))
+        self.assertEqual(self.fallback.call_count, 5)
+
+    def test_memo_is_keyed_on_text_and_reference(self):
+        self._parse('3 hrs')
+        self._parse('3 hrs')
+        self._parse('Someday')
+        self._parse('Someday')
+        self.assertEqual(self.parser.parse('3 hrs', datetime(2024, 5, 21, 15, 30)), datetime(2024, 5, 21, 12, 30))
+        stats = self.parser.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.fallbacks, stats.size), (2, 3, 1, 3))
+        self.assertAlmostEqual(stats.hit_rate, 2 / 5)
+        self.assertAlmostEqual(stats.fallback_rate, 1 / 3)
+        self.assertEqual(self.fallback.call_count, 1)
+        self.parser.clear()
+        self.assertEqual(self.parser.stats().size, 0)
+
+    def test_default_reference_is_now_to_the_minute(self):
+        parsed = PostDateParser().parse('Just now')
+        self.assertEqual((parsed.second, parsed.microsecond), (0, 0))
+        self.assertLess(abs((datetime.now() - parsed).total_seconds()), 61)
+
+    def test_default_fallback_uses_dateparser(self):
+        self.assertEqual(PostDateParser().parse('2024-05-02 13:27', REFERENCE), datetime(2024, 5, 2, 13, 27))
+        self.assertIn('dateparser', sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import unittest
+
+from facebook_simple_scraper.details.extractor import GQLPostDetailExtractor, PostDetails
+from facebook_simple_scraper.details.repository import GraphqlCommentsRepository
+from facebook_simple_scraper.details.gql_stream import DeferredPayloadMerger, GraphQLChunkDecoder, \
+    iter_graphql_documents, merge_graphql_documents
+from facebook_simple_scraper.tests.test_details import PAGE_1
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+
+def _chunks(data, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestGraphQLChunkDecoder(unittest.TestCase):
+
+    def test_documents_are_the_same_whatever_the_chunking(self):
+        content = read_test_file(PAGE_1)
+        expected = list(iter_graphql_documents([content]))
+        self.assertEqual(len(expected), 2)
+        for size in (1, 7, 4096, len(content)):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_graphql_documents(_chunks(content.encode('utf-8'), size))), expected)
+
+    def test_documents_are_decoded_as_their_line_arrives(self):
+        decoder = GraphQLChunkDecoder()
+        self.assertEqual(decoder.feed('{"data": {"a"'), [])
+        self.assertEqual(decoder.feed(': 1}}\r\n{"path": [], '), [{"data": {"a": 1}}])
+        self.assertEqual(decoder.feed('"data": {"b": 2}}'), [])
+        self.assertEqual(decoder.close(), [{"path": [], "data": {"b": 2}}])
+
+    def test_multibyte_characters_split_across_chunks(self):
+        data = json.dumps({"data": {"text": "canción 👍"}}, ensure_ascii=False).encode('utf-8')
+        self.assertEqual(list(iter_graphql_documents(_chunks(data, 1))), [{"data": {"text": "canción 👍"}}])
+
+    def test_guard_prefix_and_broken_documents_are_skipped(self):
+        content = 'for (;;);{"data": {"a": 1}}\n{"data": {"broken": }\n{"path": ["a"], "data": {}}\n'
+        documents = list(iter_graphql_documents([content]))
+        self.assertEqual(documents, [{"data": {"a": 1}}, {"path": ["a"], "data": {}}])
+
+
+class TestDeferredPayloadMerger(unittest.TestCase):
+
+    def test_deferred_data_is_merged_at_its_path(self):
+        document = merge_graphql_documents([
+            {"data": {"node": {"edges": [{"id": 1}, {"id": 2, "media": {"x": 1}}]}}},
+            {"label": "L", "path": ["node", "edges", 1, "media"], "data": {"y": 2}},
+            {"data": {"ignored": True}},
+        ])
+        self.assertEqual(document, {"data": {"node": {"edges": [{"id": 1}, {"id": 2, "media": {"x": 1, "y": 2}}]}}})
+
+    def test_streamed_items_are_inserted(self):
+        merger = DeferredPayloadMerger()
+        merger.add({"data": {"comments": {"edges": [{"id": 1}]}}})
+        merger.add({"path": ["comments", "edges", 1], "items": [{"id": 2}, {"id": 3}]})
+        self.assertEqual(merger.document["data"]["comments"]["edges"], [{"id": 1}, {"id": 2}, {"id": 3}])
+
+    def test_payloads_wait_for_their_path(self):
+        merger = DeferredPayloadMerger()
+        merger.add({"path": ["a", "b"], "data": {"c": 1}})
+        merger.add({"data": {}})
+        merger.add({"path": [], "data": {"a": {"b": {}}}})
+        self.assertEqual(merger.document, {"data": {"a": {"b": {"c": 1}}}})
+
+    def test_extractor_merges_the_deferred_fixture_payload(self):
+        content = read_test_file(PAGE_1)
+        document = merge_graphql_documents(iter_graphql_documents([content]))
+        media = document['data']['node']['comment_rendering_instance_for_feed_location']['comments']['edges'][1][
+            'node']['attachments'][0]['style_type_renderer']['attachment']['media']
+        self.assertIn('instream_video_ad_breaks_comet', media)
+
+        extractor = GQLPostDetailExtractor()
+        expected = extractor.extract(content)
+        detail = extractor.extract_chunks(_chunks(content.encode('utf-8'), 1024))
+        self.assertEqual(detail, expected)
+        self.assertGreater(len(detail.comments), 0)
+
+    def test_no_document(self):
+        self.assertIsNone(GQLPostDetailExtractor().extract_chunks([b'', b'not json']))
+
+
+class TestGraphqlCommentsRepository(unittest.TestCase):
+
+    def _repository(self, *bodies: str) -> GraphqlCommentsRepository:
+        req = MockRequester()
+        req.clear()
+        req.session_variables = {'fb_dtsg': 'token', 'target': '1'}
+        for body in bodies:
+            req.add_expected_response(r_text=body)
+        return GraphqlCommentsRepository(req, await_time=0, gql_requester=req)
+
+    def test_response_without_comment_payload(self):
+        for body in ['', 'for (;;);', '{"errors": [{"message": "Rate limited"}]}']:
+            with self.subTest(body=body):
+                self.assertEqual(self._repository(body).get_details('123', 10), PostDetails.empty())
+
+    def test_later_page_without_payload_keeps_the_previous_one(self):
+        content = read_test_file(PAGE_1)
+        expected = GQLPostDetailExtractor().extract(content)
+        self.assertTrue(expected.next_cursor)
+        self.assertEqual(self._repository(content, '').get_details('123', 1000), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
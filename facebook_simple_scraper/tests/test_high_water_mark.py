@@ -0,0 +1,190 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from facebook_simple_scraper.entities import Post, PostList
+from facebook_simple_scraper.posts.high_water_mark import FileHighWaterMarkStore, HighWaterMark, \
+    HighWaterMarkStore, SeenRange, SqliteHighWaterMarkStore, TimelinePosition
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryHTMLParser, PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_LAST_FILE_HTML, \
+    POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.test_pipeline import UrlRequester
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+PAGES = [POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML, POST_TEST_LAST_FILE_HTML]
+START = datetime(2024, 5, 2, 13, 27)
+
+
+def _post(post_id: str, date: datetime) -> Post:
+    return Post(id=post_id, url='', text='', date=date, image_url='', video_url='', like_count=0,
+                comment_count=0)
+
+
+def _position(post_id: str, date: datetime = START) -> TimelinePosition:
+    return TimelinePosition(post_id=post_id, date=date)
+
+
+class JsonTimelineParser(PostSummaryHTMLParser):
+    """Reads the pages made by ``_timeline``."""
+
+    def extract_posts(self, html_content: str) -> PostList:
+        page = json.loads(html_content)
+        return PostList(posts=[_post(i, datetime.fromisoformat(d)) for i, d in page['posts']],
+                        cursor=page['cursor'], profile_id='p')
+
+
+def _timeline(pages: List[List[Tuple[str, datetime]]]) -> Dict[str, str]:
+    """The URLs of a timeline made of ``pages`` of (post id, date), newest first."""
+    urls = [PostSummaryListRepository._first_page_url('username')]
+    urls += [PostSummaryListRepository._next_page_url(f'C{i}', 'p') for i in range(1, len(pages))]
+    return {url: json.dumps({'posts': [(i, d.isoformat()) for i, d in page],
+                             'cursor': f'C{n + 1}' if n + 1 < len(pages) else ''})
+            for n, (url, page) in enumerate(zip(urls, pages))}
+
+
+def _minute(i: int) -> TimelinePosition:
+    return _position(str(i), START + timedelta(minutes=i))
+
+
+def _minutes(*ids: int) -> List[Tuple[str, datetime]]:
+    """Posts published one minute apart, post ``i`` at minute ``i``."""
+    return [(str(i), START + timedelta(minutes=i)) for i in ids]
+
+
+class TestHighWaterMark(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sqlite_store = SqliteHighWaterMarkStore(os.path.join(directory.name, 'marks.db'))
+        self.addCleanup(sqlite_store.close)
+        self.stores: List[Callable[[], HighWaterMarkStore]] = [
+            lambda: FileHighWaterMarkStore(os.path.join(directory.name, 'marks.json')),
+            lambda: sqlite_store,
+        ]
+        self.first_page = PostSummaryListExtractor().extract_posts(read_test_file(POST_TEST_FIRST_FILE_HTML)).posts
+
+    @staticmethod
+    def _crawl(store: HighWaterMarkStore) -> Tuple[List[str], PostSummaryListRepository, MockRequester]:
+        req = MockRequester()
+        req.clear()
+        for page in PAGES:
+            req.add_expected_response(r_text=read_test_file(page))
+        repo = PostSummaryListRepository(GetPostOptions(
+            requester=req, parser=PostSummaryListExtractor(), sleep_time_min=0, sleep_time_max=0,
+            high_water_marks=store))
+        ids = [p.id for p in repo.get_posts('username', [StopAfterNPosts(100)])]
+        return ids, repo, req
+
+    def test_ranges_are_merged_when_they_overlap(self):
+        complete = SeenRange(_position('6'))
+        for make_store in self.stores:
+            store = make_store()
+            with self.subTest(store=type(store).__name__):
+                self.assertIsNone(store.get('account'))
+                store.update('account', complete)
+                # A crawl stopped before getting down to the mark leaves a gap
+                store.update('account', SeenRange(_position('16'), _position('14')))
+                self.assertEqual(make_store().get('account'),
+                                 HighWaterMark(seen=complete, pending=SeenRange(_position('16'), _position('14'))))
+                store.update('account', SeenRange(_position('20'), _position('15')))
+                self.assertEqual(make_store().get('account').pending, SeenRange(_position('20'), _position('14')))
+                # The crawl that gets through the gap merges everything
+                self.assertEqual(store.update('account', SeenRange(_position('14'), _position('5'))),
+                                 HighWaterMark(seen=SeenRange(_position('20'))))
+
+    def test_first_crawl_sets_the_mark_to_the_newest_post(self):
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                ids, _, _ = self._crawl(make_store())
+                self.assertEqual(ids[:len(self.first_page)], [p.id for p in self.first_page])
+                self.assertEqual(make_store().get('username'), HighWaterMark.of(self.first_page[0]))
+
+    def test_quiet_account_costs_one_request(self):
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                make_store().update('username', SeenRange(TimelinePosition.of(self.first_page[0])))
+                ids, repo, req = self._crawl(make_store())
+                self.assertEqual(ids, [])
+                self.assertEqual(len(req.last_request_history), 1)
+                self.assertEqual([report.saved_requests for report in repo.get_stop_reports()], [1])
+                self.assertTrue(repo.get_stop_reports()[0].reason.startswith('HighWaterMark('))
+
+    def test_only_newer_posts_are_yielded(self):
+        for make_store in self.stores:
+            with self.subTest(store=type(make_store()).__name__):
+                make_store().update('username', SeenRange(TimelinePosition.of(self.first_page[2])))
+                ids, _, req = self._crawl(make_store())
+                self.assertEqual(ids, [p.id for p in self.first_page[:2]])
+                self.assertEqual(len(req.last_request_history), 1)
+                self.assertEqual(make_store().get('username'), HighWaterMark.of(self.first_page[0]))
+
+
+class TestIncrementalCrawls(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = FileHighWaterMarkStore(os.path.join(directory.name, 'marks.json'))
+
+    def _repository(self, pages: List[List[Tuple[str, datetime]]]) -> PostSummaryListRepository:
+        return PostSummaryListRepository(GetPostOptions(
+            requester=UrlRequester(_timeline(pages)), parser=JsonTimelineParser(), sleep_time_min=0,
+            sleep_time_max=0, high_water_marks=self.store))
+
+    def _crawl(self, pages: List[List[Tuple[str, datetime]]], stop_after: int = 100) -> List[str]:
+        return [p.id for p in self._repository(pages).get_posts('username', [StopAfterNPosts(stop_after)])]
+
+    def test_stopped_crawl_does_not_skip_the_posts_below_it(self):
+        self.assertEqual(self._crawl([_minutes(6, 5, 4), _minutes(3, 2, 1)]), ['6', '5', '4', '3', '2', '1'])
+        timeline = [_minutes(16, 15, 14, 13), _minutes(12, 11, 10, 9), _minutes(8, 7, 6, 5), _minutes(4, 3, 2, 1)]
+        self.assertEqual(self._crawl(timeline, stop_after=3), ['16', '15', '14'])
+        self.assertEqual(self.store.get('username').seen, SeenRange(_minute(6)))
+
+        self.assertEqual(self._crawl(timeline), ['13', '12', '11', '10', '9', '8', '7'])
+        self.assertEqual(self.store.get('username'), HighWaterMark(seen=SeenRange(_minute(16))))
+        self.assertEqual(self._crawl(timeline), [])
+
+    def test_mark_is_saved_however_the_crawl_ends(self):
+        timeline = [_minutes(8, 7, 6, 5), _minutes(4, 3, 2, 1)]
+        posts = self._repository(timeline).get_posts('username', [StopAfterNPosts(100)])
+        self.assertEqual([next(posts).id, next(posts).id], ['8', '7'])
+        posts.close()
+        self.assertEqual(self.store.get('username'), HighWaterMark(pending=SeenRange(_minute(8), _minute(7))))
+
+        # The second page is missing: the crawl fails after the first one
+        broken = self._repository(timeline)
+        broken._requester.pages.pop(PostSummaryListRepository._next_page_url('C1', 'p'))
+        posts = []
+        with self.assertRaises(KeyError):
+            for post in broken.get_posts('username', [StopAfterNPosts(100)]):
+                posts.append(post.id)
+        self.assertEqual(posts, ['6', '5'])
+        # The last post of the first page may be pinned, older than the next page, so the range stops above it
+        self.assertEqual(self.store.get('username'), HighWaterMark(pending=SeenRange(_minute(8), _minute(6))))
+        self.assertEqual(self._crawl(timeline), ['5', '4', '3', '2', '1'])
+        self.assertEqual(self.store.get('username'), HighWaterMark(seen=SeenRange(_minute(8))))
+
+    def test_posts_sharing_the_date_of_the_mark(self):
+        self.store.update('username', SeenRange(_position('95')))
+        same_minute = [('110', START), ('96', START), ('95', START), ('94', START), ('9', START)]
+        self.assertEqual(self._crawl([same_minute]), ['110', '96'])
+
+    def test_pinned_post_does_not_hide_the_next_page(self):
+        pinned = _minutes(20, 19, 18) + _minutes(2)
+        timeline = [pinned, _minutes(17, 16, 15, 14), _minutes(13, 12, 11, 10)]
+        self.assertEqual(self._crawl(timeline, stop_after=4), ['20', '19', '18', '2'])
+        # The pinned post is yielded again until a crawl gets down to it, the posts of the next page are not lost
+        self.assertEqual(self._crawl(timeline, stop_after=3), ['2', '17', '16'])
+        self.assertEqual(self._crawl(timeline, stop_after=3), ['2', '15', '14'])
+        self.assertEqual(self._crawl(timeline), ['2', '13', '12', '11', '10'])
+        self.assertEqual(self._crawl(timeline), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from typing import List
+
+from facebook_simple_scraper.dedupe import BloomFilter, PersistentSeenIds
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_pipeline import UrlRequester, _listings_page
+
+
+class TestPersistentSeenIds(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _index(self, **kwargs) -> PersistentSeenIds:
+        index = PersistentSeenIds(self.directory, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def test_ids_outlive_the_run(self):
+        index = PersistentSeenIds(self.directory)
+        self.assertTrue(index.add('1'))
+        self.assertFalse(index.add('1'))
+        index.add_all(['2', '3'])
+        index.close()
+
+        index = self._index()
+        self.assertEqual(len(index), 3)
+        self.assertIn('2', index)
+        self.assertNotIn('4', index)
+        self.assertTrue(index.add('4'))
+
+    def test_new_ids_need_no_lookup(self):
+        index = self._index()
+        for i in range(1000):
+            self.assertTrue(index.add(str(i)))
+        # At a 1% false positive rate, almost every new id is settled by the filter alone
+        self.assertLess(index.lookups, 20)
+
+    def test_false_positives_are_settled_by_the_exact_set(self):
+        # A filter far too small for the ids answers "maybe" to almost anything
+        index = self._index(expected_ids=10, batch_size=7)
+        ids = [str(i) for i in range(500)]
+        self.assertTrue(all(index.add(i) for i in ids))
+        self.assertFalse(any(index.add(i) for i in ids))
+        self.assertFalse(any(str(i) in index for i in range(500, 1000)))
+        self.assertGreater(index.lookups, 0)
+
+    def test_filter_keeps_its_size_when_reopened(self):
+        path = os.path.join(self.directory, 'ids.bloom')
+        bloom = BloomFilter(path, expected_items=100)
+        bloom.add('1')
+        bits, hashes = bloom.bits, bloom.hashes
+        bloom.close()
+        bloom = BloomFilter(path, expected_items=10_000)
+        self.addCleanup(bloom.close)
+        self.assertEqual((bloom.bits, bloom.hashes), (bits, hashes))
+        self.assertIn('1', bloom)
+
+
+class TestNewListingsOnly(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = PersistentSeenIds(directory.name)
+        self.addCleanup(self.index.close)
+        self.build_url = MarketplaceVehicleRepository._build_url
+
+    def _search(self, filters: MarketplaceVehicleFilters, pages: dict, new_only: bool = True,
+                stop_after: int = 100) -> List[str]:
+        repo = MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+            requester=UrlRequester(pages), parser=MarketplaceListingsExtractor(), sleep_time_min=0,
+            sleep_time_max=0, listing_index=self.index, new_only=new_only))
+        return sorted(listing.id for listing in repo.search(filters, [StopAfterNPosts(stop_after)]))
+
+    def test_known_listings_are_skipped_across_searches(self):
+        santiago = MarketplaceVehicleFilters(location='santiago')
+        valparaiso = MarketplaceVehicleFilters(location='valparaiso')
+        self.assertEqual(self._search(santiago, {
+            self.build_url(santiago): _listings_page(['1', '2'], 'C1'),
+            self.build_url(santiago, cursor='C1'): _listings_page(['3'], None),
+        }), ['1', '2', '3'])
+        valparaiso_pages = {self.build_url(valparaiso): _listings_page(['2', '3', '4'], None)}
+        self.assertEqual(self._search(valparaiso, valparaiso_pages), ['4'])
+        self.assertEqual(self._search(valparaiso, valparaiso_pages, new_only=False), ['2', '3', '4'])
+
+    def test_skipped_listings_do_not_count_for_stop_conditions(self):
+        filters = MarketplaceVehicleFilters(location='santiago')
+        pages = {self.build_url(filters): _listings_page(['1', '2', '3', '4'], None)}
+        self.index.add_all(['1', '2'])
+        self.assertEqual(self._search(filters, pages, stop_after=2), ['3', '4'])
+
+    def test_listings_not_consumed_stay_new(self):
+        filters = MarketplaceVehicleFilters(location='santiago')
+        pages = {self.build_url(filters): _listings_page(['1', '2', '3'], None)}
+        first = self._search(filters, pages, stop_after=1)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(sorted(first + self._search(filters, pages)), ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
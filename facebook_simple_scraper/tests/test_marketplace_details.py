@@ -0,0 +1,154 @@
+import json
+import re
+import threading
+import time
+import unittest
+from typing import Dict, List, Optional, Set
+
+import requests
+
+from facebook_simple_scraper.entities import LoginCredentials, ScraperOptions
+from facebook_simple_scraper.login.domain import LoginResponse
+from facebook_simple_scraper.marketplace.extractor import MarketplaceDetailExtractor, MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.scraper import Scraper
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.utils import MockRequester
+
+_ITEM_URL_RE = re.compile(r'/marketplace/item/([^/]+)/')
+
+
+def _detail_html(listing_id: str) -> str:
+    node = {"__typename": "GroupCommerceProductItem", "id": listing_id,
+            "marketplace_listing_title": f"Car {listing_id}", "formatted_price": {"text": "$8,000"}}
+    return f'<html><body><script>require("ScheduledServerJS").handle({json.dumps({"listing": node})});' \
+           '</script></body></html>'
+
+
+class DetailRequester(MockRequester):
+    """Fake Marketplace serving item pages, slowly for ``delays`` and failing for ``broken`` ids."""
+
+    def __init__(self, delays: Optional[Dict[str, float]] = None, broken: Optional[Set[str]] = None,
+                 delay: float = 0.01):
+        self.delays = delays or {}
+        self.broken = broken or set()
+        self.delay = delay
+        self.urls: List[str] = []
+        self.active = 0
+        self.max_active = 0
+        self.threads: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str,
+                data: Optional[dict] = None, headers: Optional[dict] = None) -> requests.Response:
+        listing_id = _ITEM_URL_RE.search(url).group(1)
+        with self._lock:
+            self.urls.append(url)
+            self.threads.add(threading.current_thread().name)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays.get(listing_id, self.delay))
+            if listing_id in self.broken:
+                raise requests.exceptions.ConnectionError(f"cannot fetch {listing_id}")
+        finally:
+            with self._lock:
+                self.active -= 1
+        response = requests.Response()
+        response._content = _detail_html(listing_id).encode()
+        response.encoding = 'utf-8'
+        response.status_code = 200
+        return response
+
+
+def _repository(requester: DetailRequester) -> MarketplaceVehicleRepository:
+    return MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+        requester=requester, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0))
+
+
+class TestGetDetails(unittest.TestCase):
+
+    def test_results_come_in_completion_order(self):
+        requester = DetailRequester(delays={'slow': 0.3})
+        results = list(_repository(requester).get_details(['slow', '1', '2', '3'], workers=4))
+        self.assertEqual([r.listing_id for r in results][-1], 'slow')
+        self.assertEqual(sorted(r.detail.title for r in results), ['Car 1', 'Car 2', 'Car 3', 'Car slow'])
+        self.assertTrue(all(r.ok and r.detail.id == r.listing_id for r in results))
+
+    def test_fetches_are_bounded_and_ids_fetched_once(self):
+        requester = DetailRequester()
+        ids = [str(i) for i in range(30)] + ['1', '2']
+        results = list(_repository(requester).get_details(ids, workers=3))
+        self.assertEqual(sorted(r.listing_id for r in results), sorted(set(ids)))
+        self.assertEqual(len(requester.urls), 30)
+        self.assertEqual(requester.max_active, 3)
+
+    def test_a_failing_listing_does_not_stop_the_others(self):
+        requester = DetailRequester(broken={'2'})
+        results = {r.listing_id: r for r in _repository(requester).get_details(['1', '2', '3'], workers=2)}
+        self.assertFalse(results['2'].ok)
+        self.assertIsInstance(results['2'].error, requests.exceptions.ConnectionError)
+        self.assertEqual([results[i].detail.title for i in ['1', '3']], ['Car 1', 'Car 3'])
+
+    def test_pages_are_parsed_off_the_download_threads(self):
+        requester = DetailRequester()
+        parse_threads: Set[str] = set()
+        extract = MarketplaceDetailExtractor.extract
+
+        def recording_extract(extractor, html_content, listing_id):
+            parse_threads.add(threading.current_thread().name)
+            return extract(extractor, html_content, listing_id)
+
+        MarketplaceDetailExtractor.extract = recording_extract
+        self.addCleanup(setattr, MarketplaceDetailExtractor, 'extract', extract)
+        list(_repository(requester).get_details(['1', '2', '3'], workers=2))
+        self.assertTrue(parse_threads)
+        self.assertFalse(parse_threads & requester.threads)
+        self.assertNotIn(threading.current_thread().name, parse_threads)
+
+    def test_consumer_can_stop_early(self):
+        requester = DetailRequester(delay=0.05)
+        results = _repository(requester).get_details([str(i) for i in range(100)], workers=2)
+        next(iter(results))
+        results.close()
+        time.sleep(0.2)
+        self.assertLessEqual(len(requester.urls), 8)
+
+
+class FakeLoginRepository:
+    def __init__(self, deps: 'FakeDepsBuilder'):
+        self.deps = deps
+
+    def login(self, username: str, password: str) -> LoginResponse:
+        self.deps.logins += 1
+        return LoginResponse(was_logged=True, save_device=False, requester=MockRequester())
+
+
+class FakeDepsBuilder:
+    def __init__(self):
+        self.requester = DetailRequester()
+        self.logins = 0
+        self.builds = 0
+
+    def build_deps(self, opts: ScraperOptions, req: Optional[MockRequester] = None):
+        self.builds += 1
+        return FakeLoginRepository(self), None, _repository(self.requester)
+
+
+class TestScraperDetails(unittest.TestCase):
+
+    def test_one_login_for_every_listing(self):
+        deps = FakeDepsBuilder()
+        opts = ScraperOptions(credentials=[LoginCredentials(username='user', password='pw')],
+                              stop_conditions=[StopAfterNPosts(1)])
+        scraper = Scraper(opts, deps_builder=deps)
+        results = list(scraper.get_marketplace_vehicle_details([str(i) for i in range(20)], workers=4))
+        self.assertEqual(len([r for r in results if r.ok]), 20)
+        self.assertEqual(deps.logins, 1)
+        # One build to log in, one for the repository fetching the details
+        self.assertEqual(deps.builds, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
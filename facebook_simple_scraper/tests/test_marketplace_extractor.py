@@ -1,11 +1,17 @@
 import json
 import os
 import unittest
+from unittest import mock
 
 from facebook_simple_scraper.marketplace.extractor import (
     MarketplaceDetailExtractor,
     MarketplaceListingsExtractor,
+    _LISTINGS_MARKERS,
+    _extract_json_objects,
+    _iter_json_objects_from_html,
+    build_json_index,
 )
+from facebook_simple_scraper.marketplace.json_index import JsonNodeIndex
 
 
 _DETAIL_HTML_PATH = "/tmp/detail.html"
@@ -89,6 +95,17 @@ class TestMarketplaceListingsExtractor(unittest.TestCase):
         result = MarketplaceListingsExtractor().extract(_make_html(payload))
         self.assertEqual(len(result.listings), 1)
 
+    def test_drops_fields_of_unexpected_types(self):
+        html = _make_html({"edges": [
+            {"node": {"__typename": "MarketplaceListing", "id": 1, "marketplace_listing_title": "Car",
+                      "listing_price": {"formatted_amount": "$1,500", "amount": "1500", "currency": "USD"},
+                      "marketplace_listing_seller": {"name": {"text": "not a name"}, "id": 7}}},
+            {"node": {"__typename": "MarketplaceListing", "id": 2, "marketplace_listing_title": {"x": 1}}},
+        ], "page_info": {"end_cursor": "NEXT"}})
+        listing, = MarketplaceListingsExtractor().extract(html).listings
+        self.assertEqual((listing.id, listing.price_amount, listing.seller_name, listing.seller_id),
+                         ('1', 1500.0, None, '7'))
+
     def test_returns_empty_when_no_listings(self):
         result = MarketplaceListingsExtractor().extract("<html></html>")
         self.assertEqual(result.listings, [])
@@ -240,5 +257,108 @@ class TestMarketplaceDetailExtractor(unittest.TestCase):
         self.assertEqual(detail.location, "El Monte, RM")
 
 
+class TestTargetedJsonDecoding(unittest.TestCase):
+    _LISTING = {"__typename": "MarketplaceListing", "id": "1"}
+
+    def _decode(self, text: str) -> list:
+        return list(_extract_json_objects(text, markers=_LISTINGS_MARKERS))
+
+    def test_only_marked_objects_are_decoded(self):
+        text = (
+            'var a = {"unrelated": {"x": 1}}; f({"b": 2});'
+            f'require("ScheduledServerJS").handle({json.dumps({"node": self._LISTING})});'
+            'g({"page_info": {"end_cursor": "C"}}); h({"trailing": true});'
+        )
+        self.assertEqual(self._decode(text), [{"node": self._LISTING}, {"page_info": {"end_cursor": "C"}}])
+        self.assertIn({"unrelated": {"x": 1}}, list(_extract_json_objects(text)))
+
+    def test_scripts_without_markers_are_not_decoded(self):
+        text = "".join('function f%d(a){return {"k":"{"+a+"}"}}' % i for i in range(100))
+        with mock.patch("json.JSONDecoder.raw_decode") as raw_decode:
+            self.assertEqual(self._decode(text), [])
+        raw_decode.assert_not_called()
+
+    def test_one_decode_per_payload(self):
+        payload = json.dumps({"edges": [{"node": dict(self._LISTING, id=str(i))} for i in range(50)]})
+        text = f'f(function(){{return {{a: "{{"}}}}, {payload}); g({payload});'
+        with mock.patch("json.JSONDecoder.raw_decode", autospec=True, side_effect=json.JSONDecoder.raw_decode) as raw_decode:
+            objects = self._decode(text)
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(raw_decode.call_count, 2)
+
+    def test_braces_inside_string_literals_are_skipped(self):
+        listing = json.dumps(self._LISTING)
+        text = (
+            f"var s = '{listing}'; // {listing}\n"
+            f"/* {listing} */ var t = \"{{\\\"a\\\": 1}}\"; f({listing});"
+        )
+        self.assertEqual(self._decode(text), [self._LISTING])
+
+    def test_unterminated_quote_does_not_hide_the_line_after(self):
+        listing = json.dumps(self._LISTING)
+        text = f"var re = /'/;\nf({listing});"
+        self.assertEqual(self._decode(text), [self._LISTING])
+
+    def test_falls_back_to_nested_objects_of_js_literals(self):
+        listing = json.dumps(self._LISTING)
+        text = f'f({{"callback": function() {{}}, "data": {listing}}});'
+        self.assertEqual(self._decode(text), [self._LISTING])
+
+
+def _walk_typenames(obj) -> list:
+    """The depth-first walk the extractors used before the index."""
+    found, stack = [], [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            if "__typename" in cur:
+                found.append(cur["__typename"] + ":" + str(cur.get("id")))
+            stack.extend(cur.values())
+        elif isinstance(cur, list):
+            stack.extend(cur)
+    return found
+
+
+class TestJsonNodeIndex(unittest.TestCase):
+    _PAYLOAD = {
+        "edges": [
+            {"node": {"__typename": "MarketplaceListing", "id": "1", "page_info": {"end_cursor": "inner"}}},
+            {"node": {"__typename": "GroupCommerceProductItem", "id": "2",
+                      "story": {"__typename": "MarketplaceListing", "id": "3"}}},
+            [{"__typename": "User", "id": "4"}, "scalar", 5],
+        ],
+        "page_info": {"end_cursor": "outer"},
+    }
+
+    def test_nodes_in_walk_order(self):
+        index = JsonNodeIndex.from_objects([self._PAYLOAD, 7, {"__typename": "MarketplaceListing", "id": "5"}])
+        walked = _walk_typenames(self._PAYLOAD) + ["MarketplaceListing:5"]
+        nodes = index.nodes("MarketplaceListing", "GroupCommerceProductItem", "User")
+        self.assertEqual([n["__typename"] + ":" + n["id"] for n in nodes], walked)
+        self.assertEqual([n["id"] for n in index.nodes("MarketplaceListing")], ["3", "1", "5"])
+        self.assertEqual(index.end_cursors, ["outer", "inner"])
+        self.assertEqual(index.end_cursor, "outer")
+        self.assertEqual(index.nodes("Unknown"), [])
+
+    def test_pruned_keys_are_not_walked(self):
+        payload = {"gkxData": {"x": {"__typename": "MarketplaceListing", "id": "1"}},
+                   "data": {"__typename": "MarketplaceListing", "id": "2"}}
+        self.assertEqual([n["id"] for n in JsonNodeIndex.from_objects([payload]).nodes("MarketplaceListing")], ["2"])
+        unpruned = JsonNodeIndex.from_objects([payload], pruned_keys=frozenset())
+        self.assertEqual(len(unpruned.nodes("MarketplaceListing")), 2)
+
+    def test_one_index_feeds_both_extractors(self):
+        html = _make_html({"node": {"__typename": "GroupCommerceProductItem", "id": "9",
+                                    "marketplace_listing_title": "Car"}})
+        with mock.patch("facebook_simple_scraper.marketplace.extractor._iter_json_objects_from_html",
+                        wraps=_iter_json_objects_from_html) as discovery:
+            index = build_json_index(html)
+            listings = MarketplaceListingsExtractor().extract_from_index(index)
+            detail = MarketplaceDetailExtractor().extract_from_index(index, "9")
+        self.assertEqual(discovery.call_count, 1)
+        self.assertEqual([listing.id for listing in listings.listings], ["9"])
+        self.assertEqual(detail.title, "Car")
+
+
 if __name__ == "__main__":
     unittest.main()
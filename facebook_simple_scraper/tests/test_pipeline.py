@@ -0,0 +1,175 @@
+import json
+import pickle
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.pipeline import PagePipeline, parser_task
+from facebook_simple_scraper.posts.fast_summary_extractor import FastPostSummaryListExtractor
+from facebook_simple_scraper.posts.selectors import LayoutCache
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_marketplace_extractor import _make_html
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_LAST_FILE_HTML, \
+    POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+
+class UrlRequester(MockRequester):
+    """Fake requester serving pages by URL, in any order."""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = pages
+        self.urls: List[str] = []
+
+    def request(self, method: str, url: str,
+                data: Optional[dict] = None, headers: Optional[dict] = None) -> requests.Response:
+        self.urls.append(url)
+        response = requests.Response()
+        response._content = self.pages[url].encode()
+        response.encoding = 'utf-8'
+        response.status_code = 200
+        return response
+
+
+def _parse_page(text: str) -> dict:
+    return json.loads(text)
+
+
+def _listings_page(ids: List[str], cursor: Optional[str]) -> str:
+    edges = [{"node": {"__typename": "MarketplaceListing", "id": i, "marketplace_listing_title": f"Car {i}"}}
+             for i in ids]
+    return _make_html({"data": {"feed_units": {"edges": edges, "page_info": {"end_cursor": cursor}}}})
+
+
+class TestPagePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.fetched: List[str] = []
+        self.pages = {
+            'p1': json.dumps({'n': 1, 'next': 'p2', 'peek': 'p2'}),
+            'p2': json.dumps({'n': 2, 'next': 'p3', 'peek': 'wrong'}),
+            'p3': json.dumps({'n': 3, 'next': None, 'peek': None}),
+            'wrong': json.dumps({'n': -1, 'next': None, 'peek': None}),
+        }
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def _fetch(self, url: str) -> str:
+        self.fetched.append(url)
+        return self.pages[url]
+
+    def _pipeline(self, pause: float = 0) -> PagePipeline:
+        return PagePipeline(
+            fetch=self._fetch,
+            parse=_parse_page,
+            next_url=lambda page: page['next'],
+            peek_next_url=lambda text: json.loads(text)['peek'],
+            parse_executor=self.executor,
+            pause=lambda: pause,
+        )
+
+    def test_wrong_guesses_are_refetched(self):
+        pipeline = self._pipeline()
+        self.assertEqual([page['n'] for page in pipeline.pages('p1')], [1, 2, 3])
+        self.assertEqual((pipeline.prefetch_hits, pipeline.prefetch_misses), (1, 1))
+        self.assertEqual(self.fetched[-1], 'p3')
+
+    def test_stopping_abandons_the_prefetch(self):
+        pages = self._pipeline(pause=30).pages('p1')
+        self.assertEqual(next(pages)['n'], 1)
+        started = time.monotonic()
+        pages.close()
+        self.assertLess(time.monotonic() - started, 5)
+        time.sleep(0.05)
+        self.assertEqual(self.fetched, ['p1'])
+
+    def test_next_page_is_downloaded_while_parsing(self):
+        parsing = threading.Event()
+        downloaded = threading.Event()
+
+        def parse(text: str) -> dict:
+            page = _parse_page(text)
+            if page['n'] == 1:
+                parsing.set()
+                self.assertTrue(downloaded.wait(5))
+            return page
+
+        def fetch(url: str) -> str:
+            if url == 'p2':
+                self.assertTrue(parsing.wait(5))
+                downloaded.set()
+            return self._fetch(url)
+
+        pipeline = PagePipeline(fetch, parse, lambda page: page['next'], lambda text: json.loads(text)['peek'],
+                                self.executor)
+        self.assertEqual([page['n'] for page in pipeline.pages('p1')], [1, 2, 3])
+
+    def test_parsers_pickle_without_their_caches(self):
+        extractor = FastPostSummaryListExtractor(layout_cache=LayoutCache(max_layouts=3))
+        extractor.extract_posts(read_test_file(POST_TEST_FIRST_FILE_HTML))
+        copy = pickle.loads(pickle.dumps(extractor))
+        self.assertEqual((copy.layout_cache.max_layouts, copy.layout_cache.layouts), (3, 0))
+        # Parsers configured alike are cached once by every worker process
+        fresh = FastPostSummaryListExtractor(layout_cache=LayoutCache(max_layouts=3))
+        self.assertEqual(pickle.dumps(extractor), pickle.dumps(fresh))
+
+
+class TestPipelinedRepositories(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def test_posts_parsed_in_worker_processes(self):
+        html = [read_test_file(f) for f in (POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML,
+                                             POST_TEST_LAST_FILE_HTML)]
+        urls = [PostSummaryListRepository._first_page_url('username')]
+        urls += [PostSummaryListRepository._peek_next_page_url(page) for page in html[:2]]
+        results = []
+        for executor in (None, self.executor):
+            req = UrlRequester(dict(zip(urls, html)))
+            repo = PostSummaryListRepository(GetPostOptions(
+                requester=req, parser=FastPostSummaryListExtractor(), sleep_time_min=0, sleep_time_max=0,
+                parse_executor=executor,
+            ))
+            posts = list(repo.get_posts('username', [StopAfterNPosts(1000)]))
+            results.append([(post.id, post.text, post.like_count) for post in posts])
+            self.assertEqual(req.urls, urls)
+        self.assertEqual(results[1], results[0])
+        self.assertGreater(len(results[0]), 0)
+
+    def test_marketplace_search_parsed_in_worker_processes(self):
+        filters = MarketplaceVehicleFilters(location='santiago')
+        build_url = MarketplaceVehicleRepository._build_url
+        req = UrlRequester({
+            build_url(filters): _listings_page(['1', '2'], 'C1'),
+            build_url(filters, cursor='C1'): _listings_page(['2', '3'], None),
+        })
+        repo = MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+            requester=req, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0,
+            parse_executor=self.executor,
+        ))
+        self.assertCountEqual([listing.id for listing in repo.search(filters)], ['1', '2', '3'])
+        self.assertEqual(len(req.urls), 2)
+
+    def test_parser_task_runs_in_worker_processes(self):
+        task = parser_task(MarketplaceListingsExtractor(), 'extract', self.executor)
+        page = self.executor.submit(task, _listings_page(['7'], 'NEXT')).result()
+        self.assertEqual(([listing.id for listing in page.listings], page.cursor), (['7'], 'NEXT'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from facebook_simple_scraper.requester.endpoints import Endpoint, classify_endpoint
+from facebook_simple_scraper.requester.rate_limiter import RateLimiter, RateBudget, RateLimitedRequester, TokenBucket
+from facebook_simple_scraper.tests.utils import MockRequester
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class TestClassifyEndpoint(unittest.TestCase):
+    def test_known_endpoints(self):
+        self.assertEqual(classify_endpoint('https://mbasic.facebook.com/nintendo?v=timeline'), Endpoint.TIMELINE)
+        self.assertEqual(classify_endpoint('https://mbasic.facebook.com/profile/timeline/stream/?cursor=x'),
+                         Endpoint.TIMELINE)
+        self.assertEqual(classify_endpoint('https://web.facebook.com/api/graphql/'), Endpoint.GRAPHQL)
+        self.assertEqual(classify_endpoint('https://www.facebook.com/marketplace/category/search/?q=1'),
+                         Endpoint.MARKETPLACE_SEARCH)
+        self.assertEqual(classify_endpoint('https://www.facebook.com/marketplace/item/1/'),
+                         Endpoint.MARKETPLACE_DETAIL)
+        self.assertEqual(classify_endpoint('https://mbasic.facebook.com/login'), Endpoint.LOGIN)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve_spaces_requests_by_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(RateBudget(rate=2.0, min_rate=0.5, max_rate=4.0), 0.5, 0.5, clock)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        clock.now += 10
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_aimd(self):
+        bucket = TokenBucket(RateBudget(rate=1.0, min_rate=0.3, max_rate=1.2), 0.1, 0.5, FakeClock())
+        bucket.on_success()
+        self.assertAlmostEqual(bucket.rate, 1.1)
+        bucket.on_success()
+        bucket.on_success()
+        self.assertAlmostEqual(bucket.rate, 1.2)
+        bucket.on_failure()
+        self.assertAlmostEqual(bucket.rate, 0.6)
+        bucket.on_failure()
+        self.assertAlmostEqual(bucket.rate, 0.3)
+
+
+class TestRateLimitedRequester(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        budget = RateBudget(rate=1.0, min_rate=0.1, max_rate=2.0)
+        self.limiter = RateLimiter(budgets={e: budget for e in Endpoint}, jitter=0, increase=0.5,
+                                   clock=self.clock, sleep=self.clock.sleep)
+
+    def _requester(self, *statuses: int, body: str = '') -> MockRequester:
+        req = MockRequester()
+        req.clear()
+        req.save_session_variables({'username': 'user_a'})
+        for status in statuses:
+            req.add_expected_response(r_text=body, status=status)
+        return req
+
+    def test_budget_is_shared_between_requesters_of_an_account(self):
+        url = 'https://mbasic.facebook.com/nintendo?v=timeline'
+        RateLimitedRequester(self._requester(200), self.limiter).request('GET', url)
+        RateLimitedRequester(self._requester(200), self.limiter).request('GET', url)
+        # The first healthy response raised the shared rate from 1 to 1.5 requests/second.
+        self.assertAlmostEqual(self.clock.now, 1 / 1.5)
+
+    def test_errors_and_checkpoints_slow_down(self):
+        url = 'https://web.facebook.com/api/graphql/'
+        RateLimitedRequester(self._requester(500), self.limiter).request('POST', url)
+        self.assertAlmostEqual(self.limiter.bucket('user_a', Endpoint.GRAPHQL).rate, 0.5)
+        checkpoint = self._requester(200, body='<form action="/login/checkpoint/">')
+        RateLimitedRequester(checkpoint, self.limiter).request('POST', url)
+        self.assertAlmostEqual(self.limiter.bucket('user_a', Endpoint.GRAPHQL).rate, 0.25)
+
+    def test_healthy_responses_speed_up(self):
+        url = 'https://www.facebook.com/marketplace/item/1/'
+        RateLimitedRequester(self._requester(200), self.limiter, credential='other').request('GET', url)
+        self.assertAlmostEqual(self.limiter.bucket('other', Endpoint.MARKETPLACE_DETAIL).rate, 1.5)
+        self.assertAlmostEqual(self.limiter.bucket('user_a', Endpoint.MARKETPLACE_DETAIL).rate, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
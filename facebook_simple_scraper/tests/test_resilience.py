@@ -0,0 +1,150 @@
+import unittest
+from typing import List, Union
+from unittest import mock
+
+import requests
+
+from facebook_simple_scraper.error_dict import CircuitOpenError
+from facebook_simple_scraper.requester.endpoints import Endpoint
+from facebook_simple_scraper.requester.requester import FacebookSessionBasedRequester, Requester
+from facebook_simple_scraper.requester.resilience import CircuitBreakers, CircuitState, RequestMetrics, \
+    ResilientRequester, RetryPolicy
+
+TIMELINE_URL = 'https://mbasic.facebook.com/nintendo?v=timeline'
+GRAPHQL_URL = 'https://web.facebook.com/api/graphql/'
+
+
+class ScriptedRequester(Requester):
+    """Returns (or raises) the scripted outcomes in order."""
+
+    def __init__(self, outcomes: List[Union[int, BaseException]]):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, data=None, headers=None) -> requests.Response:
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response._content = b''
+        return response
+
+    def validate(self) -> None:
+        pass
+
+    def save_session_variables(self, session_variables: dict) -> None:
+        pass
+
+    def load_session_variables(self) -> dict:
+        return {}
+
+    def get_latest_request(self):
+        return None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestResilientRequester(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps: List[float] = []
+        self.metrics = RequestMetrics()
+        self.clock = FakeClock()
+        self.breakers = CircuitBreakers(failure_threshold=3, reset_timeout=60, clock=self.clock)
+
+    def _requester(self, *outcomes: Union[int, BaseException]) -> ResilientRequester:
+        return ResilientRequester(ScriptedRequester(list(outcomes)), RetryPolicy(max_attempts=3, backoff_base=1),
+                                  self.breakers, on_attempt=self.metrics, sleep=self.sleeps.append)
+
+    def test_get_is_retried_with_backoff(self):
+        req = self._requester(503, requests.ConnectionError(), 200)
+        self.assertEqual(req.request('GET', TIMELINE_URL).status_code, 200)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertLessEqual(self.sleeps[0], 1)
+        self.assertLessEqual(self.sleeps[1], 2)
+        attempts = self.metrics.snapshot()
+        self.assertEqual([a.attempt for a in attempts], [1, 2, 3])
+        self.assertEqual([a.will_retry for a in attempts], [True, True, False])
+        self.assertEqual(attempts[1].error, 'ConnectionError')
+        self.assertEqual(self.metrics.retries[Endpoint.TIMELINE], 2)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.CLOSED)
+
+    def test_gives_up_after_max_attempts(self):
+        req = self._requester(requests.Timeout(), requests.Timeout(), requests.Timeout())
+        with self.assertRaises(requests.Timeout):
+            req.request('GET', TIMELINE_URL)
+        self.assertEqual(self.metrics.failures[Endpoint.TIMELINE], 3)
+
+    def test_post_is_not_retried(self):
+        req = self._requester(500, 200)
+        self.assertEqual(req.request('POST', GRAPHQL_URL).status_code, 500)
+        self.assertEqual(req.requester.calls, 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_circuit_opens_then_allows_a_trial(self):
+        failing = self._requester(500, 500, 500)
+        failing.request('GET', TIMELINE_URL)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.OPEN)
+
+        healthy = self._requester(200, 200)
+        with self.assertRaises(CircuitOpenError):
+            healthy.request('GET', TIMELINE_URL)
+        self.assertEqual(healthy.requester.calls, 0)
+        self.assertEqual(self.metrics.rejected[Endpoint.TIMELINE], 1)
+        # Other endpoints are not affected
+        self.assertEqual(healthy.request('POST', GRAPHQL_URL).status_code, 200)
+
+        self.clock.now += 61
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.HALF_OPEN)
+        self.assertEqual(healthy.request('GET', TIMELINE_URL).status_code, 200)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.CLOSED)
+
+    def test_failed_trial_reopens_circuit(self):
+        self._requester(500, 500, 500).request('GET', TIMELINE_URL)
+        self.clock.now += 61
+        req = ResilientRequester(ScriptedRequester([500]), RetryPolicy(max_attempts=3), self.breakers,
+                                 sleep=self.sleeps.append)
+        with self.assertRaises(CircuitOpenError):
+            req.request('GET', TIMELINE_URL)
+        self.assertEqual(req.requester.calls, 1)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.OPEN)
+
+    def test_trial_raising_another_error_reopens_circuit(self):
+        self._requester(500, 500, 500).request('GET', TIMELINE_URL)
+        self.clock.now += 61
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self._requester(requests.exceptions.ChunkedEncodingError()).request('GET', TIMELINE_URL)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.OPEN)
+        self.assertEqual(self.metrics.snapshot()[-1].error, 'ChunkedEncodingError')
+
+        # The next trial is let through once the circuit has cooled down again
+        self.clock.now += 61
+        self.assertEqual(self._requester(200).request('GET', TIMELINE_URL).status_code, 200)
+        self.assertEqual(self.breakers.get(Endpoint.TIMELINE).state, CircuitState.CLOSED)
+
+    def test_interrupted_trial_lets_the_next_one_through(self):
+        self._requester(500, 500, 500).request('GET', TIMELINE_URL)
+        self.clock.now += 61
+        with self.assertRaises(KeyboardInterrupt):
+            self._requester(KeyboardInterrupt()).request('GET', TIMELINE_URL)
+        self.assertEqual(self._requester(200).request('GET', TIMELINE_URL).status_code, 200)
+
+
+class TestRequestTimeout(unittest.TestCase):
+    def test_timeout_is_passed_to_session(self):
+        session = mock.Mock(spec=requests.Session)
+        req = FacebookSessionBasedRequester(session=session, timeout=(3, 7))
+        req.request('GET', TIMELINE_URL)
+        self.assertEqual(session.request.call_args.kwargs['timeout'], (3, 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
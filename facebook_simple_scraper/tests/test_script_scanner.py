@@ -0,0 +1,66 @@
+import json
+import unittest
+
+from bs4 import BeautifulSoup
+
+from facebook_simple_scraper.marketplace.extractor import MarketplaceDetailExtractor, MarketplaceListingsExtractor, \
+    _iter_json_objects_from_html
+from facebook_simple_scraper.marketplace.script_scanner import iter_script_spans
+
+TRICKY_PAGE = '''<!DOCTYPE html>
+<html><head>
+<SCRIPT type="application/json" data-x='a>b'>{"a": 1}</SCRIPT>
+<!-- <script>{"commented": true}</script> -->
+<script src="/bundle.js"></script>
+<script>var s = "<b>{not json</b>"; f({"b": [1, 2]});</script >
+<scripty>{"not": "a script"}</scripty>
+<script nonce="x">g({"c": "&amp;"}) {"d": {"e": null}}</script>
+</head><body>
+<p>{"outside": "script"}</p>
+</body></html>'''
+
+
+def _soup_script_texts(html: str):
+    return [script.string or script.get_text() or "" for script in BeautifulSoup(html, "html.parser").find_all("script")]
+
+
+def _listing_html(listing_id: str, typename: str = "MarketplaceListing") -> str:
+    payload = {"node": {"__typename": typename, "id": listing_id, "marketplace_listing_title": f"Car {listing_id}"}}
+    return f'<script>require("ScheduledServerJS").handle({json.dumps(payload)});</script>'
+
+
+class TestScriptScanner(unittest.TestCase):
+
+    def test_spans_match_html_parser_script_text(self):
+        bodies = [TRICKY_PAGE[start:end] for start, end in iter_script_spans(TRICKY_PAGE)]
+        self.assertEqual(bodies, _soup_script_texts(TRICKY_PAGE))
+
+    def test_bytes_offsets_index_into_the_document(self):
+        document = TRICKY_PAGE.replace('"d"', '"día"').encode("utf-8")
+        bodies = [document[start:end].decode("utf-8") for start, end in iter_script_spans(document)]
+        self.assertEqual(bodies, [text.replace('"d"', '"día"') for text in _soup_script_texts(TRICKY_PAGE)])
+
+    def test_browser_style_script_ends(self):
+        # html.parser drops a script left open at the end of the document, browsers keep it
+        html = '<script>f({"a": 1})</script/><script>{"b": 2}'
+        self.assertEqual([html[start:end] for start, end in iter_script_spans(html)], ['f({"a": 1})', '{"b": 2}'])
+
+    def test_json_objects_are_decoded_in_place(self):
+        expected = [{"a": 1}, {"b": [1, 2]}, {"c": "&amp;"}, {"d": {"e": None}}]
+        self.assertEqual(list(_iter_json_objects_from_html(TRICKY_PAGE)), expected)
+        self.assertEqual(list(_iter_json_objects_from_html(TRICKY_PAGE.encode("utf-8"))), expected)
+
+    def test_objects_do_not_run_across_scripts(self):
+        html = '<script>f({"a": </script><p>1}</p><script>{"b": 2}</script>'
+        self.assertEqual(list(_iter_json_objects_from_html(html)), [{"b": 2}])
+
+    def test_extractors_accept_bytes(self):
+        html = "<html><body>" + _listing_html("1") + _listing_html("2", "GroupCommerceProductItem") + "</body></html>"
+        listings = MarketplaceListingsExtractor().extract(html.encode("utf-8"))
+        self.assertEqual([listing.id for listing in listings.listings], ["1", "2"])
+        detail = MarketplaceDetailExtractor().extract(html.encode("utf-8"), "2")
+        self.assertEqual(detail.title, "Car 2")
+
+
+if __name__ == '__main__':
+    unittest.main()
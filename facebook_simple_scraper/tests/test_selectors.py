@@ -0,0 +1,154 @@
+import dataclasses
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from facebook_simple_scraper.posts.fast_summary_extractor import FastPostSummaryListExtractor
+from facebook_simple_scraper.posts.selectors import DEFAULT_SELECTOR_CHAINS, Layout, LayoutCache, Selector, \
+    load_selector_chains
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.utils import read_test_file
+
+NEW_LAYOUT_PAGE = '''
+<html><body>
+<article>
+  <div class="zz9 text">A post in a layout nobody has seen yet</div>
+  <abbr>May 2 at 1:27 PM</abbr>
+  <a class="zz9 likes" href="/likes">Likes 12</a>
+  <a href="/story.php?story_fbid=123&amp;id=9">story</a>
+</article>
+</body></html>
+'''
+
+SECOND_TEXT_SELECTOR_PAGE = '''
+<html><body>
+<article>
+  <div class="_5rgn"></div>
+  <div class="ca">Only the second text selector finds something</div>
+  <abbr>May 2 at 1:27 PM</abbr>
+  <a href="/story.php?story_fbid=123&amp;id=9">story</a>
+</article>
+</body></html>
+'''
+
+
+def _chains_as_dict(chains) -> dict:
+    return {field.name: [_selector_as_dict(s) for s in getattr(chains, field.name)]
+            for field in dataclasses.fields(chains)}
+
+
+def _selector_as_dict(selector: Selector) -> dict:
+    data = {}
+    for field in dataclasses.fields(selector):
+        value = getattr(selector, field.name)
+        if value != field.default:
+            data['class' if field.name == 'class_' else field.name] = value
+    return data
+
+
+class TestSelectorChains(unittest.TestCase):
+
+    def setUp(self):
+        fixed_date = staticmethod(lambda s: datetime(2024, 1, 1))
+        patcher = mock.patch.object(PostSummaryListExtractor, '_parse_date', fixed_date)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chains_round_trip_through_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'selectors.json')
+            with open(path, 'w') as f:
+                json.dump(_chains_as_dict(DEFAULT_SELECTOR_CHAINS), f)
+            self.assertEqual(load_selector_chains(path), DEFAULT_SELECTOR_CHAINS)
+
+    def test_fingerprint_drops_selectors_absent_from_the_page(self):
+        html = '<article><div class="_5rgn">x</div><a href="/story.php?story_fbid=1">s</a></article>'
+        live = DEFAULT_SELECTOR_CHAINS.restricted_to(DEFAULT_SELECTOR_CHAINS.fingerprint(html))
+        self.assertEqual([s.tag for s in live.posts], ['article'])
+        self.assertEqual([s.class_ for s in live.text], ['_5rgn'])
+        self.assertEqual(live.likes, ())
+        self.assertEqual([s.param for s in live.story_id], ['story_fbid', 'fbid'])
+
+    def test_fingerprint_matches_whole_class_names(self):
+        html = '<article><div class="_5rgnx ca-b">cn co, t bs</div><a href="/x" CLASS=cn>s</a></article>'
+        live = DEFAULT_SELECTOR_CHAINS.restricted_to(DEFAULT_SELECTOR_CHAINS.fingerprint(html))
+        self.assertEqual(live.text, ())
+        self.assertEqual(live.likes, ())
+        html = '<article><div class=\'x _5rgn\'>a</div><a class="co  cn">s</a></article>'
+        live = DEFAULT_SELECTOR_CHAINS.restricted_to(DEFAULT_SELECTOR_CHAINS.fingerprint(html))
+        self.assertEqual([s.class_ for s in live.text], ['_5rgn'])
+        self.assertEqual([s.class_ for s in live.likes], ['cn co'])
+
+    def test_layout_keeps_chain_order(self):
+        layout = Layout(DEFAULT_SELECTOR_CHAINS)
+        self.assertEqual(layout.first('text', lambda s: s.class_ if s.tag == 'td' else None), 't bs')
+        self.assertEqual(layout.first('text', lambda s: s.class_), '_5rgn')
+        self.assertEqual(layout.chains, DEFAULT_SELECTOR_CHAINS)
+        self.assertIsNone(layout.first('likes', lambda s: None))
+
+    def test_extractors_fall_back_to_the_next_selector(self):
+        for extractor_class in [PostSummaryListExtractor, FastPostSummaryListExtractor]:
+            with self.subTest(extractor=extractor_class.__name__):
+                extractor = extractor_class()
+                for _ in range(2):
+                    self.assertEqual(extractor.extract_posts(SECOND_TEXT_SELECTOR_PAGE).posts[0].text,
+                                     'Only the second text selector finds something')
+
+    def test_extracted_ids_do_not_depend_on_earlier_pages(self):
+        expected = {
+            POST_TEST_FIRST_FILE_HTML: ['460807296509786', '460691886521327', '456527230271126', '448127641111085',
+                                        '438743755382807'],
+            POST_TEST_SECOND_FILE_HTML: ['436202125636970', '435752135681969', '428968193027030', '416827087574474',
+                                         '413091184614731', '407271545196695', '399822892608227', '399298472660669',
+                                         '395803623010154', '424046596852523'],
+        }
+        for extractor_class in [PostSummaryListExtractor, FastPostSummaryListExtractor]:
+            extractor = extractor_class()
+            for run in range(2):
+                for page, ids in expected.items():
+                    with self.subTest(extractor=extractor_class.__name__, run=run, page=page):
+                        posts = extractor.extract_posts(read_test_file(page)).posts
+                        self.assertCountEqual([post.id for post in posts], ids)
+
+    def test_layout_cache_remembers_layouts(self):
+        cache = LayoutCache(max_layouts=2)
+        page = read_test_file(POST_TEST_FIRST_FILE_HTML)
+        first = cache.resolve(DEFAULT_SELECTOR_CHAINS, page)
+        self.assertIs(cache.resolve(DEFAULT_SELECTOR_CHAINS, page), first)
+        cache.resolve(DEFAULT_SELECTOR_CHAINS, '<p>a</p>')
+        cache.resolve(DEFAULT_SELECTOR_CHAINS, '<p class="ca">a</p>')
+        self.assertEqual((cache.hits, cache.misses, cache.layouts), (1, 3, 2))
+        self.assertIsNot(cache.resolve(DEFAULT_SELECTOR_CHAINS, page), first)
+
+    def test_same_posts_with_and_without_pruning(self):
+        page = read_test_file(POST_TEST_FIRST_FILE_HTML)
+        extractor = PostSummaryListExtractor()
+        with mock.patch.object(LayoutCache, 'resolve', lambda self, chains, html: Layout(chains)):
+            expected = extractor.extract_posts(page)
+        self.assertEqual(extractor.extract_posts(page), expected)
+        self.assertGreater(len(expected.posts), 0)
+
+    def test_new_layout_from_data(self):
+        data = _chains_as_dict(DEFAULT_SELECTOR_CHAINS)
+        data['text'].append({'tag': 'div', 'class': 'zz9 text'})
+        data['likes'].append({'tag': 'a', 'class': 'zz9 likes'})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'selectors.json')
+            with open(path, 'w') as f:
+                json.dump(data, f)
+            chains = load_selector_chains(path)
+
+        self.assertEqual(PostSummaryListExtractor().extract_posts(NEW_LAYOUT_PAGE).posts[0].text, '')
+        for extractor in [PostSummaryListExtractor(chains), FastPostSummaryListExtractor(selector_chains=chains)]:
+            with self.subTest(extractor=type(extractor).__name__):
+                post = extractor.extract_posts(NEW_LAYOUT_PAGE).posts[0]
+                self.assertEqual((post.id, post.text, post.like_count),
+                                 ('123', 'A post in a layout nobody has seen yet', 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
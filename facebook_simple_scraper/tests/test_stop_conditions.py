@@ -0,0 +1,204 @@
+import pickle
+import threading
+import unittest
+from datetime import datetime
+from typing import List, Optional
+from unittest import mock
+
+from facebook_simple_scraper.details.extractor import PostDetails
+from facebook_simple_scraper.details.repository import GraphqlCommentsRepository, PostDetailRepository
+from facebook_simple_scraper.entities import Comment, Post, StopCondition, StopReport, User
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.stop_conditions import LegacyStopCondition, StopAfterNComments, StopAfterNPosts, \
+    StopAfterNSeconds, StopAfterPostId, StopConditionSet
+from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, POST_TEST_LAST_FILE_HTML, \
+    POST_TEST_SECOND_FILE_HTML
+from facebook_simple_scraper.tests.test_pipeline import UrlRequester, _listings_page
+from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
+
+COMMENTS_PAGE = 'files/get_comments_gql_page_1.jsonlines'
+
+
+def _post(post_id: str, comments: int = 0) -> Post:
+    user = User(id='u', name='n', gender='g', photo='p')
+    return Post(id=post_id, url='', text='', date=datetime(2024, 1, 1), image_url='', video_url='', like_count=0,
+                comment_count=comments,
+                comments=[Comment(id=f'{post_id}-{i}', text='', date=datetime(2024, 1, 1), user=user, url='',
+                                  replies=[], reactions=[], replies_count=0) for i in range(comments)])
+
+
+class SeenTwice(StopCondition):
+    """A legacy condition, handed the list of every post scraped so far."""
+
+    def __init__(self):
+        self.lengths: List[int] = []
+
+    def should_stop(self, post_list: List[Post]) -> bool:
+        self.lengths.append(len(post_list))
+        ids = [p.id for p in post_list]
+        return len(ids) != len(set(ids))
+
+
+class CountingDetailRepository(PostDetailRepository):
+    """Fake details repository recording the posts it was asked about."""
+
+    def __init__(self):
+        self.post_ids: List[str] = []
+        self._lock = threading.Lock()
+
+    def get_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
+        with self._lock:
+            self.post_ids.append(post_id)
+        return PostDetails(comments=[], total_comments=0, reactions=[], view_count=0, share_count=0, next_cursor='')
+
+
+class TestIncrementalStopConditions(unittest.TestCase):
+
+    def test_incremental_and_list_evaluations_agree(self):
+        posts = [_post('1', 2), _post('2'), _post('3', 4)]
+        cases = [(StopAfterNPosts(3), [False, False, True]), (StopAfterNComments(5), [False, False, True]),
+                 (StopAfterPostId('2'), [False, True, True]), (StopAfterNSeconds(3600), [False, False, False])]
+        for condition, expected in cases:
+            with self.subTest(condition=type(condition).__name__):
+                observed = []
+                for i, post in enumerate(posts):
+                    condition.observe(post)
+                    observed.append(condition.should_stop())
+                    self.assertEqual(condition.should_stop(posts[:i + 1]), observed[-1])
+                self.assertEqual(observed, expected)
+
+    def test_every_crawl_starts_from_scratch(self):
+        shared = [StopAfterNPosts(2)]
+        first = StopConditionSet(shared)
+        first.observe(_post('1'))
+        first.observe(_post('2'))
+        self.assertTrue(first.should_stop())
+        self.assertFalse(StopConditionSet(shared).should_stop())
+        self.assertEqual(shared[0].count, 0)
+
+    def test_resumed_deadline_gets_the_time_left(self):
+        clock = mock.patch('facebook_simple_scraper.stop_conditions.time.time')
+        now = clock.start()
+        self.addCleanup(clock.stop)
+        now.return_value = 1000
+        condition = StopAfterNSeconds(60)
+        now.return_value = 1030
+        saved = pickle.dumps(condition)
+        # The next run starts long after the first one died
+        now.return_value = 5000
+        resumed = pickle.loads(saved)
+        self.assertFalse(resumed.should_stop())
+        now.return_value = 5029
+        self.assertFalse(resumed.should_stop())
+        now.return_value = 5030
+        self.assertTrue(resumed.should_stop())
+
+    def test_digest_depends_on_parameters_only(self):
+        conditions = StopConditionSet([StopAfterNPosts(3), SeenTwice()])
+        digest = conditions.digest()
+        conditions.observe(_post('1'))
+        self.assertEqual(digest, conditions.digest())
+        self.assertEqual(digest, StopConditionSet([StopAfterNPosts(3), SeenTwice()]).digest())
+        self.assertNotEqual(digest, StopConditionSet([StopAfterNPosts(4), SeenTwice()]).digest())
+        self.assertNotEqual(digest, StopConditionSet([StopAfterNPosts(3)]).digest())
+
+    def test_legacy_conditions_are_adapted(self):
+        legacy = SeenTwice()
+        conditions = StopConditionSet([legacy, StopAfterNPosts(10)])
+        self.assertTrue(conditions.keeps_items)
+        self.assertIsInstance(conditions.conditions[0], LegacyStopCondition)
+        for post_id in ['1', '2', '1']:
+            conditions.observe(_post(post_id))
+        self.assertTrue(conditions.should_stop())
+        self.assertEqual(legacy.lengths, [3])
+        self.assertFalse(StopConditionSet([StopAfterNPosts(1), StopAfterPostId('x')]).keeps_items)
+
+    def test_repository_feeds_legacy_conditions_every_post(self):
+        req = MockRequester()
+        req.clear()
+        for page in (POST_TEST_FIRST_FILE_HTML, POST_TEST_SECOND_FILE_HTML, POST_TEST_LAST_FILE_HTML):
+            req.add_expected_response(r_text=read_test_file(page))
+        repo = PostSummaryListRepository(GetPostOptions(
+            requester=req, parser=PostSummaryListExtractor(), sleep_time_min=0, sleep_time_max=0))
+        legacy = SeenTwice()
+        posts = list(repo.get_posts('username', [legacy]))
+        # Checked before every post and between pages, never after the last post
+        self.assertEqual(set(legacy.lengths), set(range(len(posts))))
+        self.assertEqual(repo.get_stop_reports(), [])
+
+
+class TestPerItemStops(unittest.TestCase):
+
+    @staticmethod
+    def _first_page_repo(details: PostDetailRepository, workers: int,
+                         on_stop=None) -> PostSummaryListRepository:
+        req = MockRequester()
+        req.clear()
+        req.add_expected_response(r_text=read_test_file(POST_TEST_FIRST_FILE_HTML))
+        return PostSummaryListRepository(GetPostOptions(
+            requester=req, parser=PostSummaryListExtractor(), sleep_time_min=0, sleep_time_max=0,
+            comments_repository=details, details_workers=workers, on_stop=on_stop))
+
+    def test_details_of_the_posts_left_are_not_requested(self):
+        page = PostSummaryListExtractor().extract_posts(read_test_file(POST_TEST_FIRST_FILE_HTML))
+        self.assertGreater(len(page.posts), 2)
+        self.assertTrue(page.cursor)
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                details = CountingDetailRepository()
+                reported: List[StopReport] = []
+                repo = self._first_page_repo(details, workers, on_stop=reported.append)
+                posts = list(repo.get_posts('username', [StopAfterNPosts(1)]))
+                self.assertEqual([p.id for p in posts], [page.posts[0].id])
+                self.assertLessEqual(len(details.post_ids), workers)
+                self.assertEqual(reported, repo.get_stop_reports())
+                self.assertEqual(len(reported), 1)
+                self.assertEqual((reported[0].reason, reported[0].scope), ('StopAfterNPosts(n=1)', 'crawl'))
+                # Every detail request of the page and the next page are either made or saved
+                self.assertEqual(reported[0].saved_requests + len(details.post_ids), len(page.posts) + 1)
+
+    def test_comment_pagination_stops(self):
+        req = MockRequester()
+        req.clear()
+        req.session_variables = {'fb_dtsg': 'token', 'target': '1'}
+        content = read_test_file(COMMENTS_PAGE)
+        for _ in range(3):
+            req.add_expected_response(r_text=content)
+        repo = GraphqlCommentsRepository(req, await_time=0, gql_requester=req)
+        conditions = StopConditionSet([StopAfterNComments(5)])
+        detail = repo.get_details_until('123', 10, conditions.check_comments)
+        self.assertTrue(detail.next_cursor)
+        self.assertEqual(len(req.last_request_history), 1)
+        self.assertEqual(conditions.reports, [StopReport(reason='StopAfterNComments(n=5)', saved_requests=1,
+                                                         scope='comments')])
+        self.assertFalse(conditions.stopped)
+        # Without the condition, the next page is fetched
+        repo.get_details_until('123', 10)
+        self.assertEqual(len(req.last_request_history), 3)
+
+    def test_marketplace_stops_mid_page(self):
+        filters = MarketplaceVehicleFilters(location='santiago')
+        build_url = MarketplaceVehicleRepository._build_url
+        req = UrlRequester({build_url(filters): _listings_page(['1', '2', '3'], 'C1')})
+        repo = MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+            requester=req, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0))
+        listings = list(repo.search(filters, [StopAfterNPosts(2)]))
+        self.assertEqual(len(listings), 2)
+        self.assertEqual(len(req.urls), 1)
+        self.assertEqual(repo.get_stop_reports(), [StopReport(reason='StopAfterNPosts(n=2)', saved_requests=1)])
+
+    def test_legacy_conditions_are_reported_by_type(self):
+        conditions = StopConditionSet([SeenTwice()])
+        for post_id in ['1', '1']:
+            conditions.observe(_post(post_id))
+        self.assertTrue(conditions.check(saved_requests=2))
+        self.assertEqual(conditions.reports, [StopReport(reason='SeenTwice', saved_requests=2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import gc
+import tracemalloc
+import unittest
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+import requests
+
+from facebook_simple_scraper.dedupe import RecentSeenIds
+from facebook_simple_scraper.entities import Comment, Post, PostList, StopCondition, User
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters, MarketplaceVehicleList, \
+    MarketplaceVehicleListing
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsParser
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.posts.summary_extractor import PostSummaryHTMLParser
+from facebook_simple_scraper.posts.summary_repository import GetPostOptions, PostSummaryListRepository
+from facebook_simple_scraper.stop_conditions import StopAfterNComments, StopAfterNPosts, StopAfterPostId
+from facebook_simple_scraper.tests.utils import MockRequester
+
+ITEMS = 100_000
+PAGE_SIZE = 100
+WARM_UP_ITEMS = 10_000
+# Memory a streaming crawl may gain past its warm up
+MAX_GROWTH = 256 * 1024
+
+
+class PageNumberRequester(MockRequester):
+    """Fake requester answering every URL with the page number in its cursor, without recording anything."""
+
+    def request(self, method: str, url: str,
+                data: Optional[dict] = None, headers: Optional[dict] = None) -> requests.Response:
+        response = requests.Response()
+        response._content = url.split('cursor=')[1].split('&')[0].encode() if 'cursor=' in url else b'0'
+        response.encoding = 'utf-8'
+        response.status_code = 200
+        return response
+
+
+def _next_cursor(page: int) -> str:
+    return str(page + 1) if (page + 1) * PAGE_SIZE < ITEMS else ''
+
+
+class GeneratedPostsParser(PostSummaryHTMLParser):
+    """Builds a page of posts with two comments each from a page number."""
+
+    def extract_posts(self, html_content: str) -> PostList:
+        page = int(html_content)
+        user = User(id='u', name='Someone', gender='FEMALE', photo='')
+        posts = []
+        for i in range(PAGE_SIZE):
+            post_id = str(page * PAGE_SIZE + i)
+            comments = [Comment(id=f'{post_id}_{j}', text='A comment', date=datetime(2024, 1, 1), user=user, url='',
+                                replies=[], reactions=[], replies_count=0) for j in range(2)]
+            posts.append(Post(id=post_id, url='', text='A post', date=datetime(2024, 1, 1), image_url='', video_url='',
+                              like_count=0, comment_count=2, comments=comments))
+        return PostList(posts=posts, cursor=_next_cursor(page), profile_id='1')
+
+
+class GeneratedListingsParser(MarketplaceListingsParser):
+    """Builds a page of listings from a page number; the first listing repeats the last one of the page before."""
+
+    def extract(self, html_content: str) -> MarketplaceVehicleList:
+        page = int(html_content)
+        ids = [str(page * PAGE_SIZE + i) for i in range(PAGE_SIZE)]
+        if page > 0:
+            ids[0] = str(page * PAGE_SIZE - 1)
+        listings = [MarketplaceVehicleListing(id=listing_id, url='', title='Toyota Corolla') for listing_id in ids]
+        return MarketplaceVehicleList(listings=listings, cursor=_next_cursor(page) or None)
+
+
+def _memory_growth(items: Iterable[object]) -> int:
+    """Most bytes held past the warm up while ``items`` are consumed (and dropped) one at a time."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        warm, peak = 0, 0
+        for n, _ in enumerate(items, start=1):
+            if n % WARM_UP_ITEMS == 0:
+                current, _ = tracemalloc.get_traced_memory()
+                if n == WARM_UP_ITEMS:
+                    warm = current
+                peak = max(peak, current)
+    finally:
+        tracemalloc.stop()
+    return peak - warm
+
+
+class TestStreamingMemory(unittest.TestCase):
+
+    @staticmethod
+    def _posts(streaming: bool, conditions: Iterable[StopCondition]) -> Iterable[Post]:
+        repo = PostSummaryListRepository(GetPostOptions(
+            requester=PageNumberRequester(), parser=GeneratedPostsParser(), sleep_time_min=0, sleep_time_max=0,
+            streaming=streaming))
+        return repo.get_posts('username', list(conditions))
+
+    @staticmethod
+    def _listings(streaming: bool) -> Callable[[], Iterable[MarketplaceVehicleListing]]:
+        repo = MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+            requester=PageNumberRequester(), parser=GeneratedListingsParser(), sleep_time_min=0, sleep_time_max=0,
+            streaming=streaming, max_seen_ids=1000))
+        return lambda: repo.search(MarketplaceVehicleFilters(), [StopAfterNPosts(ITEMS * 2)])
+
+    def test_posts_stream_in_constant_memory(self):
+        conditions = [StopAfterNPosts(ITEMS * 2), StopAfterNComments(ITEMS * 4), StopAfterPostId('missing')]
+        growth = _memory_growth(self._posts(True, conditions))
+        self.assertLess(growth, MAX_GROWTH)
+
+    def test_listings_stream_in_constant_memory(self):
+        count = sum(1 for _ in self._listings(True)())
+        self.assertEqual(count, ITEMS - ITEMS // PAGE_SIZE + 1)
+        self.assertLess(_memory_growth(self._listings(True)()), MAX_GROWTH)
+        # Every id is remembered otherwise
+        self.assertGreater(_memory_growth(self._listings(False)()), 4 * MAX_GROWTH)
+
+    def test_streaming_refuses_legacy_conditions(self):
+        class Legacy(StopCondition):
+            def should_stop(self, post_list):
+                return False
+
+        with self.assertRaises(ValueError):
+            next(iter(self._posts(True, [Legacy()])))
+
+
+class TestRecentSeenIds(unittest.TestCase):
+
+    def test_keeps_the_latest_ids(self):
+        seen = RecentSeenIds(max_ids=2)
+        self.assertEqual([seen.add(i) for i in ['a', 'b', 'a', 'c']], [True, True, False, True])
+        # 'b' was the least recently seen
+        self.assertEqual((len(seen), 'b' in seen, 'a' in seen), (2, False, True))
+        self.assertTrue(seen.add('b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
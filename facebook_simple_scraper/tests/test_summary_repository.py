@@ -1,6 +1,10 @@
+import threading
+import time
 import unittest
-from typing import List
+from typing import List, Optional
 
+from facebook_simple_scraper.details.extractor import PostDetails
+from facebook_simple_scraper.details.repository import PostDetailRepository
 from facebook_simple_scraper.posts.summary_extractor import PostSummaryListExtractor
 from facebook_simple_scraper.posts.summary_repository import PostSummaryListRepository, GetPostOptions
 from facebook_simple_scraper.stop_conditions import StopAfterNPosts
@@ -9,6 +13,26 @@ from facebook_simple_scraper.tests.test_post import POST_TEST_FIRST_FILE_HTML, P
 from facebook_simple_scraper.tests.utils import MockRequester, read_test_file
 
 
+class SlowDetailRepository(PostDetailRepository):
+    """Fake details repository that tracks how many calls run at the same time."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get_details(self, post_id: str, max_comments: int) -> Optional[PostDetails]:
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return PostDetails(comments=[], total_comments=0, reactions=[], view_count=len(post_id),
+                           share_count=0, next_cursor='')
+
+
 class TestPostSummaryListRepository(unittest.TestCase):
 
     def test_get_posts_first_page(self):
@@ -41,5 +65,30 @@ class TestPostSummaryListRepository(unittest.TestCase):
         self.assertIsInstance(posts, list)
 
 
+    def test_details_fetched_concurrently_in_order(self):
+        sequential = self._posts_with_details(workers=1)
+        details_repo = SlowDetailRepository()
+        parallel = self._posts_with_details(workers=4, details_repo=details_repo)
+        self.assertEqual([p.id for p in parallel], [p.id for p in sequential])
+        self.assertEqual([p.view_count for p in parallel], [len(p.id) for p in parallel])
+        self.assertGreater(details_repo.max_active, 1)
+        self.assertLessEqual(details_repo.max_active, 4)
+
+    @staticmethod
+    def _posts_with_details(workers: int, details_repo: Optional[SlowDetailRepository] = None):
+        req = MockRequester()
+        req.clear()
+        req.add_expected_response(r_text=read_test_file(POST_TEST_LAST_FILE_HTML))
+        repo = PostSummaryListRepository(GetPostOptions(
+            requester=req,
+            parser=PostSummaryListExtractor(),
+            sleep_time_max=0,
+            sleep_time_min=0,
+            comments_repository=details_repo or SlowDetailRepository(delay=0),
+            details_workers=workers,
+        ))
+        return list(repo.get_posts('username', [StopAfterNPosts(100)]))
+
+
 if __name__ == '__main__':
     unittest.main()
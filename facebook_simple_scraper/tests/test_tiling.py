@@ -0,0 +1,204 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import unittest
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from facebook_simple_scraper.dedupe import PersistentSeenIds
+from facebook_simple_scraper.marketplace.entities import MarketplaceVehicleFilters
+from facebook_simple_scraper.marketplace.extractor import MarketplaceListingsExtractor
+from facebook_simple_scraper.marketplace.repository import GetMarketplaceVehiclesOptions, \
+    MarketplaceVehicleRepository
+from facebook_simple_scraper.marketplace.tiling import BoundingBox, BoxRegion, PolygonRegion, \
+    TiledMarketplaceSearch, load_region, plan_tiles
+from facebook_simple_scraper.stop_conditions import StopAfterNPosts
+from facebook_simple_scraper.tests.test_pipeline import _listings_page
+from facebook_simple_scraper.tests.utils import MockRequester
+
+
+def _distance_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+class GeoRequester(MockRequester):
+    """Fake Marketplace serving the listings inside the searched circle, ``page_size`` at a time."""
+
+    def __init__(self, listings: Dict[str, Tuple[float, float]], page_size: int, max_pages: Optional[int] = None):
+        self.listings = listings
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.urls: List[str] = []
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str,
+                data: Optional[dict] = None, headers: Optional[dict] = None) -> requests.Response:
+        with self._lock:
+            self.urls.append(url)
+        params = {key: values[0] for key, values in parse_qs(urlparse(url).query).items()}
+        latitude, longitude, radius = float(params['latitude']), float(params['longitude']), float(params['radius'])
+        ids = sorted(i for i, (lat, lng) in self.listings.items()
+                     if _distance_km(latitude, longitude, lat, lng) <= radius)
+        offset = int(params.get('cursor', 0))
+        page = ids[offset:offset + self.page_size]
+        last_page = offset + self.page_size >= len(ids)
+        if self.max_pages is not None and offset // self.page_size + 1 >= self.max_pages:
+            last_page = True
+        response = requests.Response()
+        response._content = _listings_page(page, None if last_page else str(offset + self.page_size)).encode()
+        response.encoding = 'utf-8'
+        response.status_code = 200
+        return response
+
+
+def _grid_listings(box: BoundingBox, per_side: int) -> Dict[str, Tuple[float, float]]:
+    step_lat = (box.north - box.south) / per_side
+    step_lng = (box.east - box.west) / per_side
+    return {f'{i}-{j}': (box.south + (i + 0.5) * step_lat, box.west + (j + 0.5) * step_lng)
+            for i in range(per_side) for j in range(per_side)}
+
+
+class TestTilePlanning(unittest.TestCase):
+
+    def test_circles_cover_the_bounding_box(self):
+        box = BoundingBox(south=-34, west=-71, north=-33, east=-70)
+        tiles = plan_tiles(BoxRegion(box), radius_km=20)
+        for latitude, longitude in _grid_listings(box, 25).values():
+            self.assertTrue(any(_distance_km(latitude, longitude, t.latitude, t.longitude) <= t.radius_km
+                                for t in tiles), (latitude, longitude))
+        self.assertTrue(all(t.radius_km == 20 for t in tiles))
+
+    def test_polygon_only_keeps_the_tiles_it_touches(self):
+        # A triangle covering the south-west half of a 2x2 degree box, with a hole
+        triangle = [[(0, 0), (2, 0), (0, 2), (0, 0)], [(0.2, 0.2), (0.6, 0.2), (0.2, 0.6), (0.2, 0.2)]]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'region.geojson')
+        with open(path, 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': [
+                {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Polygon', 'coordinates': triangle}},
+            ]}, f)
+        region = load_region(path)
+        self.assertIsInstance(region, PolygonRegion)
+
+        box_tiles = plan_tiles(BoxRegion(region.bounds), radius_km=10)
+        tiles = plan_tiles(region, radius_km=10)
+        self.assertLess(len(tiles), len(box_tiles) * 0.7)
+        self.assertFalse(any(t.box.south > 1.2 and t.box.west > 1.2 for t in tiles))
+        self.assertFalse(any(region.intersects(t.box) for t in box_tiles if t not in tiles))
+        # Points of the triangle are all covered, the ones in the hole need not be
+        for latitude, longitude in [(0.05, 0.05), (1.9, 0.05), (0.05, 1.9), (0.9, 0.9)]:
+            self.assertTrue(any(_distance_km(latitude, longitude, t.latitude, t.longitude) <= t.radius_km
+                                for t in tiles), (latitude, longitude))
+
+    def test_tiles_split_into_quarters(self):
+        tile = plan_tiles(BoxRegion(BoundingBox(south=10, west=10, north=11, east=11)), radius_km=40)[0]
+        quarters = tile.split()
+        self.assertEqual(len(quarters), 4)
+        self.assertTrue(all(q.depth == 1 and q.radius_km <= math.ceil(tile.radius_km / 2) for q in quarters))
+        self.assertEqual({(q.box.south, q.box.west) for q in quarters},
+                         {(tile.box.south, tile.box.west), (tile.latitude, tile.box.west),
+                          (tile.box.south, tile.longitude), (tile.latitude, tile.longitude)})
+
+
+class TestTiledMarketplaceSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.box = BoundingBox(south=0, west=0, north=1, east=1)
+        self.listings = _grid_listings(self.box, 10)
+        self.filters = MarketplaceVehicleFilters(location='santiago', query='corolla')
+
+    def _sweep(self, requester: GeoRequester, **kwargs) -> TiledMarketplaceSearch:
+        def repository() -> MarketplaceVehicleRepository:
+            return MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+                requester=requester, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0))
+
+        kwargs.setdefault('workers', 4)
+        return TiledMarketplaceSearch(repository, **kwargs)
+
+    def test_dense_tiles_are_split_until_the_region_is_complete(self):
+        # Facebook stops paginating after 4 pages of 5 listings
+        requester = GeoRequester(self.listings, page_size=5, max_pages=4)
+        sweep = self._sweep(requester, radius_km=40, max_pages_per_tile=4, min_radius_km=5)
+        ids = [listing.id for listing in sweep.search(BoxRegion(self.box), self.filters)]
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(self.listings))
+        reports = sweep.get_tile_reports()
+        self.assertTrue(any(report.split for report in reports))
+        self.assertTrue(any(report.tile.depth > 0 for report in reports))
+        self.assertFalse(any(report.saturated or report.error for report in reports))
+        for url in requester.urls:
+            self.assertIn('query=corolla', url)
+            self.assertNotIn('/santiago/', url)
+
+    def test_tiles_too_small_to_split_are_reported(self):
+        requester = GeoRequester(self.listings, page_size=5, max_pages=4)
+        sweep = self._sweep(requester, radius_km=40, max_pages_per_tile=4, min_radius_km=40)
+        ids = [listing.id for listing in sweep.search(BoxRegion(self.box), self.filters)]
+
+        self.assertLess(len(set(ids)), len(self.listings))
+        self.assertTrue(any(report.saturated for report in sweep.get_tile_reports()))
+
+    def test_stop_conditions_apply_to_the_whole_sweep(self):
+        sweep = self._sweep(GeoRequester(self.listings, page_size=5), radius_km=40, max_pages_per_tile=100)
+        ids = [listing.id for listing in sweep.search(BoxRegion(self.box), self.filters, [StopAfterNPosts(7)])]
+        self.assertEqual(len(set(ids)), 7)
+        self.assertEqual([report.reason for report in sweep.get_stop_reports()], ['StopAfterNPosts(n=7)'])
+
+    def test_listings_queued_but_not_delivered_stay_new(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index = PersistentSeenIds(directory.name)
+        self.addCleanup(index.close)
+        requester = GeoRequester(self.listings, page_size=5)
+
+        def repository() -> MarketplaceVehicleRepository:
+            return MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+                requester=requester, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0,
+                listing_index=index, new_only=True))
+
+        def sweep() -> TiledMarketplaceSearch:
+            return TiledMarketplaceSearch(repository, workers=4, radius_km=20, max_pages_per_tile=100,
+                                          listing_index=index)
+
+        listings = iter(sweep().search(BoxRegion(self.box), self.filters))
+        delivered = [next(listings).id for _ in range(10)]
+        listings.close()
+        # A listing is indexed once the consumer asks for the next one, so the last one is not
+        self.assertEqual(len(index), 9)
+
+        rest = [listing.id for listing in sweep().search(BoxRegion(self.box), self.filters)]
+        self.assertIn(delivered[-1], rest)
+        self.assertEqual(sorted(delivered[:-1] + rest), sorted(self.listings))
+
+    def test_a_failing_tile_does_not_stop_the_others(self):
+        requester = GeoRequester(self.listings, page_size=100)
+        calls = []
+        lock = threading.Lock()
+
+        def repository() -> MarketplaceVehicleRepository:
+            with lock:
+                calls.append(None)
+                if len(calls) == 1:
+                    raise ConnectionError("boom")
+            return MarketplaceVehicleRepository(GetMarketplaceVehiclesOptions(
+                requester=requester, parser=MarketplaceListingsExtractor(), sleep_time_min=0, sleep_time_max=0))
+
+        sweep = TiledMarketplaceSearch(repository, workers=2, radius_km=20, max_pages_per_tile=100)
+        ids = list(sweep.search(BoxRegion(self.box), self.filters))
+        reports = sweep.get_tile_reports()
+        self.assertEqual(len(reports), len(plan_tiles(BoxRegion(self.box), 20)))
+        self.assertEqual(sum(1 for report in reports if report.error is not None), 1)
+        self.assertGreater(len(ids), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -36,6 +36,10 @@ setup(
         'python-dateutil~=2.9.0.post0',
         'dateparser~=1.2.0',
     ],
+    extras_require={
+        # C-backed tokenizer for FastPostSummaryListExtractor
+        'fast': ['lxml>=4.9'],
+    },
     author='Hector Oliveros',
     author_email='hector.oliveros.leon@gmail.com',
     description='A simple scraper for Facebook',